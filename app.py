@@ -1,3 +1,4 @@
+import click
 from flask import Flask, render_template
 from flask_login import LoginManager
 from pymongo import MongoClient
@@ -40,6 +41,9 @@ def create_app(config_name=None):
     # Register blueprints
     register_blueprints(app)
     
+    # Register CLI commands
+    register_commands(app)
+    
     # Initialize database tables and collections
     with app.app_context():
         from utils.db_init import init_db
@@ -75,10 +79,11 @@ def register_blueprints(app):
         # Import here to avoid circular imports
         from services.book_service import get_all_books
         from services.recommendation_service import get_popular_books
+        from services.trending import get_trending_books
         
         # Get some books for the homepage
-        recent_books, _, _ = get_all_books(page=1, per_page=6, sort_by='created_at', sort_order='desc')
-        popular_books = get_popular_books(limit=6)
+        recent_books, _, _ = get_all_books(page=1, per_page=6, sort_by='created_at', sort_order='desc', approximate=True)
+        popular_books = get_trending_books(limit=6) or get_popular_books(limit=6)
         
         return render_template('index.html', recent_books=recent_books, popular_books=popular_books)
 
@@ -92,6 +97,134 @@ def register_error_handlers(app):
     def internal_server_error(e):
         return render_template('errors/500.html'), 500
 
+def register_commands(app):
+    """Register CLI maintenance commands (run with `flask --app app <command>`)."""
+    @app.cli.command('rebuild-book-meta')
+    def rebuild_book_meta_command():
+        """Copy the metadata of every book to the book_meta collection."""
+        from services.book_meta import rebuild_book_meta
+        total = rebuild_book_meta()
+        click.echo(f"Book metadata mirrored for {total} books")
+    
+    @app.cli.command('rebuild-preference-matrix')
+    def rebuild_preference_matrix_command():
+        """Rebuild the users x genres preference matrix."""
+        from services.preference_matrix import rebuild_user_genre_matrix
+        matrix = rebuild_user_genre_matrix()
+        click.echo(f"Preference matrix rebuilt: {len(matrix.user_ids)} users, {len(matrix.genres)} genres")
+    
+    @app.cli.command('rebuild-genre-profiles')
+    def rebuild_genre_profiles_command():
+        """Recompute every user's genre preference profile."""
+        from services.preference_matrix import rebuild_user_genre_profiles
+        total = rebuild_user_genre_profiles()
+        click.echo(f"Genre profiles rebuilt for {total} users")
+    
+    @app.cli.command('rebuild-book-neighbors')
+    @click.option('--top-k', type=int, default=None, help='Neighbours kept per book.')
+    @click.option('--stale-only', is_flag=True, help='Only recompute lists made stale by new loans.')
+    def rebuild_book_neighbors_command(top_k, stale_only):
+        """Rebuild the top-K similar books list of every book."""
+        from services.similarity_index import build_book_neighbors, refresh_stale_book_neighbors
+        if stale_only:
+            total = refresh_stale_book_neighbors(top_k=top_k)
+        else:
+            total = build_book_neighbors(top_k=top_k)
+        click.echo(f"Book neighbours rebuilt for {total} books")
+    
+    @app.cli.command('rebuild-content-similarity')
+    @click.option('--top-k', type=int, default=None, help='Neighbours kept per book.')
+    @click.option('--workers', type=int, default=None, help='Worker processes.')
+    @click.option('--stale-only', is_flag=True, help='Only apply the books created, edited or deleted since the last run.')
+    def rebuild_content_similarity_command(top_k, workers, stale_only):
+        """Rebuild the TF-IDF index and the similar-content list of every book."""
+        from services.content_similarity import build_content_index, refresh_stale_book_content
+        if stale_only:
+            total = refresh_stale_book_content(top_k=top_k)
+        else:
+            total = build_content_index(top_k=top_k, workers=workers)
+        click.echo(f"Content similarity rebuilt for {total} books")
+    
+    @app.cli.command('rebuild-search-index')
+    def rebuild_search_index_command():
+        """Rebuild the full-text search index as a single segment."""
+        from services.search_index import rebuild_search_index
+        total = rebuild_search_index()
+        click.echo(f"Search index rebuilt for {total} books")
+    
+    @app.cli.command('rebuild-feeds')
+    @click.option('--size', type=int, default=None, help='Book IDs kept per feed.')
+    def rebuild_recommendation_feeds_command(size):
+        """Recompute the global, genre and language cold-start feeds."""
+        from services.cold_start_feeds import build_recommendation_feeds
+        total = build_recommendation_feeds(size=size)
+        click.echo(f"{total} recommendation feeds rebuilt")
+    
+    @app.cli.command('rebuild-also-borrowed')
+    def rebuild_also_borrowed_command():
+        """Mine the "readers also borrowed" rules of every book from the loan history."""
+        from services.also_borrowed import build_also_borrowed
+        total = build_also_borrowed()
+        click.echo(f"Readers-also-borrowed lists rebuilt for {total} books")
+    
+    @app.cli.command('rebuild-rating-leaderboard')
+    def rebuild_rating_leaderboard_command():
+        """Recompute the materialized book rating leaderboard."""
+        from services.rating_leaderboard import build_rating_leaderboard
+        total = build_rating_leaderboard()
+        click.echo(f"Rating leaderboard rebuilt for {total} books")
+    
+    @app.cli.command('train-recommender')
+    @click.option('--factors', type=int, default=None, help='Latent factors.')
+    @click.option('--iterations', type=int, default=None, help='Alternating least squares passes.')
+    def train_recommender_command(factors, iterations):
+        """Train the ALS matrix factorization recommender on loans and reviews."""
+        from services.als_recommender import train_als_model
+        model = train_als_model(factors=factors, iterations=iterations)
+        click.echo(f"ALS model trained: {len(model.user_ids)} users, {len(model.item_ids)} books, "
+                   f"{model.user_factors.shape[1]} factors")
+    
+    @app.cli.command('profile-recommendations')
+    @click.argument('user_id', type=int)
+    @click.option('--limit', type=int, default=10, help='Number of recommendations.')
+    def profile_recommendations_command(user_id, limit):
+        """Show a user's recommendations with scores, sources and per-stage timings."""
+        from services.recommendation_service import profile_recommendations_for_user
+        result = profile_recommendations_for_user(user_id, limit=limit)
+        for book in result.books:
+            click.echo(f"{book.id:>8}  {result.scores[book.id]:6.3f}  {','.join(result.sources[book.id]):<20} {book.title}")
+        for stage, elapsed in result.timings.items():
+            click.echo(f"{stage:<24} {elapsed:8.2f} ms")
+    
+    @app.cli.command('materialize-recommendations')
+    @click.option('--workers', type=int, default=None, help='Worker processes (1 runs in-process).')
+    @click.option('--chunk-size', type=int, default=None, help='User IDs per task.')
+    def materialize_recommendations_command(workers, chunk_size):
+        """Precompute the recommendations of every active user in a new generation."""
+        from services.recommendation_batch import materialize_recommendations
+        generation, total = materialize_recommendations(workers=workers, chunk_size=chunk_size)
+        click.echo(f"Generation {generation} materialized for {total} users")
+    
+    @app.cli.command('rebuild-trending')
+    def rebuild_trending_command():
+        """Recompute the decayed trending scores from the daily activity buckets."""
+        from services.trending import rebuild_trending_scores
+        total = rebuild_trending_scores()
+        click.echo(f"Trending scores rebuilt for {total} books")
+    
+    @app.cli.command('similar-users-recall')
+    @click.option('--sample', type=int, default=100, help='Number of users to evaluate.')
+    @click.option('--max-users', type=int, default=10, help='Similar users requested per user.')
+    def similar_users_recall_command(sample, max_users):
+        """Report the recall of approximate (LSH) similar users against the exact search."""
+        from services.reader_lsh import measure_similar_users_recall
+        report = measure_similar_users_recall(sample_size=sample, max_users=max_users)
+        click.echo(
+            f"Recall@{max_users}: {report['recall']:.3f} over {report['users']} users "
+            f"({report['indexed_users']} indexed, {report['mean_candidates']:.1f} candidates on average)"
+        )
+        click.echo(f"Exact: {report['exact_ms']:.2f} ms/user, approximate: {report['approximate_ms']:.2f} ms/user")
+
 if __name__ == '__main__':
     app = create_app()
     app.run(debug=True, host='0.0.0.0', port=5001)
\ No newline at end of file
@@ -0,0 +1,419 @@
+"""
+Recommender benchmark for LibriMongo application.
+Builds a synthetic library (skewed book popularity, readers with favourite genres)
+in SQLite and an in-process MongoDB stand-in (mongomock), holds out each reader's
+most recent loans and reports recall@K, catalog coverage, p50/p95 latency and
+query counts of the recommender functions as the dataset grows.
+
+Usage:
+    python benchmark.py --users 200 --books 500 --loans 4000 --scales 1,2,4
+"""
+
+import argparse
+import json
+import logging
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+import numpy as np
+from flask import Flask
+from sqlalchemy import event
+from config.config import TestingConfig
+from models.mariadb_models import db, Book, Loan, User
+
+GENRES = ['Fantasy', 'Science Fiction', 'Mystery', 'Romance', 'History',
+          'Poetry', 'Drama', 'Biography', 'Horror', 'Philosophy']
+LANGUAGES = ['es', 'en', 'ca', 'fr']
+
+# Collection methods counted as one MongoDB query
+MONGO_OPERATIONS = frozenset({
+    'find', 'find_one', 'aggregate', 'count_documents', 'estimated_document_count', 'distinct',
+    'insert_one', 'insert_many', 'update_one', 'update_many', 'replace_one',
+    'delete_one', 'delete_many', 'bulk_write', 'find_one_and_update'
+})
+
+
+class _CountingCollection:
+    """Collection proxy counting the queries sent to MongoDB."""
+
+    def __init__(self, collection, counter):
+        self._collection = collection
+        self._counter = counter
+
+    def __getattr__(self, name):
+        attribute = getattr(self._collection, name)
+        if name not in MONGO_OPERATIONS:
+            return attribute
+
+        def counted(*args, **kwargs):
+            self._counter['mongo'] += 1
+            return attribute(*args, **kwargs)
+        return counted
+
+
+class _CountingDatabase:
+    def __init__(self, database, counter):
+        self._database = database
+        self._counter = counter
+
+    def __getitem__(self, name):
+        return _CountingCollection(self._database[name], self._counter)
+
+    def __getattr__(self, name):
+        return getattr(self._database, name)
+
+
+class _CountingClient:
+    def __init__(self, client, counter):
+        self._client = client
+        self._counter = counter
+
+    def __getitem__(self, name):
+        return _CountingDatabase(self._client[name], self._counter)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+def create_benchmark_app(data_dir):
+    """
+    Create an application backed by in-memory SQLite and mongomock.
+
+    Args:
+        data_dir (str): Directory for the precomputed recommender files
+
+    Returns:
+        Flask: The application, with a 'queries' counter in app.extensions
+    """
+    import mongomock
+    from utils.db_init import init_db
+
+    app = Flask(__name__)
+    app.config.from_object(TestingConfig)
+    app.config['RECOMMENDER_DATA_DIR'] = data_dir
+    app.config['RECOMMENDATION_BATCH_WORKERS'] = 1
+    app.logger.setLevel(logging.WARNING)
+    db.init_app(app)
+
+    counter = Counter()
+    app.extensions['queries'] = counter
+    app.mongo_client = _CountingClient(mongomock.MongoClient(), counter)
+
+    with app.app_context():
+        init_db()
+        event.listen(db.engine, 'before_cursor_execute', lambda *args: counter.update(['sql']))
+    return app
+
+
+def generate_library(users, books, loans, reviews, skew=1.1, seed=1):
+    """
+    Generate a synthetic library.
+
+    Book popularity follows a Zipf-like law with exponent skew; each reader has one
+    or two favourite genres and takes most of their loans from them.
+
+    Args:
+        users (int): Number of readers
+        books (int): Number of books
+        loans (int): Number of loans
+        reviews (int): Number of reviews (of borrowed books)
+        skew (float): Popularity skew (0 for uniform)
+        seed (int): Random seed
+
+    Returns:
+        dict: 'users' (count), 'books' (genre, language, author per book), 'loans'
+            ((user, book, date) in chronological order) and 'reviews' ((user, book, rating))
+    """
+    rng = np.random.default_rng(seed)
+    genres = rng.integers(0, len(GENRES), size=books)
+    catalog = [
+        {'genre': GENRES[genre], 'language': LANGUAGES[rng.integers(0, len(LANGUAGES))],
+         'author': f'Author {rng.integers(0, max(books // 5, 1))}'}
+        for genre in genres
+    ]
+
+    popularity = 1.0 / np.arange(1, books + 1) ** skew
+    rng.shuffle(popularity)
+    by_genre = {genre: np.flatnonzero(genres == genre) for genre in range(len(GENRES))}
+
+    favourites = [rng.choice(len(GENRES), size=rng.integers(1, 3), replace=False) for _ in range(users)]
+    activity = rng.pareto(1.5, size=users) + 1
+    borrowers = rng.choice(users, size=loans, p=activity / activity.sum())
+
+    start = datetime.utcnow() - timedelta(days=180)
+    offsets = np.sort(rng.uniform(0, 180 * 86400, size=loans))
+    loan_rows = []
+    for user, offset in zip(borrowers.tolist(), offsets.tolist()):
+        pool = np.arange(books)
+        if rng.random() < 0.8:
+            pool = np.concatenate([by_genre[genre] for genre in favourites[user]])
+            if len(pool) == 0:
+                pool = np.arange(books)
+        weights = popularity[pool]
+        book = int(rng.choice(pool, p=weights / weights.sum()))
+        loan_rows.append((user, book, start + timedelta(seconds=offset)))
+
+    review_rows = []
+    for index in rng.choice(len(loan_rows), size=min(reviews, len(loan_rows)), replace=False).tolist():
+        user, book, _ = loan_rows[index]
+        liked = genres[book] in favourites[user]
+        review_rows.append((user, book, int(rng.integers(4, 6) if liked else rng.integers(1, 4))))
+
+    return {'users': users, 'books': catalog, 'loans': loan_rows, 'reviews': review_rows}
+
+
+def split_holdout(loans, holdout=2, min_loans=3):
+    """
+    Hold out the most recent loans of each reader.
+
+    Args:
+        loans (list): (user, book, date) tuples in chronological order
+        holdout (int): Loans held out per reader
+        min_loans (int): Readers with fewer loans keep all of them
+
+    Returns:
+        tuple: (training loans, user -> set of held-out books)
+    """
+    by_user = {}
+    for loan in loans:
+        by_user.setdefault(loan[0], []).append(loan)
+
+    training = []
+    held_out = {}
+    for user, user_loans in by_user.items():
+        if len(user_loans) >= min_loans:
+            held_out[user] = {book for _, book, _ in user_loans[-holdout:]} - \
+                {book for _, book, _ in user_loans[:-holdout]}
+            user_loans = user_loans[:-holdout]
+        training.extend(user_loans)
+    return training, {user: books for user, books in held_out.items() if books}
+
+
+def load_library(library, training):
+    """
+    Store a synthetic library in the application databases.
+
+    Args:
+        library (dict): Output of generate_library
+        training (list): Loans to store
+
+    Returns:
+        tuple: (user index -> user ID, book index -> book ID)
+    """
+    from models.mongodb_models import LoanHistory, Review
+
+    db.session.add_all([
+        User(username=f'reader{i}', email=f'reader{i}@example.com', password_hash='-')
+        for i in range(library['users'])
+    ])
+    db.session.add_all([
+        Book(title=f"Book {i}", author=book['author'], genre=book['genre'], language=book['language'],
+             description=f"A {book['genre'].lower()} book", available_copies=5, total_copies=5)
+        for i, book in enumerate(library['books'])
+    ])
+    db.session.commit()
+
+    user_ids = {i: user_id for i, (user_id,) in enumerate(
+        db.session.query(User.id).filter(User.username.like('reader%')).order_by(User.id).all()
+    )}
+    book_ids = {i: book_id for i, (book_id,) in enumerate(db.session.query(Book.id).order_by(Book.id).all())}
+
+    db.session.add_all([
+        Loan(user_id=user_ids[user], book_id=book_ids[book], loan_date=date,
+             due_date=date + timedelta(days=14), return_date=date + timedelta(days=7), is_returned=True)
+        for user, book, date in training
+    ])
+    db.session.commit()
+
+    LoanHistory.get_collection().insert_many([
+        {'user_id': user_ids[user], 'book_id': book_ids[book], 'loan_date': date, 'is_returned': True}
+        for user, book, date in training
+    ])
+    training_pairs = {(user, book) for user, book, _ in training}
+    reviews = [review for review in library['reviews'] if review[:2] in training_pairs]
+    if reviews:
+        Review.get_collection().insert_many([
+            {'user_id': user_ids[user], 'book_id': book_ids[book], 'rating': rating,
+             'created_at': datetime.utcnow(), 'updated_at': datetime.utcnow()}
+            for user, book, rating in reviews
+        ])
+    return user_ids, book_ids
+
+
+def build_precomputed():
+    """Build every structure the recommenders read, as the maintenance commands do."""
+    from services.book_meta import rebuild_book_meta
+    from services.preference_matrix import rebuild_user_genre_matrix, rebuild_user_genre_profiles
+    from services.rating_leaderboard import build_rating_leaderboard
+    from services.similarity_index import build_book_neighbors
+    from services.cold_start_feeds import build_recommendation_feeds
+
+    rebuild_book_meta()
+    rebuild_user_genre_matrix()
+    rebuild_user_genre_profiles()
+    build_rating_leaderboard()
+    build_book_neighbors()
+    build_recommendation_feeds()
+
+
+def _similar_user_books(user_id, mode, k):
+    """Books borrowed by a user's similar users (and not by the user), most shared first."""
+    from services.recommendation_service import get_similar_users
+    from models.mongodb_models import LoanHistory
+
+    similar = [user['user_id'] for user in get_similar_users(user_id, mode=mode)]
+    if not similar:
+        return []
+    collection = LoanHistory.get_collection()
+    read = set(collection.distinct('book_id', {'user_id': user_id}))
+    counts = Counter(
+        loan['book_id'] for loan in collection.find({'user_id': {'$in': similar}}, {'book_id': 1})
+        if loan['book_id'] not in read
+    )
+    return [book_id for book_id, _ in counts.most_common(k)]
+
+
+def _last_loan_books(user_id, k):
+    """Books similar to the user's last borrowed book."""
+    from services.recommendation_service import get_similar_books
+    from models.mongodb_models import LoanHistory
+
+    last = next(LoanHistory.find({'user_id': user_id}, sort=[('loan_date', -1)], limit=1), None)
+    if last is None:
+        return []
+    return [item['book'].id for item in get_similar_books(last['book_id'], min_similarity=0, max_books=k)]
+
+
+def recommenders(k):
+    """Recommender functions under test: name -> function(user_id) returning book IDs."""
+    from services.recommendation_service import get_recommendations_for_user
+
+    return {
+        'get_recommendations_for_user': lambda user_id: [b.id for b in get_recommendations_for_user(user_id, limit=k)],
+        'get_similar_users (exact)': lambda user_id: _similar_user_books(user_id, 'exact', k),
+        'get_similar_users (approximate)': lambda user_id: _similar_user_books(user_id, 'approximate', k),
+        'get_similar_books (last loan)': lambda user_id: _last_loan_books(user_id, k),
+    }
+
+
+def evaluate(app, held_out, catalog_size, k=10, sample=100):
+    """
+    Measure quality, latency and queries of each recommender on the held-out loans.
+
+    Args:
+        app (Flask): The benchmark application
+        held_out (dict): User ID -> set of held-out book IDs
+        catalog_size (int): Number of books
+        k (int): Recommendations requested per user
+        sample (int): Maximum number of users evaluated
+
+    Returns:
+        list: One dict per recommender with recall, coverage, p50/p95 (ms) and
+            mean SQL and MongoDB queries per call
+    """
+    counter = app.extensions['queries']
+    users = sorted(held_out)[:sample]
+    results = []
+    for name, recommend in recommenders(k).items():
+        # Warm the in-process caches (matrices, indexes) outside the measurement
+        if users:
+            recommend(users[0])
+
+        recalls, latencies, recommended = [], [], set()
+        sql = mongo = 0
+        for user_id in users:
+            before = Counter(counter)
+            started = time.perf_counter()
+            book_ids = recommend(user_id)[:k]
+            latencies.append(1000 * (time.perf_counter() - started))
+            sql += counter['sql'] - before['sql']
+            mongo += counter['mongo'] - before['mongo']
+
+            recommended.update(book_ids)
+            recalls.append(len(held_out[user_id] & set(book_ids)) / len(held_out[user_id]))
+
+        calls = max(len(users), 1)
+        results.append({
+            'recommender': name,
+            'users': len(users),
+            f'recall@{k}': float(np.mean(recalls)) if recalls else 0.0,
+            'coverage': len(recommended) / catalog_size if catalog_size else 0.0,
+            'p50_ms': float(np.percentile(latencies, 50)) if latencies else 0.0,
+            'p95_ms': float(np.percentile(latencies, 95)) if latencies else 0.0,
+            'sql_queries': sql / calls,
+            'mongo_queries': mongo / calls
+        })
+    return results
+
+
+def run_benchmark(users=200, books=500, loans=4000, reviews=1500, k=10, holdout=2, sample=100, skew=1.1, seed=1):
+    """
+    Generate a library, build the recommender structures and evaluate every recommender.
+
+    Returns:
+        dict: Dataset sizes, build time (s) and the results of evaluate()
+    """
+    library = generate_library(users, books, loans, reviews, skew=skew, seed=seed)
+    training, held_out = split_holdout(library['loans'], holdout=holdout)
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        app = create_benchmark_app(data_dir)
+        with app.app_context():
+            user_ids, book_ids = load_library(library, training)
+
+            started = time.perf_counter()
+            build_precomputed()
+            build_seconds = time.perf_counter() - started
+
+            held_out = {user_ids[user]: {book_ids[book] for book in held} for user, held in held_out.items()}
+            results = evaluate(app, held_out, len(book_ids), k=k, sample=sample)
+            db.session.remove()
+
+    return {
+        'users': users, 'books': books, 'loans': len(training), 'reviews': reviews,
+        'build_s': build_seconds, 'results': results
+    }
+
+
+def _print_report(report, k):
+    print(f"\n{report['users']} users, {report['books']} books, {report['loans']} loans "
+          f"(build {report['build_s']:.1f}s)")
+    print(f"{'recommender':34} {'recall@' + str(k):>9} {'coverage':>9} {'p50 ms':>8} {'p95 ms':>8} {'sql/q':>6} {'mongo/q':>8}")
+    for result in report['results']:
+        print(f"{result['recommender']:34} {result[f'recall@{k}']:9.3f} {result['coverage']:9.3f} "
+              f"{result['p50_ms']:8.1f} {result['p95_ms']:8.1f} {result['sql_queries']:6.1f} {result['mongo_queries']:8.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the LibriMongo recommenders on synthetic data.')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--books', type=int, default=500)
+    parser.add_argument('--loans', type=int, default=4000)
+    parser.add_argument('--reviews', type=int, default=1500)
+    parser.add_argument('--scales', default='1', help='Comma-separated size multipliers, e.g. 1,2,4')
+    parser.add_argument('--k', type=int, default=10, help='Recommendations per user')
+    parser.add_argument('--holdout', type=int, default=2, help='Recent loans held out per reader')
+    parser.add_argument('--sample', type=int, default=100, help='Users evaluated per run')
+    parser.add_argument('--skew', type=float, default=1.1, help='Popularity skew (0 for uniform)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='Also write the reports to this file')
+    args = parser.parse_args(argv)
+
+    reports = []
+    for scale in [float(value) for value in args.scales.split(',')]:
+        report = run_benchmark(
+            users=int(args.users * scale), books=int(args.books * scale),
+            loans=int(args.loans * scale), reviews=int(args.reviews * scale),
+            k=args.k, holdout=args.holdout, sample=args.sample, skew=args.skew, seed=args.seed
+        )
+        _print_report(report, args.k)
+        reports.append(report)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,6 +4,9 @@ from dotenv import load_dotenv
 # Load environment variables from .env file if it exists
 load_dotenv()
 
+# Project root directory (one level above this file)
+basedir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
 class Config:
     """Base configuration class."""
     # Flask configuration
@@ -23,6 +26,51 @@ class Config:
     # MongoDB configuration
     MONGO_URI = os.environ.get('MONGO_URI', 'mongodb://localhost:27017/librimongo')
     MONGO_DB_NAME = os.environ.get('MONGO_DB_NAME', 'librimongo')
+    
+    # Pagination
+    MAX_PER_PAGE = int(os.environ.get('MAX_PER_PAGE', 100))  # cap on per_page from the query string
+    COUNT_CACHE_TTL = int(os.environ.get('COUNT_CACHE_TTL', 60))  # seconds
+    COUNT_CACHE_SIZE = int(os.environ.get('COUNT_CACHE_SIZE', 1000))  # cached totals
+    COUNT_SAMPLE_SIZE = int(os.environ.get('COUNT_SAMPLE_SIZE', 1000))  # rows read to estimate a broad total
+    APPROXIMATE_COUNTS = os.environ.get('APPROXIMATE_COUNTS', 'false').lower() == 'true'  # estimated listing totals
+    
+    # Recommendation engine configuration
+    RECOMMENDER_DATA_DIR = os.environ.get('RECOMMENDER_DATA_DIR', os.path.join(basedir, 'data'))
+    PREFERENCE_MATRIX_SAVE_INTERVAL = int(os.environ.get('PREFERENCE_MATRIX_SAVE_INTERVAL', 300))  # seconds
+    SIMILAR_BOOKS_TOP_K = int(os.environ.get('SIMILAR_BOOKS_TOP_K', 20))
+    CONTENT_SIMILARITY_FULL_TEXT = os.environ.get('CONTENT_SIMILARITY_FULL_TEXT', 'false').lower() == 'true'  # also index book_texts
+    SEARCH_MAX_SEGMENTS = int(os.environ.get('SEARCH_MAX_SEGMENTS', 8))  # merged in the background beyond this
+    SEARCH_MAX_RESULTS = int(os.environ.get('SEARCH_MAX_RESULTS', 1000))  # ranked book IDs per query
+    FUZZY_SEARCH_THRESHOLD = float(os.environ.get('FUZZY_SEARCH_THRESHOLD', 0.5))  # share of query trigrams matched
+    SIMILAR_USERS_MODE = os.environ.get('SIMILAR_USERS_MODE', 'exact')  # 'exact' or 'approximate'
+    MINHASH_PERMUTATIONS = int(os.environ.get('MINHASH_PERMUTATIONS', 64))
+    LSH_BANDS = int(os.environ.get('LSH_BANDS', 16))
+    COBORROW_MERGE_BATCH = int(os.environ.get('COBORROW_MERGE_BATCH', 100))  # loans
+    COBORROW_MERGE_INTERVAL = int(os.environ.get('COBORROW_MERGE_INTERVAL', 300))  # seconds
+    LEADERBOARD_PRIOR_WEIGHT = float(os.environ.get('LEADERBOARD_PRIOR_WEIGHT', 5))  # pseudo-reviews at the mean
+    GENRE_POOL_TTL = int(os.environ.get('GENRE_POOL_TTL', 300))  # seconds
+    TRENDING_HALF_LIFE_HOURS = float(os.environ.get('TRENDING_HALF_LIFE_HOURS', 84))  # "this week"
+    TRENDING_SORT_DEPTH = int(os.environ.get('TRENDING_SORT_DEPTH', 500))  # books ranked by the list sort
+    TRENDING_RETENTION_DAYS = int(os.environ.get('TRENDING_RETENTION_DAYS', 90))  # daily buckets kept
+    COLD_START_FEED_SIZE = int(os.environ.get('COLD_START_FEED_SIZE', 50))  # book IDs per feed
+    COLD_START_FEED_DAYS = int(os.environ.get('COLD_START_FEED_DAYS', 30))  # loan window
+    ALSO_BORROWED_MIN_SUPPORT = int(os.environ.get('ALSO_BORROWED_MIN_SUPPORT', 2))  # readers of both books
+    ALSO_BORROWED_MIN_CONFIDENCE = float(os.environ.get('ALSO_BORROWED_MIN_CONFIDENCE', 0.1))
+    ALSO_BORROWED_TOP_N = int(os.environ.get('ALSO_BORROWED_TOP_N', 10))  # rules kept per book
+    COVIEW_TOP_N = int(os.environ.get('COVIEW_TOP_N', 10))  # co-viewed books served per book
+    COVIEW_HALF_LIFE_DAYS = float(os.environ.get('COVIEW_HALF_LIFE_DAYS', 14))
+    COVIEW_SESSION_MINUTES = int(os.environ.get('COVIEW_SESSION_MINUTES', 30))  # max gap between co-views
+    COVIEW_FLUSH_BATCH = int(os.environ.get('COVIEW_FLUSH_BATCH', 50))  # views
+    COVIEW_FLUSH_INTERVAL = int(os.environ.get('COVIEW_FLUSH_INTERVAL', 60))  # seconds
+    RECOMMENDATION_CACHE_SIZE = int(os.environ.get('RECOMMENDATION_CACHE_SIZE', 20))
+    RECOMMENDATION_CACHE_TTL = int(os.environ.get('RECOMMENDATION_CACHE_TTL', 3600))  # seconds
+    RECOMMENDATION_ENGINE = os.environ.get('RECOMMENDATION_ENGINE', 'heuristic')  # 'heuristic' or 'als'
+    ALS_FACTORS = int(os.environ.get('ALS_FACTORS', 32))
+    ALS_REGULARIZATION = float(os.environ.get('ALS_REGULARIZATION', 0.1))
+    ALS_ALPHA = float(os.environ.get('ALS_ALPHA', 40))  # confidence = 1 + alpha * interactions
+    ALS_ITERATIONS = int(os.environ.get('ALS_ITERATIONS', 10))
+    RECOMMENDATION_BATCH_WORKERS = int(os.environ.get('RECOMMENDATION_BATCH_WORKERS', os.cpu_count() or 1))
+    RECOMMENDATION_BATCH_CHUNK = int(os.environ.get('RECOMMENDATION_BATCH_CHUNK', 500))  # user IDs per task
 
 
 class DevelopmentConfig(Config):
@@ -41,7 +41,7 @@ class Book(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(256), nullable=False, index=True)
     author = db.Column(db.String(128), nullable=False, index=True)
-    year = db.Column(db.Integer)
+    year = db.Column(db.Integer, index=True)
     isbn = db.Column(db.String(20), unique=True, index=True)
     language = db.Column(db.String(20))
     genre = db.Column(db.String(64))
@@ -50,7 +50,7 @@ class Book(db.Model):
     cover_image_path = db.Column(db.String(256))
     available_copies = db.Column(db.Integer, default=1)
     total_copies = db.Column(db.Integer, default=1)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
@@ -1,6 +1,6 @@
 from datetime import datetime
 from bson import ObjectId
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne
 from flask import current_app
 import logging
 
@@ -150,6 +150,361 @@ class LoanHistory(MongoBase):
         """
         cls.get_collection().insert_one(data)
 
+class BookMeta(MongoBase):
+    """Model for the denormalized copy of book metadata (genre, author, language, year)."""
+    collection_name = 'book_meta'
+
+class BookNeighbors(MongoBase):
+    """Model for precomputed lists of similar books."""
+    collection_name = 'book_neighbors'
+    
+    @classmethod
+    def get_by_book(cls, book_id):
+        """Get the neighbour list document of a book."""
+        return cls.find_one({'book_id': book_id})
+    
+    @classmethod
+    def replace_neighbors(cls, book_id, neighbors):
+        """
+        Store the neighbour list of a book.
+        
+        Args:
+            book_id (int): The ID of the book
+            neighbors (list): Dicts with 'book_id' and 'similarity', best first
+        """
+        return cls.update_one(
+            {'book_id': book_id},
+            {'$set': {'neighbors': neighbors, 'stale': False, 'updated_at': datetime.utcnow()}},
+            upsert=True
+        )
+    
+    @classmethod
+    def mark_stale(cls, book_ids):
+        """Flag the neighbour lists of some books for recomputation."""
+        return cls.get_collection().update_many(
+            {'book_id': {'$in': list(book_ids)}},
+            {'$set': {'stale': True}}
+        )
+    
+    @classmethod
+    def get_stale_book_ids(cls):
+        """Get the IDs of the books whose neighbour lists are flagged for recomputation."""
+        return cls.get_collection().distinct('book_id', {'stale': True})
+
+class BookContentNeighbors(MongoBase):
+    """Model for precomputed lists of books with similar descriptions (TF-IDF cosine)."""
+    collection_name = 'book_content_neighbors'
+    
+    @classmethod
+    def get_by_book(cls, book_id):
+        """Get the content neighbour list document of a book."""
+        return cls.find_one({'book_id': book_id})
+    
+    @classmethod
+    def replace_neighbors(cls, book_id, neighbors):
+        """Store the content neighbour list of a book."""
+        return cls.update_one(
+            {'book_id': book_id},
+            {'$set': {'neighbors': neighbors, 'updated_at': datetime.utcnow()}},
+            upsert=True
+        )
+    
+    @classmethod
+    def mark_stale(cls, book_id):
+        """Flag a book whose text changed for the next content refresh."""
+        return cls.update_one(
+            {'book_id': book_id},
+            {'$set': {'stale': True, 'stale_at': datetime.utcnow()}},
+            upsert=True
+        )
+    
+    @classmethod
+    def get_stale_book_ids(cls):
+        """Get the IDs of the books flagged for the next content refresh."""
+        return cls.get_collection().distinct('book_id', {'stale': True})
+    
+    @classmethod
+    def clear_stale(cls, before, book_ids=None):
+        """Clear the flags set before a time (later edits stay flagged)."""
+        query = {'stale': True, 'stale_at': {'$lte': before}}
+        if book_ids is not None:
+            query['book_id'] = {'$in': list(book_ids)}
+        return cls.get_collection().update_many(query, {'$set': {'stale': False}})
+    
+    @classmethod
+    def remove_neighbor(cls, neighbor_id):
+        """Remove a book from every neighbour list."""
+        return cls.get_collection().update_many(
+            {'neighbors.book_id': neighbor_id},
+            {'$pull': {'neighbors': {'book_id': neighbor_id}}}
+        )
+    
+    @classmethod
+    def insert_neighbor(cls, neighbor_id, similarities, top_k):
+        """
+        Insert a book into the lists of other books, keeping each list sorted and capped.
+        
+        Args:
+            neighbor_id (int): The ID of the book to insert
+            similarities (dict): Book ID -> similarity of that book to the inserted one
+            top_k (int): Maximum length of each list
+        """
+        operations = [
+            UpdateOne({'book_id': book_id}, {'$push': {'neighbors': {
+                '$each': [{'book_id': neighbor_id, 'similarity': similarity}],
+                '$sort': {'similarity': -1},
+                '$slice': top_k
+            }}})
+            for book_id, similarity in similarities.items()
+        ]
+        if operations:
+            cls.get_collection().bulk_write(operations, ordered=False)
+
+class RatingLeaderboard(MongoBase):
+    """Model for the materialized book rating leaderboard."""
+    collection_name = 'rating_leaderboard'
+    
+    @classmethod
+    def get_top(cls, limit=10):
+        """Get the best rated books, ordered by smoothed score."""
+        return list(cls.find(sort=[('score', -1), ('book_id', 1)], limit=limit))
+
+class RecommendationCache(MongoBase):
+    """Model for cached per-user recommendation lists with activity version stamps."""
+    collection_name = 'recommendation_cache'
+    
+    @classmethod
+    def get_by_user(cls, user_id):
+        """Get the cache entry of a user."""
+        return cls.find_one({'user_id': user_id})
+    
+    @classmethod
+    def bump_version(cls, user_id):
+        """Increment a user's activity version, invalidating the cached list."""
+        return cls.update_one({'user_id': user_id}, {'$inc': {'version': 1}}, upsert=True)
+    
+    @classmethod
+    def store(cls, user_id, version, book_ids, size):
+        """
+        Store a computed list unless the user's version changed meanwhile.
+        
+        Args:
+            user_id (int): The ID of the user
+            version (int): The version the list was computed for
+            book_ids (list): Recommended book IDs, best first
+            size (int): Number of recommendations requested when computing
+        """
+        return cls.update_one(
+            {'user_id': user_id, 'version': version},
+            {'$set': {
+                'book_ids': book_ids,
+                'size': size,
+                'cached_version': version,
+                'updated_at': datetime.utcnow()
+            }},
+            upsert=True
+        )
+
+class BookTrending(MongoBase):
+    """Model for forward-decayed book activity scores, versioned by the landmark time they are relative to."""
+    collection_name = 'book_trending'
+    
+    @classmethod
+    def add(cls, book_id, landmark, amount, when):
+        """Add a decayed weight to a book's score relative to a landmark, for an event at a time."""
+        return cls.update_one(
+            {'book_id': book_id, 'landmark': landmark},
+            {'$inc': {'score': amount}, '$max': {'last_event_at': when}},
+            upsert=True
+        )
+    
+    @classmethod
+    def get_top(cls, landmark, limit=10, since=None):
+        """Get the highest scored entries relative to a landmark (only those active since a time, if given)."""
+        query = {'landmark': landmark, 'score': {'$gt': 0}}
+        if since is not None:
+            query['last_event_at'] = {'$gte': since}
+        return list(cls.find(query, sort=[('score', -1), ('book_id', 1)], limit=limit))
+    
+    @classmethod
+    def get_landmark(cls, default=None):
+        """
+        Get the landmark time of the stored scores.
+        
+        Args:
+            default (datetime, optional): Landmark to store if none is set yet
+        
+        Returns:
+            datetime: The landmark, or None if not set and no default given
+        """
+        states = cls.get_collection().database['trending_state']
+        if default is None:
+            state = states.find_one({'_id': 'landmark'})
+        else:
+            state = states.find_one_and_update(
+                {'_id': 'landmark'}, {'$setOnInsert': {'value': default}}, upsert=True, return_document=True
+            )
+        return state['value'] if state else None
+    
+    @classmethod
+    def set_landmark(cls, landmark):
+        """Set the landmark time of the stored scores."""
+        cls.get_collection().database['trending_state'].replace_one(
+            {'_id': 'landmark'}, {'_id': 'landmark', 'value': landmark}, upsert=True
+        )
+
+class CatalogVersion(MongoBase):
+    """Model for the catalog version stamp, bumped whenever a book is created, edited or deleted."""
+    collection_name = 'catalog_state'
+    
+    @classmethod
+    def get(cls):
+        """Get the current catalog version (0 before the first change)."""
+        state = cls.find_one({'_id': 'version'})
+        return state['value'] if state else 0
+    
+    @classmethod
+    def bump(cls):
+        """Increment the catalog version, invalidating the indexes built from book titles and authors."""
+        return cls.update_one({'_id': 'version'}, {'$inc': {'value': 1}}, upsert=True)
+
+class BookActivity(MongoBase):
+    """Model for per-book loan and view counts in daily buckets."""
+    collection_name = 'book_activity'
+    
+    @classmethod
+    def increment(cls, book_id, day, field):
+        """Count one event ('loans' or 'views') in a book's bucket for a day."""
+        return cls.update_one({'book_id': book_id, 'day': day}, {'$inc': {field: 1}}, upsert=True)
+    
+    @classmethod
+    def get_since(cls, day):
+        """Get all buckets from a day on."""
+        return cls.find({'day': {'$gte': day}})
+
+class BookAlsoBorrowed(MongoBase):
+    """Model for each book's "readers also borrowed" association rules."""
+    collection_name = 'book_also_borrowed'
+    
+    @classmethod
+    def get_by_book(cls, book_id):
+        """Get the rules document of a book."""
+        return cls.find_one({'book_id': book_id})
+
+class BookCoViews(MongoBase):
+    """Model for each book's most co-viewed books, with decayed counts."""
+    collection_name = 'book_coviews'
+    
+    @classmethod
+    def get_by_book(cls, book_id):
+        """Get the co-view list document of a book."""
+        return cls.find_one({'book_id': book_id})
+
+class ViewSession(MongoBase):
+    """Model for each visitor's most recent book views."""
+    collection_name = 'view_sessions'
+
+class RecommendationFeed(MongoBase):
+    """Model for precomputed cold-start feeds (ranked book IDs per key)."""
+    collection_name = 'recommendation_feeds'
+    
+    @classmethod
+    def get_by_key(cls, key):
+        """Get a feed by key ('global', 'genre:<genre>' or 'language:<language>')."""
+        return cls.find_one({'key': key})
+
+class UserGenreProfile(MongoBase):
+    """Model for each user's incrementally maintained genre preference scores."""
+    collection_name = 'user_genre_profile'
+    
+    @staticmethod
+    def encode_genre(genre):
+        """Escape a genre for use as a field name ('.' and '$' are reserved)."""
+        return genre.replace('.', '\uff0e').replace('$', '\uff04')
+    
+    @staticmethod
+    def decode_genre(field):
+        """Restore a genre escaped with encode_genre."""
+        return field.replace('\uff0e', '.').replace('\uff04', '$')
+    
+    @classmethod
+    def get_preferences(cls, user_id):
+        """Get a user's positive genre scores, or None if the user has no profile yet."""
+        profile = cls.find_one({'user_id': user_id})
+        if profile is None:
+            return None
+        return {
+            cls.decode_genre(field): score
+            for field, score in profile.get('genres', {}).items()
+            if score > 0
+        }
+    
+    @classmethod
+    def create(cls, user_id, preferences):
+        """Create a user's profile from computed genre scores."""
+        return cls.insert_one({
+            'user_id': user_id,
+            'genres': {cls.encode_genre(genre): score for genre, score in preferences.items()}
+        })
+    
+    @classmethod
+    def increment(cls, user_id, genre, delta):
+        """Add a weight to a genre score of an existing profile."""
+        return cls.update_one(
+            {'user_id': user_id},
+            {'$inc': {f'genres.{cls.encode_genre(genre)}': delta}, '$set': {'updated_at': datetime.utcnow()}}
+        )
+
+class UserRecommendations(MongoBase):
+    """Model for per-user recommendation lists materialized by the batch job."""
+    collection_name = 'user_recommendations'
+    
+    @classmethod
+    def get_by_user(cls, user_id, generation):
+        """Get a user's list from a batch generation."""
+        return cls.find_one({'user_id': user_id, 'generation': generation})
+    
+    @classmethod
+    def store_many(cls, documents):
+        """Insert a batch of materialized lists."""
+        if documents:
+            cls.get_collection().insert_many(documents, ordered=False)
+    
+    @classmethod
+    def delete_generations_before(cls, generation):
+        """Delete the lists of generations older than the given one."""
+        return cls.get_collection().delete_many({'generation': {'$lt': generation}})
+
+class RecommendationGeneration(MongoBase):
+    """Model for the metadata of each recommendation batch run."""
+    collection_name = 'recommendation_generations'
+    
+    @classmethod
+    def start(cls):
+        """Register a new generation and return its number."""
+        latest = next(cls.find(sort=[('generation', -1)], limit=1), None)
+        generation = latest['generation'] + 1 if latest else 1
+        cls.insert_one({
+            'generation': generation,
+            'status': 'running',
+            'users': 0,
+            'started_at': datetime.utcnow()
+        })
+        return generation
+    
+    @classmethod
+    def finish(cls, generation, status, users=0):
+        """Record the outcome of a generation ('complete' or 'failed')."""
+        return cls.update_one(
+            {'generation': generation},
+            {'$set': {'status': status, 'users': users, 'finished_at': datetime.utcnow()}}
+        )
+    
+    @classmethod
+    def get_latest_complete(cls):
+        """Get the most recent complete generation."""
+        return next(cls.find({'status': 'complete'}, sort=[('generation', -1)], limit=1), None)
+
 class BookText(MongoBase):
     """Model for storing book text content."""
     collection_name = 'book_texts'
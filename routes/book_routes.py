@@ -3,24 +3,30 @@ Book routes for LibriMongo application.
 Handles book listing, filtering, search, and book-specific actions.
 """
 
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app, abort
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app, abort, session
 from flask_login import login_required, current_user
 from flask_wtf import FlaskForm
 from wtforms import StringField, TextAreaField, IntegerField, SelectField, FileField, SubmitField
 from wtforms.validators import DataRequired, Length, NumberRange, Optional
 from services.book_service import (
-    get_all_books, get_book_by_id, search_books, get_book_content,
+    get_all_books, get_books_page, get_book_by_id, search_books, fuzzy_search_books, get_book_content,
     get_book_reviews, get_average_rating, add_review, lend_book,
     return_book, get_genres, get_languages, create_book, update_book,
-    delete_book, update_book_content
+    delete_book, update_book_content, update_review, mark_book_as_read,
+    KEYSET_SORT_COLUMNS
 )
-from services.recommendation_service import get_recommendations_by_book, track_user_interaction
+from utils.helpers import clamp_per_page, encode_cursor, decode_cursor
+from services.recommendation_service import get_recommendations_by_book, get_also_borrowed_books, track_user_interaction
 from services.user_service import track_book_view
+from services.trending import record_book_event
+from services.cold_start_feeds import get_cold_start_books, remember_browsed_genre
+from services.suggest_index import suggest
+from services.coview_graph import get_coviewed_books, record_book_view
 from services.auth_service import require_role
 import os
+import uuid
 from werkzeug.utils import secure_filename
 from datetime import datetime
-from models.mongodb_models import LoanHistory
 
 # Create blueprint
 book_bp = Blueprint('book_routes', __name__, url_prefix='/books')
@@ -34,7 +40,9 @@ class BookSearchForm(FlaskForm):
     sort_by = SelectField('Sort by', choices=[
         ('title', 'Title'),
         ('author', 'Author'),
-        ('year', 'Year')
+        ('year', 'Year'),
+        ('created_at', 'Date added'),
+        ('trending', 'Trending')
     ])
     sort_order = SelectField('Order', choices=[
         ('asc', 'Ascending'),
@@ -73,7 +81,9 @@ class BookContentForm(FlaskForm):
 def book_list():
     """Display a list of books with filtering and pagination."""
     page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 12, type=int)
+    per_page = clamp_per_page(request.args.get('per_page', 12, type=int))
+    cursor = request.args.get('cursor')
+    approximate = current_app.config.get('APPROXIMATE_COUNTS', False)
     view_mode = request.args.get('view', 'grid')
     
     # Initialize search form
@@ -113,17 +123,32 @@ def book_list():
     form.sort_order.data = sort_order
     
     # Get books
+    next_cursor = prev_cursor = None
+    keyset = False
     if 'query' in request.args and request.args['query']:
         query = request.args['query']
         form.query.data = query
-        books, total_pages, total_items = search_books(query, page=page, per_page=per_page)
+        books, total_pages, total_items = search_books(query, page=page, per_page=per_page, approximate=approximate)
+    elif sort_by in KEYSET_SORT_COLUMNS and (cursor or page == 1):
+        # Anterior/Siguiente avanzan con cursores; los números de página saltan con OFFSET
+        keyset = True
+        books, next_cursor, prev_cursor, total_items = get_books_page(
+            cursor=cursor,
+            per_page=per_page,
+            sort_by=sort_by,
+            sort_order=sort_order,
+            filters=filters,
+            approximate=approximate
+        )
+        total_pages = (total_items + per_page - 1) // per_page
     else:
         books, total_pages, total_items = get_all_books(
             page=page,
             per_page=per_page,
             sort_by=sort_by,
             sort_order=sort_order,
-            filters=filters
+            filters=filters,
+            approximate=approximate
         )
     
 
@@ -144,7 +169,10 @@ def book_list():
         end_item=end_item,      # Este es el valor calculado
         form=form,
         page_range=page_range,   # Calculado previamente
-        view_mode=view_mode
+        view_mode=view_mode,
+        keyset=keyset,
+        next_cursor=next_cursor,
+        prev_cursor=prev_cursor
     )
 
 @book_bp.route('/<int:book_id>')
@@ -153,15 +181,25 @@ def book_detail(book_id):
     if not book:
         abort(404)
 
+    record_book_event(book_id, 'views')
     if current_user.is_authenticated:
         track_book_view(current_user.id, book_id)
+    else:
+        session.setdefault('viewer_id', uuid.uuid4().hex)
+        record_book_view(f"session:{session['viewer_id']}", book_id)
 
     reviews = get_book_reviews(book_id)
     average_rating = get_average_rating(book_id) or 0
 
-    recommendations = []
     if current_user.is_authenticated:
         recommendations = get_recommendations_by_book(book_id)
+    else:
+        # Visitantes anónimos: feeds precalculados de los géneros que han visitado
+        session['browsed_genres'] = remember_browsed_genre(session.get('browsed_genres'), book.genre)
+        recommendations = get_cold_start_books(5, genres=session['browsed_genres'], exclude={book_id})
+
+    coviewed_books = get_coviewed_books(book_id)
+    also_borrowed_books = get_also_borrowed_books(book_id)
 
     user_review = None
     if current_user.is_authenticated:
@@ -193,6 +231,8 @@ def book_detail(book_id):
         reviews=reviews,
         average_rating=average_rating,
         recommendations=recommendations,
+        coviewed_books=coviewed_books,
+        also_borrowed_books=also_borrowed_books,
         review_form=review_form,
         user_review=user_review,
         can_read=can_read,
@@ -216,11 +256,7 @@ def add_book_review(book_id):
             
             if user_review:
                 # Update existing review
-                from models.mongodb_models import Review
-                Review.update_one(
-                    {'_id': user_review['_id']},
-                    {'$set': {'rating': form.rating.data, 'text': form.text.data}}
-                )
+                update_review(user_review['_id'], current_user.id, rating=form.rating.data, text=form.text.data)
                 flash('Your review has been updated.', 'success')
             else:
                 # Add new review
@@ -426,12 +462,13 @@ def search():
     """Search for books."""
     query = request.args.get('query', '')
     page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 12, type=int)
+    per_page = clamp_per_page(request.args.get('per_page', 12, type=int))
+    approximate = current_app.config.get('APPROXIMATE_COUNTS', False)
     
     if not query:
         return redirect(url_for('book_routes.book_list'))
     
-    books, total_pages, total_items = search_books(query, page=page, per_page=per_page)
+    books, total_pages, total_items = search_books(query, page=page, per_page=per_page, approximate=approximate)
     
     return render_template(
         'book_search_results.html',
@@ -448,9 +485,36 @@ def api_search():
     """API endpoint for searching books."""
     query = request.args.get('query', '')
     page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 12, type=int)
-    
-    books, total_pages, total_items = search_books(query, page=page, per_page=per_page)
+    per_page = clamp_per_page(request.args.get('per_page', 12, type=int))
+    fuzzy = request.args.get('fuzzy', 0, type=int) == 1
+    cursor = request.args.get('cursor')
+    approximate = current_app.config.get('APPROXIMATE_COUNTS', False)
+    next_cursor = prev_cursor = None
+    
+    if not query.strip() and not fuzzy:
+        # Sin texto: listado del catálogo con paginación por cursores
+        sort_by = request.args.get('sort_by', 'title')
+        sort_order = request.args.get('sort_order', 'asc')
+        books, next_cursor, prev_cursor, total_items = get_books_page(
+            cursor=cursor, per_page=per_page, sort_by=sort_by, sort_order=sort_order, approximate=approximate)
+        total_pages = (total_items + per_page - 1) // per_page
+    else:
+        # Los resultados se ordenan por relevancia en memoria: el cursor guarda la posición en esa lista
+        position = decode_cursor(cursor)
+        if position and position.get('query') == query and isinstance(position.get('rank'), int):
+            page = max(position['rank'], 0) // per_page + 1
+        if fuzzy:
+            books, total_pages, total_items = fuzzy_search_books(query, page=page, per_page=per_page)
+        else:
+            books, total_pages, total_items = search_books(query, page=page, per_page=per_page, approximate=approximate)
+            # Sin resultados exactos: probar con coincidencias aproximadas (errores tipográficos)
+            if not total_items and query.strip():
+                books, total_pages, total_items = fuzzy_search_books(query, page=page, per_page=per_page)
+                fuzzy = True
+        if page < total_pages:
+            next_cursor = encode_cursor({'query': query, 'rank': page * per_page})
+        if page > 1:
+            prev_cursor = encode_cursor({'query': query, 'rank': (page - 2) * per_page})
     
     # Convert books to JSON-serializable format
     books_json = []
@@ -470,24 +534,25 @@ def api_search():
         'page': page,
         'per_page': per_page,
         'total_pages': total_pages,
-        'total_items': total_items
+        'total_items': total_items,
+        'fuzzy': fuzzy,
+        'next_cursor': next_cursor,
+        'prev_cursor': prev_cursor
     })
 
+@book_bp.route('/api/suggest')
+def api_suggest():
+    """API endpoint for live search suggestions (titles and authors)."""
+    query = request.args.get('query', '')
+    limit = max(1, min(request.args.get('limit', 5, type=int), 10))
+    
+    return jsonify({'suggestions': suggest(query, limit=limit)})
+
 @book_bp.route('/<int:book_id>/mark_as_read', methods=['POST'])
 @login_required
 def mark_as_read(book_id):
     """Marca un libro como leído por el usuario actual."""
-    try:
-        # Registrar la acción en LoanHistory o en otra estructura
-        LoanHistory.insert_one({
-            'user_id': current_user.id,
-            'book_id': book_id,
-            'action': 'read',
-            'timestamp': datetime.utcnow()
-        })
-        flash('Libro marcado como leído.', 'success')
-    except Exception as e:
-        current_app.logger.error(f"Error marcando libro como leído: {str(e)}")
-        flash('Error al marcar el libro como leído.', 'danger')
+    success, message = mark_book_as_read(book_id, current_user.id)
+    flash(message, 'success' if success else 'danger')
     
     return redirect(url_for('book_routes.book_detail', book_id=book_id))
\ No newline at end of file
@@ -169,8 +169,7 @@ def loans():
     overdue_loans = get_overdue_loans(current_user.id)
     
     # Obtener recomendaciones para el usuario
-    from services.recommendation_service import get_recommendations_for_user
-    recommendations = get_recommendations_for_user(current_user.id, limit=5)
+    recommendations = get_user_recommendations(current_user.id, limit=5)
     
     # Obtener estadísticas del usuario
     from services.user_service import get_user_statistics
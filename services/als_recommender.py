@@ -0,0 +1,263 @@
+"""
+ALS recommender service for LibriMongo application.
+Trains an implicit-feedback matrix factorization (alternating least squares) on
+loans and positive reviews, persists the user and book factors to disk and
+serves a user's top-K books with one matrix-vector product.
+"""
+
+import os
+import threading
+import numpy as np
+from flask import current_app
+from models.mongodb_models import LoanHistory, Review
+from services.preference_matrix import LOAN_WEIGHT, POSITIVE_REVIEW_WEIGHT, POSITIVE_RATING
+from utils.helpers import get_app_cache
+
+MODEL_FILENAME = 'als_model.npz'
+
+
+def _solve_factors(fixed, indptr, indices, confidence, regularization):
+    """
+    Solve the least-squares step for every row given the other side's factors.
+
+    For a row u with observed columns i: x_u = (F^T F + F_i^T (C_i - 1) F_i + lambda I)^-1 F_i^T C_i,
+    where unobserved entries have preference 0 and confidence 1 (Hu, Koren and Volinsky).
+    """
+    num_factors = fixed.shape[1]
+    gram = fixed.T @ fixed + regularization * np.eye(num_factors)
+    solved = np.zeros((len(indptr) - 1, num_factors), dtype=np.float64)
+
+    for row in range(len(indptr) - 1):
+        start, end = indptr[row], indptr[row + 1]
+        if start == end:
+            continue
+        factors = fixed[indices[start:end]]
+        row_confidence = confidence[start:end]
+        system = gram + (factors.T * (row_confidence - 1)) @ factors
+        solved[row] = np.linalg.solve(system, factors.T @ row_confidence)
+    return solved
+
+
+def _csr(rows, cols, values, num_rows):
+    """Build CSR arrays (indptr, indices, data) from coordinates sorted by (row, col)."""
+    order = np.lexsort((cols, rows))
+    indptr = np.zeros(num_rows + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=num_rows), out=indptr[1:])
+    return indptr, cols[order], values[order]
+
+
+class ALSModel:
+    """User and book factor matrices with each user's read books (CSR) for exclusion."""
+
+    def __init__(self, user_ids, item_ids, user_factors, item_factors, read_indptr, read_indices):
+        self.user_ids = np.asarray(user_ids, dtype=np.int64)
+        self.item_ids = np.asarray(item_ids, dtype=np.int64)
+        self.user_factors = np.asarray(user_factors, dtype=np.float32)
+        self.item_factors = np.asarray(item_factors, dtype=np.float32)
+        self.read_indptr = np.asarray(read_indptr, dtype=np.int64)
+        self.read_indices = np.asarray(read_indices, dtype=np.int64)
+        self.user_index = {user_id: row for row, user_id in enumerate(self.user_ids.tolist())}
+        self.item_index = {item_id: col for col, item_id in enumerate(self.item_ids.tolist())}
+
+    @classmethod
+    def train(cls, user_ids, book_ids, weights, factors=32, regularization=0.1, alpha=40.0,
+              iterations=10, seed=1):
+        """
+        Train the model on (user, book, weight) interactions.
+
+        Args:
+            user_ids (array-like): User ID of each interaction
+            book_ids (array-like): Book ID of each interaction
+            weights (array-like): Strength of each interaction (summed per user and book)
+            factors (int): Number of latent factors
+            regularization (float): L2 regularization
+            alpha (float): Confidence scaling (confidence = 1 + alpha * weight)
+            iterations (int): Number of alternating passes
+            seed (int): Seed of the initial factors
+
+        Returns:
+            ALSModel: The trained model
+        """
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        book_ids = np.asarray(book_ids, dtype=np.int64)
+        weights = np.asarray(weights, dtype=np.float64)
+
+        unique_users, rows = np.unique(user_ids, return_inverse=True)
+        unique_items, cols = np.unique(book_ids, return_inverse=True)
+
+        # Sum repeated interactions of the same user and book
+        keys, inverse = np.unique(rows.astype(np.int64) * max(len(unique_items), 1) + cols, return_inverse=True)
+        strength = np.bincount(inverse, weights=weights, minlength=len(keys))
+        rows = keys // max(len(unique_items), 1)
+        cols = keys % max(len(unique_items), 1)
+        confidence = 1.0 + alpha * strength
+
+        user_indptr, user_indices, user_confidence = _csr(rows, cols, confidence, len(unique_users))
+        item_indptr, item_indices, item_confidence = _csr(cols, rows, confidence, len(unique_items))
+
+        rng = np.random.default_rng(seed)
+        user_factors = rng.normal(scale=0.01, size=(len(unique_users), factors))
+        item_factors = rng.normal(scale=0.01, size=(len(unique_items), factors))
+        for _ in range(iterations):
+            user_factors = _solve_factors(item_factors, user_indptr, user_indices, user_confidence, regularization)
+            item_factors = _solve_factors(user_factors, item_indptr, item_indices, item_confidence, regularization)
+
+        return cls(unique_users, unique_items, user_factors, item_factors, user_indptr, user_indices)
+
+    def recommend(self, user_id, limit=10, exclude_book_ids=()):
+        """
+        Get a user's top-K unread books.
+
+        Args:
+            user_id (int): The ID of the user
+            limit (int): Maximum number of books to return
+            exclude_book_ids (iterable): Extra book IDs to exclude (e.g. read after training)
+
+        Returns:
+            list: Book IDs, best first, or None if the user is not in the model
+        """
+        row = self.user_index.get(user_id)
+        if row is None or limit <= 0:
+            return None if row is None else []
+
+        scores = self.item_factors @ self.user_factors[row]
+
+        # Bitmap of the books the user has read
+        read = np.zeros(len(self.item_ids), dtype=bool)
+        read[self.read_indices[self.read_indptr[row]:self.read_indptr[row + 1]]] = True
+        for book_id in exclude_book_ids:
+            col = self.item_index.get(book_id)
+            if col is not None:
+                read[col] = True
+
+        candidates = np.flatnonzero(~read)
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+        candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+        return self.item_ids[candidates].tolist()
+
+    def save(self, path):
+        """Save the model to a .npz file (written atomically)."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(
+            tmp_path,
+            user_ids=self.user_ids,
+            item_ids=self.item_ids,
+            user_factors=self.user_factors,
+            item_factors=self.item_factors,
+            read_indptr=self.read_indptr,
+            read_indices=self.read_indices
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Load a model saved with save()."""
+        with np.load(path) as data:
+            return cls(data['user_ids'], data['item_ids'], data['user_factors'], data['item_factors'],
+                       data['read_indptr'], data['read_indices'])
+
+
+def load_interactions():
+    """
+    Read the implicit feedback: every loan and every positive review.
+
+    Returns:
+        tuple: (user_ids, book_ids, weights) lists
+    """
+    user_ids = []
+    book_ids = []
+    weights = []
+    for loan in LoanHistory.get_collection().find({}, {'user_id': 1, 'book_id': 1, '_id': 0}):
+        if 'user_id' in loan and 'book_id' in loan:
+            user_ids.append(loan['user_id'])
+            book_ids.append(loan['book_id'])
+            weights.append(LOAN_WEIGHT)
+    for review in Review.get_collection().find(
+        {'rating': {'$gte': POSITIVE_RATING}}, {'user_id': 1, 'book_id': 1, '_id': 0}
+    ):
+        if 'user_id' in review and 'book_id' in review:
+            user_ids.append(review['user_id'])
+            book_ids.append(review['book_id'])
+            weights.append(POSITIVE_REVIEW_WEIGHT)
+    return user_ids, book_ids, weights
+
+
+def _model_path():
+    return os.path.join(current_app.config['RECOMMENDER_DATA_DIR'], MODEL_FILENAME)
+
+
+def _get_state():
+    state = get_app_cache('als_recommender')
+    state.setdefault('lock', threading.RLock())
+    return state
+
+
+def train_als_model(factors=None, iterations=None):
+    """
+    Train the ALS model on the current interactions and persist it.
+
+    Args:
+        factors (int, optional): Latent factors (defaults to ALS_FACTORS)
+        iterations (int, optional): Alternating passes (defaults to ALS_ITERATIONS)
+
+    Returns:
+        ALSModel: The trained model
+    """
+    config = current_app.config
+    model = ALSModel.train(
+        *load_interactions(),
+        factors=factors or config.get('ALS_FACTORS', 32),
+        regularization=config.get('ALS_REGULARIZATION', 0.1),
+        alpha=config.get('ALS_ALPHA', 40.0),
+        iterations=iterations or config.get('ALS_ITERATIONS', 10)
+    )
+    state = _get_state()
+    with state['lock']:
+        model.save(_model_path())
+        state['model'] = model
+        state['mtime'] = os.path.getmtime(_model_path())
+    return model
+
+
+def get_als_model():
+    """
+    Get the trained model, reloading it when the file on disk changed.
+
+    Returns:
+        ALSModel: The model, or None if it has not been trained yet
+    """
+    path = _model_path()
+    if not os.path.exists(path):
+        return None
+
+    state = _get_state()
+    mtime = os.path.getmtime(path)
+    if state.get('model') is None or state.get('mtime') != mtime:
+        with state['lock']:
+            if state.get('model') is None or state.get('mtime') != mtime:
+                state['model'] = ALSModel.load(path)
+                state['mtime'] = mtime
+    return state['model']
+
+
+def get_als_recommendations(user_id, limit=10):
+    """
+    Get a user's top-K book IDs from the ALS model.
+
+    Books borrowed after the model was trained are excluded as well.
+
+    Args:
+        user_id (int): The ID of the user
+        limit (int): Maximum number of books to return
+
+    Returns:
+        list: Book IDs, best first, or None if there is no model or the user is not in it
+    """
+    model = get_als_model()
+    if model is None or user_id not in model.user_index:
+        return None
+
+    recent = LoanHistory.get_collection().distinct('book_id', {'user_id': user_id})
+    return model.recommend(user_id, limit=limit, exclude_book_ids=recent)
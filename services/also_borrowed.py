@@ -0,0 +1,118 @@
+"""
+"Readers also borrowed" service for LibriMongo application.
+Mines association rules (book A -> book B) from the loan history in one pass
+sorted by user and stores the best rules of each book as a small document, so a
+book page reads its "readers also borrowed" list with a single lookup.
+"""
+
+from collections import Counter
+from itertools import combinations, groupby
+from flask import current_app
+from pymongo import ReplaceOne
+from models.mongodb_models import BookAlsoBorrowed, LoanHistory
+
+# Most recent books of a single reader counted in pairs (bounds the quadratic pair count)
+MAX_BASKET_SIZE = 200
+
+BULK_WRITE_SIZE = 1000
+
+
+def mine_also_borrowed(loans, min_support=2, min_confidence=0.1, top_n=10):
+    """
+    Mine "readers of A also borrowed B" rules from loans sorted by user.
+
+    Args:
+        loans (iterable): (user_id, book_id) pairs, grouped by user and oldest first
+        min_support (int): Minimum number of readers who borrowed both books
+        min_confidence (float): Minimum share of A's readers who also borrowed B
+        top_n (int): Rules kept per book
+
+    Returns:
+        tuple: (book ID -> list of dicts with 'book_id', 'support', 'confidence'
+            and 'lift', best first; number of readers)
+    """
+    readers = Counter()
+    pairs = Counter()
+    total_readers = 0
+    for _, user_loans in groupby(loans, key=lambda loan: loan[0]):
+        # Heavy readers only count their latest books, so no range of IDs is favoured
+        recent = dict.fromkeys(book_id for _, book_id in reversed(list(user_loans)))
+        basket = sorted(list(recent)[:MAX_BASKET_SIZE])
+        total_readers += 1
+        readers.update(basket)
+        pairs.update(combinations(basket, 2))
+
+    rules = {}
+    for (book_a, book_b), support in pairs.items():
+        if support < min_support:
+            continue
+        for antecedent, consequent in ((book_a, book_b), (book_b, book_a)):
+            confidence = support / readers[antecedent]
+            if confidence >= min_confidence:
+                rules.setdefault(antecedent, []).append({
+                    'book_id': consequent,
+                    'support': support,
+                    'confidence': confidence,
+                    'lift': confidence * total_readers / readers[consequent]
+                })
+
+    for antecedent, book_rules in rules.items():
+        book_rules.sort(key=lambda rule: (-rule['confidence'], -rule['lift'], rule['book_id']))
+        del book_rules[top_n:]
+    return rules, total_readers
+
+
+def build_also_borrowed(min_support=None, min_confidence=None, top_n=None):
+    """
+    Rebuild the "readers also borrowed" list of every book from loan_history.
+
+    Args:
+        min_support (int, optional): Defaults to ALSO_BORROWED_MIN_SUPPORT
+        min_confidence (float, optional): Defaults to ALSO_BORROWED_MIN_CONFIDENCE
+        top_n (int, optional): Defaults to ALSO_BORROWED_TOP_N
+
+    Returns:
+        int: Number of books with at least one rule
+    """
+    min_support = min_support or current_app.config.get('ALSO_BORROWED_MIN_SUPPORT', 2)
+    min_confidence = min_confidence or current_app.config.get('ALSO_BORROWED_MIN_CONFIDENCE', 0.1)
+    top_n = top_n or current_app.config.get('ALSO_BORROWED_TOP_N', 10)
+
+    cursor = LoanHistory.get_collection().find(
+        {'user_id': {'$exists': True}, 'book_id': {'$exists': True}},
+        {'user_id': 1, 'book_id': 1, '_id': 0}
+    ).sort([('user_id', 1), ('_id', 1)])
+    rules, _ = mine_also_borrowed(
+        ((loan['user_id'], loan['book_id']) for loan in cursor),
+        min_support=min_support, min_confidence=min_confidence, top_n=top_n
+    )
+
+    collection = BookAlsoBorrowed.get_collection()
+    operations = []
+    for book_id, book_rules in rules.items():
+        operations.append(ReplaceOne({'book_id': book_id}, {'book_id': book_id, 'books': book_rules}, upsert=True))
+        if len(operations) >= BULK_WRITE_SIZE:
+            collection.bulk_write(operations, ordered=False)
+            operations = []
+    if operations:
+        collection.bulk_write(operations, ordered=False)
+
+    collection.delete_many({'book_id': {'$nin': list(rules)}})
+    return len(rules)
+
+
+def get_also_borrowed_ids(book_id, limit=5):
+    """
+    Get the books most often borrowed by the readers of a book.
+
+    Args:
+        book_id (int): The ID of the book
+        limit (int): Maximum number of book IDs
+
+    Returns:
+        list: Book IDs, best rule first
+    """
+    document = BookAlsoBorrowed.get_by_book(book_id)
+    if not document:
+        return []
+    return [rule['book_id'] for rule in document.get('books', [])[:limit]]
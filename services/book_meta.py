@@ -0,0 +1,170 @@
+"""
+Book metadata mirror service for LibriMongo application.
+Keeps a denormalized copy of each book's genre, author, language and year in the
+book_meta collection, so genre preference and popularity computations run as
+single aggregation pipelines ($lookup/$group) inside MongoDB instead of joining
+Mongo documents back to MariaDB books in Python.
+"""
+
+import threading
+from flask import current_app
+from pymongo import ReplaceOne
+from models.mariadb_models import Book, db
+from models.mongodb_models import BookMeta, LoanHistory, RatingLeaderboard
+from utils.helpers import get_app_cache
+
+BULK_WRITE_SIZE = 1000
+
+
+def book_meta_document(book):
+    """Get the book_meta document of a book."""
+    return {
+        'book_id': book.id,
+        'genre': book.genre,
+        'author': book.author,
+        'language': book.language,
+        'year': book.year
+    }
+
+
+def sync_book_meta(book):
+    """
+    Write a created or updated book to the mirror.
+
+    Args:
+        book (Book): The book
+
+    Returns:
+        bool: Whether the update was successful
+    """
+    try:
+        BookMeta.get_collection().replace_one({'book_id': book.id}, book_meta_document(book), upsert=True)
+        return True
+    except Exception as e:
+        current_app.logger.error(f"Error syncing book metadata: {str(e)}")
+        return False
+
+
+def remove_book_meta(book_id):
+    """
+    Remove a deleted book from the mirror.
+
+    Args:
+        book_id (int): The ID of the book
+
+    Returns:
+        bool: Whether the removal was successful
+    """
+    try:
+        BookMeta.delete_one({'book_id': book_id})
+        return True
+    except Exception as e:
+        current_app.logger.error(f"Error removing book metadata: {str(e)}")
+        return False
+
+
+def rebuild_book_meta():
+    """
+    Copy the metadata of every book to the mirror.
+
+    Returns:
+        int: Number of books mirrored
+    """
+    collection = BookMeta.get_collection()
+    book_ids = []
+    operations = []
+    for book in Book.query.yield_per(BULK_WRITE_SIZE):
+        book_ids.append(book.id)
+        operations.append(ReplaceOne({'book_id': book.id}, book_meta_document(book), upsert=True))
+        if len(operations) >= BULK_WRITE_SIZE:
+            collection.bulk_write(operations, ordered=False)
+            operations = []
+    if operations:
+        collection.bulk_write(operations, ordered=False)
+
+    collection.delete_many({'book_id': {'$nin': book_ids}})
+    get_app_cache('book_meta')['ready'] = True
+    return len(book_ids)
+
+
+def ensure_book_meta():
+    """Fill the mirror once if it is empty (e.g. first start after an upgrade)."""
+    state = get_app_cache('book_meta')
+    state.setdefault('lock', threading.RLock())
+    if state.get('ready'):
+        return
+    with state['lock']:
+        if not state.get('ready'):
+            if BookMeta.get_collection().estimated_document_count() == 0 and db.session.query(Book.id).first():
+                rebuild_book_meta()
+            state['ready'] = True
+
+
+def aggregate_user_genre_counts(collection, match=None):
+    """
+    Count, per user and genre, the distinct books of a collection joined to book_meta.
+
+    Args:
+        collection (pymongo.collection.Collection): loan_history or reviews
+        match (dict, optional): Filter applied first (e.g. one user, positive ratings)
+
+    Returns:
+        list: (user_id, genre, books) tuples
+    """
+    ensure_book_meta()
+    query = {'user_id': {'$exists': True}, 'book_id': {'$exists': True}}
+    query.update(match or {})
+    pipeline = [
+        {'$match': query},
+        {'$group': {'_id': {'user_id': '$user_id', 'book_id': '$book_id'}}},
+        {'$lookup': {'from': BookMeta.collection_name, 'localField': '_id.book_id',
+                     'foreignField': 'book_id', 'as': 'book'}},
+        {'$unwind': '$book'},
+        {'$match': {'book.genre': {'$nin': [None, '']}}},
+        {'$group': {'_id': {'user_id': '$_id.user_id', 'genre': '$book.genre'}, 'books': {'$sum': 1}}}
+    ]
+    return [
+        (group['_id']['user_id'], group['_id']['genre'], group['books'])
+        for group in collection.aggregate(pipeline)
+    ]
+
+
+def aggregate_recent_loans(since):
+    """
+    Count the loans of each existing book since a date.
+
+    Args:
+        since (datetime): Start of the window
+
+    Returns:
+        dict: Book ID -> loans
+    """
+    ensure_book_meta()
+    pipeline = [
+        {'$match': {'loan_date': {'$gte': since}, 'book_id': {'$exists': True}}},
+        {'$group': {'_id': '$book_id', 'loans': {'$sum': 1}}},
+        {'$lookup': {'from': BookMeta.collection_name, 'localField': '_id',
+                     'foreignField': 'book_id', 'as': 'book'}},
+        {'$match': {'book': {'$ne': []}}},
+        {'$project': {'loans': 1}}
+    ]
+    return {group['_id']: group['loans'] for group in LoanHistory.get_collection().aggregate(pipeline)}
+
+
+def aggregate_book_ratings():
+    """
+    Get every book's genre, language and leaderboard score.
+
+    Returns:
+        list: (book_id, genre, language, score) tuples (score 0 for unrated books)
+    """
+    ensure_book_meta()
+    pipeline = [
+        {'$lookup': {'from': RatingLeaderboard.collection_name, 'localField': 'book_id',
+                     'foreignField': 'book_id', 'as': 'rating'}},
+        {'$project': {'_id': 0, 'book_id': 1, 'genre': 1, 'language': 1, 'score': {'$max': '$rating.score'}}}
+    ]
+    return [
+        (book['book_id'], book.get('genre'), book.get('language'), book.get('score') or 0)
+        for book in BookMeta.get_collection().aggregate(pipeline)
+    ]
@@ -6,41 +6,48 @@ Handles book management, search, filtering, and lending operations.
 from datetime import datetime
 from flask import current_app
 from models.mariadb_models import Book, Loan, db
-from models.mongodb_models import Review, BookText, LoanHistory
-from utils.helpers import calculate_due_date, log_activity
+from sqlalchemy import case, and_, or_
+from models.mongodb_models import Review, BookText, LoanHistory, BookNeighbors, BookTrending, CatalogVersion
+from services.preference_matrix import record_loan_signal, record_review_signal, POSITIVE_RATING
+from services.similarity_index import mark_book_neighbors_stale
+from services.coborrow_matrix import record_coborrow
+from services.reader_lsh import record_reader_loan
+from services.recommendation_cache import bump_recommendation_version
+from services.trending import get_trending_book_ids, record_book_event
+from services.content_similarity import mark_book_content_stale, remove_book_content
+from services.book_meta import sync_book_meta, remove_book_meta
+from services.search_index import index_books, remove_books_from_index, search_book_ids
+from services.trigram_index import fuzzy_search_book_ids
+from services.count_cache import listing_count, invalidate_counts
+from utils.helpers import calculate_due_date, log_activity, clamp_per_page, encode_cursor, decode_cursor
+from utils.text import tokenize
 
-def get_all_books(page=1, per_page=12, sort_by=None, sort_order='asc', filters=None):
+# Sorts paginated with keyset (seek) cursors; year and created_at may be NULL
+KEYSET_SORT_COLUMNS = {
+    'title': Book.title,
+    'author': Book.author,
+    'year': Book.year,
+    'created_at': Book.created_at,
+}
+NULLABLE_SORTS = {'year', 'created_at'}
+
+def get_all_books(page=1, per_page=12, sort_by=None, sort_order='asc', filters=None, approximate=False):
     """
     Get all books with pagination, sorting, and filtering.
     
     Args:
         page (int): Page number (1-indexed)
         per_page (int): Number of items per page
-        sort_by (str): Field to sort by (title, author, year)
+        sort_by (str): Field to sort by (title, author, year, created_at, trending)
         sort_order (str): Sort order ('asc' or 'desc')
         filters (dict): Filters to apply (author, genre, language, etc.)
+        approximate (bool): Whether an estimated total is good enough (see services.count_cache)
         
     Returns:
         tuple: (books, total_pages, total_items)
     """
-    query = Book.query
-    
-    # Apply filters
-    if filters:
-        if 'title' in filters and filters['title']:
-            query = query.filter(Book.title.ilike(f"%{filters['title']}%"))
-        if 'author' in filters and filters['author']:
-            query = query.filter(Book.author.ilike(f"%{filters['author']}%"))
-        if 'genre' in filters and filters['genre']:
-            query = query.filter(Book.genre == filters['genre'])
-        if 'language' in filters and filters['language']:
-            query = query.filter(Book.language == filters['language'])
-        if 'year_from' in filters and filters['year_from']:
-            query = query.filter(Book.year >= filters['year_from'])
-        if 'year_to' in filters and filters['year_to']:
-            query = query.filter(Book.year <= filters['year_to'])
-        if 'available' in filters and filters['available']:
-            query = query.filter(Book.available_copies > 0)
+    per_page = clamp_per_page(per_page)
+    query = _filter_books(Book.query, filters)
     
     # Apply sorting
     if sort_by == 'title':
@@ -58,14 +65,140 @@ def get_all_books(page=1, per_page=12, sort_by=None, sort_order='asc', filters=N
             query = query.order_by(Book.year.desc())
         else:
             query = query.order_by(Book.year)
+    elif sort_by == 'created_at':
+        if sort_order == 'desc':
+            query = query.order_by(Book.created_at.desc(), Book.id.desc())
+        else:
+            query = query.order_by(Book.created_at, Book.id)
+    elif sort_by == 'trending':
+        # Most trending first whatever the order; books without recent activity follow by title
+        trending_ids = get_trending_book_ids(limit=current_app.config.get('TRENDING_SORT_DEPTH', 500))
+        if trending_ids:
+            rank = case({book_id: pos for pos, book_id in enumerate(trending_ids)},
+                        value=Book.id, else_=len(trending_ids))
+            query = query.order_by(rank, Book.title)
+        else:
+            query = query.order_by(Book.title)
     else:
         # Default sorting
         query = query.order_by(Book.title)
     
     # Execute query with pagination
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+    return _paginate(query, page, per_page, 'books', Book, filters, approximate)
+
+def _paginate(query, page, per_page, scope, model, count_key, approximate):
+    """Fetch one page of a query, taking its total from the count cache."""
+    pagination = query.paginate(page=page, per_page=per_page, error_out=False, count=False)
+    total = listing_count(scope, model, query, count_key, approximate=approximate)
+    return pagination.items, (total + per_page - 1) // per_page, total
+
+def _filter_books(query, filters):
+    """Apply the catalog filters (author, genre, language, etc.) to a book query."""
+    if filters:
+        if 'title' in filters and filters['title']:
+            query = query.filter(Book.title.ilike(f"%{filters['title']}%"))
+        if 'author' in filters and filters['author']:
+            query = query.filter(Book.author.ilike(f"%{filters['author']}%"))
+        if 'genre' in filters and filters['genre']:
+            query = query.filter(Book.genre == filters['genre'])
+        if 'language' in filters and filters['language']:
+            query = query.filter(Book.language == filters['language'])
+        if 'year_from' in filters and filters['year_from']:
+            query = query.filter(Book.year >= filters['year_from'])
+        if 'year_to' in filters and filters['year_to']:
+            query = query.filter(Book.year <= filters['year_to'])
+        if 'available' in filters and filters['available']:
+            query = query.filter(Book.available_copies > 0)
+    return query
+
+def get_books_page(cursor=None, per_page=12, sort_by='title', sort_order='asc', filters=None, approximate=False):
+    """
+    Get a page of books with keyset (seek) pagination.
+    
+    Pages are found with a (sort_key, id) predicate instead of an OFFSET, so
+    every page costs the same however deep it is. NULL years and dates sort
+    before any value, as in get_all_books.
     
-    return pagination.items, pagination.pages, pagination.total
+    Args:
+        cursor (str, optional): Token of the page to get (next_cursor or prev_cursor
+            of another page); the first page if missing or not for this sort
+        per_page (int): Number of items per page
+        sort_by (str): Field to sort by (title, author, year, created_at)
+        sort_order (str): Sort order ('asc' or 'desc')
+        filters (dict): Filters to apply (author, genre, language, etc.)
+        approximate (bool): Whether an estimated total is good enough (see services.count_cache)
+        
+    Returns:
+        tuple: (books, next_cursor, prev_cursor, total_items)
+    """
+    per_page = clamp_per_page(per_page)
+    if sort_by not in KEYSET_SORT_COLUMNS:
+        sort_by = 'title'
+    descending = sort_order == 'desc'
+    column = KEYSET_SORT_COLUMNS[sort_by]
+    query = _filter_books(Book.query, filters)
+    total_items = listing_count('books', Book, query, filters, approximate=approximate)
+    
+    position = decode_cursor(cursor)
+    if position and (position.get('sort'), position.get('desc')) != (sort_by, descending):
+        position = None
+    backwards = bool(position) and position.get('dir') == 'prev'
+    
+    if position:
+        try:
+            key = _cursor_value(sort_by, position.get('key'))
+            book_id = int(position['id'])
+        except (KeyError, TypeError, ValueError):
+            position = None
+            backwards = False
+        else:
+            # Rows after the position in reading order: later keys when ascending, earlier when descending
+            query = query.filter(_seek_predicate(sort_by, column, key, book_id, later=descending == backwards))
+    
+    # Read backwards to find the previous page, then restore the reading order;
+    # MariaDB and SQLite both sort NULLs first ascending, matching _seek_predicate
+    order = [column, Book.id]
+    query = query.order_by(*(c.desc() if descending != backwards else c for c in order))
+    books = query.limit(per_page + 1).all()
+    has_more = len(books) > per_page
+    books = books[:per_page]
+    if backwards:
+        books.reverse()
+    
+    if not books:
+        return [], None, None, total_items
+    has_next = has_more if not backwards else True
+    has_prev = has_more if backwards else bool(position)
+    next_cursor = _book_cursor(books[-1], sort_by, descending, 'next') if has_next else None
+    prev_cursor = _book_cursor(books[0], sort_by, descending, 'prev') if has_prev else None
+    return books, next_cursor, prev_cursor, total_items
+
+def _seek_predicate(sort_by, column, key, book_id, later):
+    """Filter the books after (or before) the position (key, book_id) in ascending (NULL first) order."""
+    if later:
+        if key is None:
+            return or_(and_(column.is_(None), Book.id > book_id), column.isnot(None))
+        after = or_(column > key, and_(column == key, Book.id > book_id))
+        return and_(column.isnot(None), after) if sort_by in NULLABLE_SORTS else after
+    if key is None:
+        return and_(column.is_(None), Book.id < book_id)
+    before = or_(column < key, and_(column == key, Book.id < book_id))
+    return or_(column.is_(None), before) if sort_by in NULLABLE_SORTS else before
+
+def _book_cursor(book, sort_by, descending, direction):
+    key = getattr(book, sort_by)
+    if isinstance(key, datetime):
+        key = key.isoformat()
+    return encode_cursor({'sort': sort_by, 'desc': descending, 'dir': direction, 'key': key, 'id': book.id})
+
+def _cursor_value(sort_by, key):
+    if key is None:
+        return None
+    if sort_by == 'created_at':
+        return datetime.fromisoformat(key)
+    if sort_by == 'year':
+        return int(key)
+    return str(key)
 
 def get_book_by_id(book_id):
     """
@@ -91,18 +224,35 @@ def get_book_by_isbn(isbn):
     """
     return Book.query.filter_by(isbn=isbn).first()
 
-def search_books(query, page=1, per_page=12):
+def search_books(query, page=1, per_page=12, approximate=False):
     """
     Search for books by title, author, or description.
     
+    Uses the BM25 inverted index (see services.search_index), so results come
+    most relevant first and only the books of the page are loaded. Queries with
+    no indexable word (empty, or only stopwords) and index failures fall back
+    to a LIKE scan ordered by title.
+    
     Args:
         query (str): The search query
         page (int): Page number (1-indexed)
         per_page (int): Number of items per page
+        approximate (bool): Whether an estimated total is good enough for the LIKE scan
         
     Returns:
         tuple: (books, total_pages, total_items)
     """
+    per_page = clamp_per_page(per_page)
+    if tokenize(query):
+        try:
+            # Keep enough IDs for the requested page; the total counts every match
+            limit = max(current_app.config.get('SEARCH_MAX_RESULTS', 1000), page * per_page)
+            book_ids, total = search_book_ids(query, limit=limit)
+        except Exception as e:
+            current_app.logger.error(f"Error searching the index: {str(e)}")
+        else:
+            return _paginate_book_ids(book_ids, page, per_page, total)
+    
     search_query = f"%{query}%"
     book_query = Book.query.filter(
         (Book.title.ilike(search_query)) |
@@ -110,9 +260,28 @@ def search_books(query, page=1, per_page=12):
         (Book.description.ilike(search_query))
     ).order_by(Book.title)
     
-    pagination = book_query.paginate(page=page, per_page=per_page, error_out=False)
+    return _paginate(book_query, page, per_page, 'books', Book, {'search': query}, approximate)
+
+def fuzzy_search_books(query, page=1, per_page=12):
+    """
+    Search for books whose title or author resembles a possibly misspelled query.
     
-    return pagination.items, pagination.pages, pagination.total
+    Args:
+        query (str): The search query
+        page (int): Page number (1-indexed)
+        per_page (int): Number of items per page
+        
+    Returns:
+        tuple: (books, total_pages, total_items)
+    """
+    return _paginate_book_ids(fuzzy_search_book_ids(query), page, clamp_per_page(per_page))
+
+def _paginate_book_ids(book_ids, page, per_page, total=None):
+    """Load the books of one page of a ranked list of IDs (of total matches, if capped), keeping the ranking."""
+    total = len(book_ids) if total is None else total
+    page_ids = book_ids[(page - 1) * per_page:page * per_page]
+    books = {book.id: book for book in Book.query.filter(Book.id.in_(page_ids)).all()} if page_ids else {}
+    return [books[i] for i in page_ids if i in books], (total + per_page - 1) // per_page, total
 
 def get_book_content(book_id):
     """Retrieve the content of a book from MongoDB using its ID."""
@@ -169,6 +338,9 @@ def add_review(book_id, user_id, rating, text=None):
     
     # Add review
     review_id = Review.create(book_id, user_id, rating, text)
+    if rating >= POSITIVE_RATING:
+        record_review_signal(user_id, book_id, 1)
+    bump_recommendation_version(user_id)
     log_activity('add_review', user_id=user_id, book_id=book_id, details={'rating': rating})
     
     return review_id
@@ -203,6 +375,10 @@ def update_review(review_id, user_id, rating=None, text=None):
     
     # Update the review
     result = Review.update_one({'_id': review_id, 'user_id': user_id}, update)
+    if rating is not None:
+        was_positive = review.get('rating', 0) >= POSITIVE_RATING
+        record_review_signal(user_id, review['book_id'], int(rating >= POSITIVE_RATING) - int(was_positive))
+    bump_recommendation_version(user_id)
     log_activity('update_review', user_id=user_id, book_id=review['book_id'], details={'review_id': str(review_id)})
     
     return result.modified_count > 0
@@ -225,10 +401,21 @@ def delete_review(review_id, user_id):
     
     # Delete the review
     result = Review.delete_one({'_id': review_id, 'user_id': user_id})
+    if result.deleted_count > 0 and review.get('rating', 0) >= POSITIVE_RATING:
+        record_review_signal(user_id, review['book_id'], -1)
+    bump_recommendation_version(user_id)
     log_activity('delete_review', user_id=user_id, book_id=review['book_id'], details={'review_id': str(review_id)})
     
     return result.deleted_count > 0
 
+def _on_loan_recorded(user_id, book_id):
+    """Update the recommendation structures after a loan history entry is added."""
+    record_loan_signal(user_id, book_id)
+    record_coborrow(user_id, book_id)
+    record_reader_loan(user_id, book_id)
+    mark_book_neighbors_stale(user_id, book_id)
+    bump_recommendation_version(user_id)
+
 def lend_book(book_id, user_id, days=14):
     """
     Lend a book to a user.
@@ -278,6 +465,9 @@ def lend_book(book_id, user_id, days=14):
         
         # Create loan history entry
         LoanHistory.create_from_loan(loan)
+        _on_loan_recorded(user_id, book_id)
+        invalidate_counts('books', 'loans')
+        record_book_event(book_id, 'loans')
         
         log_activity('lend_book', user_id=user_id, book_id=book_id, details={'loan_id': loan.id})
         return True, loan
@@ -319,6 +509,8 @@ def return_book(loan_id, user_id):
             {'loan_id': loan.id},
             {'$set': {'return_date': loan.return_date, 'is_returned': True}}
         )
+        bump_recommendation_version(user_id)
+        invalidate_counts('books', 'loans')
         
         log_activity('return_book', user_id=user_id, book_id=loan.book_id, details={'loan_id': loan.id})
         return True, "Book returned successfully"
@@ -327,7 +519,33 @@ def return_book(loan_id, user_id):
         current_app.logger.error(f"Error returning book: {str(e)}")
         return False, "Error returning book"
 
-def get_user_loans(user_id, include_returned=False, page=1, per_page=10):
+def mark_book_as_read(book_id, user_id):
+    """
+    Mark a book as read by a user.
+    
+    Args:
+        book_id (int): The ID of the book
+        user_id (int): The ID of the user
+        
+    Returns:
+        tuple: (success, message)
+    """
+    try:
+        LoanHistory.insert_one({
+            'user_id': user_id,
+            'book_id': book_id,
+            'action': 'read',
+            'timestamp': datetime.utcnow()
+        })
+        _on_loan_recorded(user_id, book_id)
+        
+        log_activity('mark_as_read', user_id=user_id, book_id=book_id)
+        return True, "Libro marcado como leído."
+    except Exception as e:
+        current_app.logger.error(f"Error marcando libro como leído: {str(e)}")
+        return False, "Error al marcar el libro como leído."
+
+def get_user_loans(user_id, include_returned=False, page=1, per_page=10, approximate=False):
     """
     Get loans for a user.
     
@@ -336,10 +554,12 @@ def get_user_loans(user_id, include_returned=False, page=1, per_page=10):
         include_returned (bool): Whether to include returned loans
         page (int): Page number (1-indexed)
         per_page (int): Number of items per page
+        approximate (bool): Whether an estimated total is good enough (see services.count_cache)
         
     Returns:
         tuple: (loans, total_pages, total_items)
     """
+    per_page = clamp_per_page(per_page)
     query = Loan.query.filter_by(user_id=user_id)
     
     if not include_returned:
@@ -347,11 +567,10 @@ def get_user_loans(user_id, include_returned=False, page=1, per_page=10):
     
     query = query.order_by(Loan.loan_date.desc())
     
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-    
-    return pagination.items, pagination.pages, pagination.total
+    count_key = {'user_id': user_id, 'include_returned': include_returned}
+    return _paginate(query, page, per_page, 'loans', Loan, count_key, approximate)
 
-def get_book_loans(book_id, include_returned=False, page=1, per_page=10):
+def get_book_loans(book_id, include_returned=False, page=1, per_page=10, approximate=False):
     """
     Get loans for a book.
     
@@ -360,10 +579,12 @@ def get_book_loans(book_id, include_returned=False, page=1, per_page=10):
         include_returned (bool): Whether to include returned loans
         page (int): Page number (1-indexed)
         per_page (int): Number of items per page
+        approximate (bool): Whether an estimated total is good enough (see services.count_cache)
         
     Returns:
         tuple: (loans, total_pages, total_items)
     """
+    per_page = clamp_per_page(per_page)
     query = Loan.query.filter_by(book_id=book_id)
     
     if not include_returned:
@@ -371,9 +592,8 @@ def get_book_loans(book_id, include_returned=False, page=1, per_page=10):
     
     query = query.order_by(Loan.loan_date.desc())
     
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-    
-    return pagination.items, pagination.pages, pagination.total
+    count_key = {'book_id': book_id, 'include_returned': include_returned}
+    return _paginate(query, page, per_page, 'loans', Loan, count_key, approximate)
 
 def get_genres():
     """
@@ -444,6 +664,12 @@ def create_book(title, author, year=None, isbn=None, language=None, genre=None,
         if content:
             BookText.create(book.id, content, format=content_format)
         
+        sync_book_meta(book)
+        invalidate_counts('books')
+        CatalogVersion.bump()
+        index_books([book.id])
+        mark_book_content_stale(book.id)
+        
         log_activity('create_book', book_id=book.id)
         return True, book
     except Exception as e:
@@ -483,6 +709,10 @@ def update_book(book_id, title=None, author=None, year=None, isbn=None, language
     if isbn and isbn != book.isbn and Book.query.filter_by(isbn=isbn).first():
         return False, "ISBN already exists"
     
+    # Title and description feed the content similarity index
+    text_changed = (title is not None and title != book.title) or \
+        (description is not None and description != book.description)
+    
     # Update fields
     if title is not None:
         book.title = title
@@ -509,6 +739,17 @@ def update_book(book_id, title=None, author=None, year=None, isbn=None, language
     
     try:
         db.session.commit()
+        
+        # Genre or author may have changed
+        BookNeighbors.mark_stale([book.id])
+        sync_book_meta(book)
+        invalidate_counts('books')
+        if text_changed or author is not None:
+            CatalogVersion.bump()
+            index_books([book.id])
+        if text_changed:
+            mark_book_content_stale(book.id)
+        
         log_activity('update_book', book_id=book.id)
         return True, book
     except Exception as e:
@@ -574,13 +815,21 @@ def delete_book(book_id):
         return False, "Cannot delete book with active loans"
     
     try:
-        # Delete book content
+        # Delete book content, similarity list and trending score
         BookText.delete_one({'book_id': book_id})
+        BookNeighbors.delete_one({'book_id': book_id})
+        BookTrending.get_collection().delete_many({'book_id': book_id})
         
         # Delete book
         db.session.delete(book)
         db.session.commit()
         
+        remove_book_meta(book_id)
+        invalidate_counts('books')
+        CatalogVersion.bump()
+        remove_books_from_index([book_id])
+        remove_book_content(book_id)
+        
         log_activity('delete_book', book_id=book_id)
         return True, "Book deleted successfully"
     except Exception as e:
@@ -0,0 +1,329 @@
+"""
+Co-borrow matrix service for LibriMongo application.
+Keeps a sparse book x user incidence matrix (CSR arrays built from loan_history)
+so co-borrow counts and Jaccard similarities of one book against every other book
+come from a single sparse product instead of per-pair sets of user IDs.
+"""
+
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+import numpy as np
+from bson import ObjectId
+from flask import current_app
+from models.mongodb_models import LoanHistory
+from utils.helpers import get_app_cache
+
+# Seconds of loan history read again on each append
+SCAN_OVERLAP_SECONDS = 60
+
+# Appends remembered for structures derived from the matrix (see get_coborrow_changes)
+CHANGE_LOG_SIZE = 32
+
+
+class CoBorrowMatrix:
+    """Binary book x user matrix in CSR form, with its transpose for user -> books lookups."""
+
+    def __init__(self, book_ids, user_ids, indptr, indices, t_indptr, t_indices):
+        self.book_ids = book_ids
+        self.user_ids = user_ids
+        self.indptr = indptr
+        self.indices = indices
+        self.t_indptr = t_indptr
+        self.t_indices = t_indices
+        self.degrees = np.diff(indptr)
+        # Set by the process cache: bumped on every build or append
+        self.generation = 0
+        self.book_position = {book_id: pos for pos, book_id in enumerate(book_ids.tolist())}
+
+    @classmethod
+    def from_pairs(cls, book_ids, user_ids):
+        """
+        Build the matrix from (book_id, user_id) pairs; duplicates are ignored.
+
+        Args:
+            book_ids (array-like): Book ID of each loan
+            user_ids (array-like): User ID of each loan
+
+        Returns:
+            CoBorrowMatrix: The matrix
+        """
+        book_ids = np.asarray(book_ids, dtype=np.int64)
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+
+        unique_books, rows = np.unique(book_ids, return_inverse=True)
+        unique_users, cols = np.unique(user_ids, return_inverse=True)
+
+        # Sort and deduplicate the (row, col) coordinates
+        keys = np.unique(rows.astype(np.int64) * max(len(unique_users), 1) + cols)
+        rows = keys // max(len(unique_users), 1)
+        cols = keys % max(len(unique_users), 1)
+
+        indptr = np.zeros(len(unique_books) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=len(unique_books)), out=indptr[1:])
+
+        order = np.lexsort((rows, cols))
+        t_indptr = np.zeros(len(unique_users) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cols, minlength=len(unique_users)), out=t_indptr[1:])
+
+        return cls(unique_books, unique_users, indptr, cols, t_indptr, rows[order])
+
+    def __len__(self):
+        return len(self.book_ids)
+
+    def pairs(self):
+        """Get the (book_id, user_id) pairs stored in the matrix."""
+        rows = np.repeat(np.arange(len(self.book_ids)), self.degrees)
+        return self.book_ids[rows], self.user_ids[self.indices]
+
+    def borrowers(self, book_id):
+        """Get the user IDs that borrowed a book."""
+        pos = self.book_position.get(book_id)
+        if pos is None:
+            return np.empty(0, dtype=np.int64)
+        return self.user_ids[self.indices[self.indptr[pos]:self.indptr[pos + 1]]]
+
+    def co_counts(self, book_id):
+        """
+        Count common borrowers between a book and every book (row of A x A^T).
+
+        Args:
+            book_id (int): The ID of the book
+
+        Returns:
+            numpy.ndarray: Common borrower counts aligned with book_ids
+        """
+        pos = self.book_position.get(book_id)
+        if pos is None:
+            return np.zeros(len(self.book_ids), dtype=np.int64)
+
+        users = self.indices[self.indptr[pos]:self.indptr[pos + 1]]
+        starts = self.t_indptr[users]
+        lengths = self.t_indptr[users + 1] - starts
+        if lengths.sum() == 0:
+            return np.zeros(len(self.book_ids), dtype=np.int64)
+
+        # Gather the concatenated book lists of all borrowers without a Python loop
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        return np.bincount(self.t_indices[offsets], minlength=len(self.book_ids))
+
+    def jaccard(self, book_id):
+        """
+        Jaccard similarity of a book's borrowers against every book's borrowers.
+
+        Args:
+            book_id (int): The ID of the book
+
+        Returns:
+            numpy.ndarray: Similarities (0-1) aligned with book_ids
+        """
+        pos = self.book_position.get(book_id)
+        if pos is None:
+            return np.zeros(len(self.book_ids), dtype=np.float64)
+
+        common = self.co_counts(book_id)
+        union = self.degrees[pos] + self.degrees - common
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(union > 0, common / union, 0.0)
+
+    def jaccard_pair(self, book_id1, book_id2):
+        """Jaccard similarity between the borrowers of two books."""
+        users1 = self.borrowers(book_id1)
+        users2 = self.borrowers(book_id2)
+        if len(users1) == 0 or len(users2) == 0:
+            return 0.0
+        common = len(np.intersect1d(users1, users2, assume_unique=True))
+        return common / (len(users1) + len(users2) - common)
+
+    def merged(self, book_ids, user_ids):
+        """
+        Get a new matrix with extra (book_id, user_id) pairs appended.
+
+        Stored entries are already sorted, so only the new pairs are sorted and
+        then spliced into both CSR layouts in one linear pass; pairs already in
+        the matrix are ignored.
+
+        Args:
+            book_ids (array-like): Book ID of each new loan
+            user_ids (array-like): User ID of each new loan
+
+        Returns:
+            CoBorrowMatrix: The matrix with the new pairs (self if none is new)
+        """
+        new_books = np.asarray(book_ids, dtype=np.int64)
+        new_users = np.asarray(user_ids, dtype=np.int64)
+        all_books = np.union1d(self.book_ids, new_books)
+        all_users = np.union1d(self.user_ids, new_users)
+        num_books, num_users = len(all_books), max(len(all_users), 1)
+
+        # Positions of the stored books and users in the grown ID arrays (order is kept)
+        book_remap = np.searchsorted(all_books, self.book_ids)
+        user_remap = np.searchsorted(all_users, self.user_ids)
+        rows = book_remap[np.repeat(np.arange(len(self.book_ids)), self.degrees)]
+        keys = rows * num_users + user_remap[self.indices]
+
+        new_rows = np.searchsorted(all_books, new_books)
+        new_cols = np.searchsorted(all_users, new_users)
+        new_keys = np.unique(new_rows * num_users + new_cols)
+        at = np.searchsorted(keys, new_keys)
+        if len(keys):
+            stored = keys[np.minimum(at, len(keys) - 1)] == new_keys
+            new_keys, at = new_keys[~stored], at[~stored]
+        if len(new_keys) == 0:
+            return self
+
+        keys = np.insert(keys, at, new_keys)
+        rows = keys // num_users
+        cols = keys % num_users
+        indptr = np.zeros(num_books + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=num_books), out=indptr[1:])
+
+        # Same splice on the transpose, whose entries are sorted by (user, book)
+        t_rows = user_remap[np.repeat(np.arange(len(self.user_ids)), np.diff(self.t_indptr))]
+        t_keys = t_rows * num_books + book_remap[self.t_indices]
+        new_t_keys = np.sort((new_keys % num_users) * num_books + new_keys // num_users)
+        t_keys = np.insert(t_keys, np.searchsorted(t_keys, new_t_keys), new_t_keys)
+        t_indptr = np.zeros(len(all_users) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(t_keys // num_books, minlength=len(all_users)), out=t_indptr[1:])
+
+        return CoBorrowMatrix(all_books, all_users, indptr, cols, t_indptr, t_keys % num_books)
+
+def _loan_pairs(query=None):
+    """Get the (book_id, user_id) pairs of the loan history entries matching a query."""
+    book_ids = []
+    user_ids = []
+    for loan in LoanHistory.get_collection().find(query or {}, {'user_id': 1, 'book_id': 1, '_id': 0}):
+        if 'user_id' in loan and 'book_id' in loan:
+            book_ids.append(loan['book_id'])
+            user_ids.append(loan['user_id'])
+    return book_ids, user_ids
+
+
+def build_coborrow_matrix():
+    """
+    Build the co-borrow matrix with one scan of the loan history.
+
+    Returns:
+        CoBorrowMatrix: The matrix
+    """
+    return CoBorrowMatrix.from_pairs(*_loan_pairs())
+
+
+def _get_state():
+    state = get_app_cache('coborrow_matrix')
+    state.setdefault('lock', threading.RLock())
+    state.setdefault('pending', 0)
+    state.setdefault('generation', 0)
+    state.setdefault('changes', deque(maxlen=CHANGE_LOG_SIZE))
+    return state
+
+
+def _reset(state, matrix, scanned_at, appended=None):
+    """Install a built (appended is None) or appended matrix as the next generation."""
+    state['generation'] += 1
+    if appended is None:
+        state['changes'].clear()
+    else:
+        state['changes'].append((state['generation'], appended))
+    matrix.generation = state['generation']
+    state['matrix'] = matrix
+    state['scanned_at'] = scanned_at
+    state['pending'] = 0
+    state['merged_at'] = time.time()
+
+
+def get_coborrow_matrix(merge_pending=False):
+    """
+    Get the co-borrow matrix, building it on first use.
+
+    Loans recorded since the last scan (by any process) are read back from
+    loan_history and appended in batches: every COBORROW_MERGE_INTERVAL seconds,
+    or sooner once this process has recorded COBORROW_MERGE_BATCH loans.
+    merge_pending forces the append.
+
+    Args:
+        merge_pending (bool): Whether to append all newer loans first
+
+    Returns:
+        CoBorrowMatrix: The matrix
+    """
+    state = _get_state()
+    with state['lock']:
+        if state.get('matrix') is None:
+            scanned_at = datetime.utcnow()
+            _reset(state, build_coborrow_matrix(), scanned_at)
+        else:
+            batch_size = current_app.config.get('COBORROW_MERGE_BATCH', 100)
+            interval = current_app.config.get('COBORROW_MERGE_INTERVAL', 300)
+            if (merge_pending or state['pending'] >= batch_size
+                    or time.time() - state.get('merged_at', 0) >= interval):
+                # Entries are found by the creation time in their ObjectId; the overlap covers
+                # clock skew and slow inserts, and pairs already in the matrix are skipped
+                scanned_at = datetime.utcnow()
+                since = ObjectId.from_datetime(state['scanned_at'] - timedelta(seconds=SCAN_OVERLAP_SECONDS))
+                book_ids, user_ids = _loan_pairs({'_id': {'$gte': since}})
+                _reset(state, state['matrix'].merged(book_ids, user_ids), scanned_at, (book_ids, user_ids))
+        return state['matrix']
+
+
+def get_coborrow_changes(since, until):
+    """
+    Get the loans appended to the matrix between two of its generations.
+
+    Loans may repeat pairs already in the matrix. Structures derived from the
+    matrix use this to catch up with loans recorded by other processes.
+
+    Args:
+        since (int): Generation the caller is up to date with
+        until (int): Generation to catch up to
+
+    Returns:
+        tuple: (book IDs, user IDs) of the appended loans, or None if the matrix was
+            rebuilt in between or the appends are no longer remembered
+    """
+    state = _get_state()
+    with state['lock']:
+        changes = [pairs for generation, pairs in state['changes'] if since < generation <= until]
+    if len(changes) != until - since:
+        return None
+    return [book_id for book_ids, _ in changes for book_id in book_ids], \
+        [user_id for _, user_ids in changes for user_id in user_ids]
+
+
+def rebuild_coborrow_matrix():
+    """
+    Rebuild the co-borrow matrix from the loan history.
+
+    Returns:
+        CoBorrowMatrix: The new matrix
+    """
+    scanned_at = datetime.utcnow()
+    matrix = build_coborrow_matrix()
+    state = _get_state()
+    with state['lock']:
+        _reset(state, matrix, scanned_at)
+    return matrix
+
+
+def record_coborrow(user_id, book_id):
+    """
+    Note a new loan, so the matrix appends the latest loans once enough have been made.
+
+    The loan itself is read back from loan_history, where every process sees it.
+
+    Args:
+        user_id (int): The ID of the user
+        book_id (int): The ID of the book
+
+    Returns:
+        bool: Whether the loan was noted
+    """
+    try:
+        state = _get_state()
+        with state['lock']:
+            state['pending'] += 1
+        return True
+    except Exception as e:
+        current_app.logger.error(f"Error recording co-borrow: {str(e)}")
+        return False
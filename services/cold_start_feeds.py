@@ -0,0 +1,184 @@
+"""
+Cold-start feed service for LibriMongo application.
+Precomputes ranked lists of book IDs (global, per genre and per language) and
+stores one document per feed, so recommendations for users without history and
+for anonymous visitors are a single key lookup.
+"""
+
+import math
+from datetime import datetime, timedelta
+from flask import current_app
+from pymongo import ReplaceOne
+from models.mariadb_models import Book
+from models.mongodb_models import RecommendationFeed
+from services.book_meta import aggregate_book_ratings, aggregate_recent_loans
+from services.rating_leaderboard import get_top_rated_book_ids
+from services.trending import get_trending_book_ids
+
+GLOBAL_FEED = 'global'
+
+# Weight of the smoothed rating (scaled to 0-1) against recent loans (scaled to 0-1)
+RATING_FEED_WEIGHT = 0.5
+
+# Browsed genres remembered per anonymous session
+MAX_BROWSED_GENRES = 5
+
+
+def genre_feed(genre):
+    """Key of the feed of a genre."""
+    return f'genre:{genre}'
+
+
+def language_feed(language):
+    """Key of the feed of a language."""
+    return f'language:{language}'
+
+
+def build_recommendation_feeds(size=None, days=None):
+    """
+    Rank every book once and store the global, genre and language feeds.
+
+    Books are scored by their loans in the last days plus their smoothed rating,
+    both scaled to 0-1. Both inputs are aggregations over the book_meta mirror.
+
+    Args:
+        size (int, optional): Book IDs kept per feed (defaults to COLD_START_FEED_SIZE)
+        days (int, optional): Loan window in days (defaults to COLD_START_FEED_DAYS)
+
+    Returns:
+        int: Number of feeds stored
+    """
+    size = size or current_app.config.get('COLD_START_FEED_SIZE', 50)
+    days = days or current_app.config.get('COLD_START_FEED_DAYS', 30)
+    since = datetime.utcnow() - timedelta(days=days)
+
+    recent_loans = aggregate_recent_loans(since)
+    max_loans = max(recent_loans.values(), default=0) or 1
+
+    ranked = []
+    for book_id, genre, language, rating in aggregate_book_ratings():
+        score = recent_loans.get(book_id, 0) / max_loans + RATING_FEED_WEIGHT * rating / 5
+        ranked.append((-score, book_id, genre, language))
+    ranked.sort()
+
+    feeds = {GLOBAL_FEED: []}
+    for _, book_id, genre, language in ranked:
+        keys = [GLOBAL_FEED]
+        if genre:
+            keys.append(genre_feed(genre))
+        if language:
+            keys.append(language_feed(language))
+        for key in keys:
+            feed = feeds.setdefault(key, [])
+            if len(feed) < size:
+                feed.append(book_id)
+
+    now = datetime.utcnow()
+    collection = RecommendationFeed.get_collection()
+    collection.bulk_write([
+        ReplaceOne({'key': key}, {'key': key, 'book_ids': book_ids, 'updated_at': now}, upsert=True)
+        for key, book_ids in feeds.items()
+    ], ordered=False)
+    collection.delete_many({'key': {'$nin': list(feeds)}})
+    return len(feeds)
+
+
+def get_feed_book_ids(key, limit=None):
+    """
+    Get the book IDs of a stored feed.
+
+    Feeds are never rebuilt during a request; the rebuild-feeds command
+    refreshes them on a schedule. Until the global feed has been built (fresh
+    deployment, dropped collection) it is made of the trending books followed
+    by the best rated ones.
+
+    Args:
+        key (str): Feed key (GLOBAL_FEED, genre_feed() or language_feed())
+        limit (int, optional): Maximum number of book IDs to return
+
+    Returns:
+        list: Book IDs, best first (empty for unknown genres or languages)
+    """
+    feed = RecommendationFeed.get_by_key(key)
+    if feed is None and key == GLOBAL_FEED:
+        size = limit or current_app.config.get('COLD_START_FEED_SIZE', 50)
+        book_ids = get_trending_book_ids(size)
+        seen = set(book_ids)
+        book_ids += [book_id for book_id in get_top_rated_book_ids(size) if book_id not in seen]
+        return book_ids[:size]
+    book_ids = feed.get('book_ids', []) if feed else []
+    return book_ids[:limit] if limit is not None else book_ids
+
+
+def remember_browsed_genre(browsed, genre):
+    """
+    Count a genre browsed in an anonymous session.
+
+    Args:
+        browsed (dict): Genre -> books viewed, as stored in the session
+        genre (str): Genre of the viewed book
+
+    Returns:
+        dict: Updated counts, limited to the MAX_BROWSED_GENRES most viewed genres
+    """
+    browsed = dict(browsed or {})
+    if genre:
+        browsed[genre] = browsed.get(genre, 0) + 1
+    return dict(sorted(browsed.items(), key=lambda item: -item[1])[:MAX_BROWSED_GENRES])
+
+
+def get_cold_start_book_ids(limit=10, genres=None, language=None, exclude=frozenset()):
+    """
+    Get recommendations for a visitor without history from the precomputed feeds.
+
+    Slots are shared among the browsed genres in proportion to their views, then
+    completed from the language feed and the global feed.
+
+    Args:
+        limit (int): Maximum number of book IDs to return
+        genres (dict, optional): Genre -> views of the visitor
+        language (str, optional): Preferred language
+        exclude (set): Book IDs to skip (e.g. the book being viewed)
+
+    Returns:
+        list: Book IDs, best first
+    """
+    chosen = []
+    seen = set(exclude)
+
+    def take(book_ids, count):
+        for book_id in book_ids:
+            if len(chosen) >= limit or count <= 0:
+                return
+            if book_id not in seen:
+                seen.add(book_id)
+                chosen.append(book_id)
+                count -= 1
+
+    total_views = sum((genres or {}).values())
+    for genre, views in sorted((genres or {}).items(), key=lambda item: -item[1]):
+        take(get_feed_book_ids(genre_feed(genre)), math.ceil(limit * views / total_views))
+    if language:
+        take(get_feed_book_ids(language_feed(language)), limit)
+    take(get_feed_book_ids(GLOBAL_FEED), limit)
+    return chosen
+
+
+def get_cold_start_books(limit=10, genres=None, language=None, exclude=frozenset()):
+    """
+    Get cold-start recommendations as books (one query).
+
+    Args:
+        limit (int): Maximum number of books to return
+        genres (dict, optional): Genre -> views of the visitor
+        language (str, optional): Preferred language
+        exclude (set): Book IDs to skip
+
+    Returns:
+        list: Recommended books
+    """
+    book_ids = get_cold_start_book_ids(limit=limit, genres=genres, language=language, exclude=exclude)
+    if not book_ids:
+        return []
+    books = {book.id: book for book in Book.query.filter(Book.id.in_(book_ids)).all()}
+    return [books[book_id] for book_id in book_ids if book_id in books]
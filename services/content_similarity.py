@@ -0,0 +1,475 @@
+"""
+Content similarity service for LibriMongo application.
+Builds an L2-normalized TF-IDF matrix (CSR arrays) over book titles and
+descriptions and stores each book's top-K most similar books by content, so
+new books without loans still get "similar books"; edited books are flagged
+and refreshed together by a batch job.
+"""
+
+import multiprocessing
+import os
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import numpy as np
+from flask import current_app
+from pymongo import UpdateOne
+from models.mariadb_models import Book, db
+from models.mongodb_models import BookContentNeighbors, BookText
+from utils.helpers import get_app_cache, file_lock
+from utils.text import tokenize
+
+INDEX_FILENAME = 'content_index.npz'
+
+BULK_WRITE_SIZE = 1000
+
+# Books scored per task when neighbour lists are computed in worker processes
+NEIGHBOR_CHUNK_SIZE = 2000
+
+# Books whose lists may receive an edited book (the best scoring ones)
+REFRESH_FANOUT_FACTOR = 10
+
+def _weights(counts, idf):
+    """Sublinear TF x IDF weights of a term-count mapping, L2-normalized."""
+    indices = np.array(sorted(counts), dtype=np.int64)
+    if len(indices) == 0:
+        return indices, np.zeros(0, dtype=np.float32)
+    tf = 1 + np.log(np.array([counts[i] for i in indices.tolist()], dtype=np.float64))
+    data = tf * idf[indices]
+    norm = np.linalg.norm(data)
+    return indices, (data / norm if norm > 0 else data).astype(np.float32)
+
+
+class ContentIndex:
+    """TF-IDF rows of every book (CSR) with term posting lists for one-vs-all cosine scores."""
+
+    def __init__(self, book_ids, terms, idf, indptr, indices, data):
+        self.book_ids = np.asarray(book_ids, dtype=np.int64)
+        self.terms = list(terms)
+        self.idf = np.asarray(idf, dtype=np.float64)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.data = np.asarray(data, dtype=np.float32)
+        self.position = {book_id: pos for pos, book_id in enumerate(self.book_ids.tolist())}
+        self.term_index = {term: i for i, term in enumerate(self.terms)}
+
+        # Transpose to term -> (book positions, weights)
+        rows = np.repeat(np.arange(len(self.book_ids)), np.diff(self.indptr))
+        order = np.lexsort((rows, self.indices))
+        self.t_indptr = np.zeros(len(self.terms) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.indices, minlength=len(self.terms)), out=self.t_indptr[1:])
+        self.t_rows = rows[order]
+        self.t_data = self.data[order]
+
+    def __len__(self):
+        return len(self.book_ids)
+
+    @classmethod
+    def from_texts(cls, book_ids, texts):
+        """
+        Build the index from the text of each book.
+
+        Args:
+            book_ids (list): Book IDs
+            texts (list): Text of each book, aligned with book_ids
+
+        Returns:
+            ContentIndex: The index
+        """
+        term_index = {}
+        documents = []
+        for text in texts:
+            documents.append(Counter(term_index.setdefault(term, len(term_index)) for term in tokenize(text)))
+
+        document_frequency = np.zeros(len(term_index), dtype=np.float64)
+        for counts in documents:
+            document_frequency[list(counts)] += 1
+        idf = np.log((1 + len(documents)) / (1 + document_frequency)) + 1
+
+        indptr = [0]
+        indices = []
+        data = []
+        for counts in documents:
+            row_indices, row_data = _weights(counts, idf)
+            indices.append(row_indices)
+            data.append(row_data)
+            indptr.append(indptr[-1] + len(row_indices))
+
+        return cls(
+            book_ids,
+            sorted(term_index, key=term_index.get),
+            idf,
+            indptr,
+            np.concatenate(indices) if indices else np.zeros(0, dtype=np.int64),
+            np.concatenate(data) if data else np.zeros(0, dtype=np.float32)
+        )
+
+    def vectorize(self, text):
+        """TF-IDF row of a text with the index vocabulary (unknown terms are ignored)."""
+        counts = Counter(self.term_index[term] for term in tokenize(text) if term in self.term_index)
+        return _weights(counts, self.idf)
+
+    def row(self, book_id):
+        """Get the stored TF-IDF row of a book."""
+        pos = self.position[book_id]
+        return self.indices[self.indptr[pos]:self.indptr[pos + 1]], self.data[self.indptr[pos]:self.indptr[pos + 1]]
+
+    def scores(self, indices, data):
+        """
+        Cosine similarity of a TF-IDF row against every book.
+
+        Args:
+            indices (numpy.ndarray): Term indices of the row
+            data (numpy.ndarray): Weights of the row
+
+        Returns:
+            numpy.ndarray: Similarities aligned with book_ids
+        """
+        starts = self.t_indptr[indices]
+        lengths = self.t_indptr[indices + 1] - starts
+        total = int(lengths.sum())
+        if total == 0:
+            return np.zeros(len(self.book_ids), dtype=np.float64)
+
+        # Gather the posting lists of all the row's terms without a Python loop
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(total)
+        weights = np.repeat(data.astype(np.float64), lengths) * self.t_data[offsets]
+        return np.bincount(self.t_rows[offsets], weights=weights, minlength=len(self.book_ids))
+
+    def neighbors(self, book_id, top_k, scores=None):
+        """
+        Get the most similar books of a book.
+
+        Args:
+            book_id (int): The ID of the book
+            top_k (int): Maximum number of neighbours
+            scores (numpy.ndarray, optional): Precomputed similarities of the book
+
+        Returns:
+            list: Dicts with 'book_id' and 'similarity', best first
+        """
+        if scores is None:
+            scores = self.scores(*self.row(book_id))
+        scores = scores.copy()
+        scores[self.position[book_id]] = 0
+
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > top_k:
+            candidates = np.sort(candidates[np.argpartition(-scores[candidates], top_k - 1)[:top_k]])
+        candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+        return [
+            {'book_id': int(self.book_ids[pos]), 'similarity': float(scores[pos])}
+            for pos in candidates
+        ]
+
+    def with_documents(self, texts, deleted_ids=()):
+        """
+        Get a new index with rows added, replaced or removed (same vocabulary and IDF).
+
+        Args:
+            texts (dict): Book ID -> text of each added or edited book
+            deleted_ids (iterable): IDs of the books to remove
+
+        Returns:
+            ContentIndex: The new index
+        """
+        changed = set(texts) | set(deleted_ids)
+        book_ids = [other_id for other_id in self.book_ids.tolist() if other_id not in changed]
+        rows = [self.row(other_id) for other_id in book_ids]
+        book_ids.extend(texts)
+        rows.extend(self.vectorize(text) for text in texts.values())
+        return self._from_rows(book_ids, rows)
+
+    def _from_rows(self, book_ids, rows):
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum([len(indices) for indices, _ in rows], out=indptr[1:])
+        return ContentIndex(
+            book_ids,
+            self.terms,
+            self.idf,
+            indptr,
+            np.concatenate([indices for indices, _ in rows]) if rows else np.zeros(0, dtype=np.int64),
+            np.concatenate([data for _, data in rows]) if rows else np.zeros(0, dtype=np.float32)
+        )
+
+    def save(self, path):
+        """Save the index to a .npz file (written atomically)."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(
+            tmp_path,
+            book_ids=self.book_ids,
+            terms=np.array(self.terms, dtype=str),
+            idf=self.idf,
+            indptr=self.indptr,
+            indices=self.indices,
+            data=self.data
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Load an index saved with save()."""
+        with np.load(path) as data:
+            return cls(data['book_ids'], data['terms'].tolist(), data['idf'],
+                       data['indptr'], data['indices'], data['data'])
+
+
+def _book_text(title, description, content=None):
+    return ' '.join(part for part in (title, description, content) if part)
+
+
+def load_book_texts(book_ids=None):
+    """
+    Get the text indexed for books: title and description, plus the full text if
+    CONTENT_SIMILARITY_FULL_TEXT is set.
+
+    Args:
+        book_ids (list, optional): Only these books (all books if None)
+
+    Returns:
+        tuple: (book IDs, texts)
+    """
+    query = db.session.query(Book.id, Book.title, Book.description).order_by(Book.id)
+    if book_ids is not None:
+        query = query.filter(Book.id.in_(book_ids))
+    rows = query.all()
+
+    contents = {}
+    if current_app.config.get('CONTENT_SIMILARITY_FULL_TEXT', False):
+        text_query = {} if book_ids is None else {'book_id': {'$in': list(book_ids)}}
+        for text in BookText.get_collection().find(text_query, {'book_id': 1, 'content': 1, '_id': 0}):
+            contents[text.get('book_id')] = text.get('content')
+
+    return [row[0] for row in rows], [_book_text(row[1], row[2], contents.get(row[0])) for row in rows]
+
+
+# Index used by the neighbour worker processes, received once through the pool initializer
+_worker_index = None
+
+
+def _init_worker(arrays):
+    global _worker_index
+    _worker_index = ContentIndex(*arrays)
+
+
+def _neighbors_in_worker(task):
+    book_ids, top_k = task
+    return [(book_id, _worker_index.neighbors(book_id, top_k)) for book_id in book_ids]
+
+
+def compute_all_neighbors(index, top_k, workers=1):
+    """
+    Compute the neighbour list of every book, in parallel chunks if workers > 1.
+
+    Args:
+        index (ContentIndex): The index
+        top_k (int): Neighbours kept per book
+        workers (int): Number of worker processes
+
+    Returns:
+        iterator: (book_id, neighbours) pairs
+    """
+    book_ids = index.book_ids.tolist()
+    tasks = [(book_ids[i:i + NEIGHBOR_CHUNK_SIZE], top_k) for i in range(0, len(book_ids), NEIGHBOR_CHUNK_SIZE)]
+
+    if workers > 1 and len(tasks) > 1:
+        arrays = (index.book_ids, index.terms, index.idf, index.indptr, index.indices, index.data)
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks)), mp_context=context,
+                                 initializer=_init_worker, initargs=(arrays,)) as executor:
+            for chunk in executor.map(_neighbors_in_worker, tasks):
+                yield from chunk
+    else:
+        for book_id in book_ids:
+            yield book_id, index.neighbors(book_id, top_k)
+
+
+def _index_path():
+    return os.path.join(current_app.config['RECOMMENDER_DATA_DIR'], INDEX_FILENAME)
+
+
+def _get_state():
+    state = get_app_cache('content_similarity')
+    state.setdefault('lock', threading.RLock())
+    return state
+
+
+def _store_index(index):
+    state = _get_state()
+    with state['lock']:
+        index.save(_index_path())
+        state['index'] = index
+        state['mtime'] = os.path.getmtime(_index_path())
+
+
+def _saved_index():
+    """Get the index saved on disk, building it if missing; the caller holds the file lock."""
+    state = _get_state()
+    path = _index_path()
+    if not os.path.exists(path):
+        _store_index(ContentIndex.from_texts(*load_book_texts()))
+    else:
+        with state['lock']:
+            mtime = os.path.getmtime(path)
+            if state.get('index') is None or state.get('mtime') != mtime:
+                state['index'] = ContentIndex.load(path)
+                state['mtime'] = mtime
+    return state['index']
+
+
+def build_content_index(top_k=None, workers=None):
+    """
+    Rebuild the TF-IDF index and the content neighbour list of every book.
+
+    Args:
+        top_k (int, optional): Neighbours kept per book (defaults to SIMILAR_BOOKS_TOP_K)
+        workers (int, optional): Worker processes (defaults to RECOMMENDATION_BATCH_WORKERS)
+
+    Returns:
+        int: Number of books indexed
+    """
+    top_k = top_k or current_app.config.get('SIMILAR_BOOKS_TOP_K', 20)
+    workers = workers or current_app.config.get('RECOMMENDATION_BATCH_WORKERS', 1)
+
+    started_at = datetime.utcnow()
+    with file_lock(_index_path() + '.lock'):
+        index = ContentIndex.from_texts(*load_book_texts())
+        _store_index(index)
+
+    collection = BookContentNeighbors.get_collection()
+    operations = []
+    for book_id, neighbors in compute_all_neighbors(index, top_k, workers=workers):
+        operations.append(UpdateOne({'book_id': book_id}, {'$set': {'neighbors': neighbors}}, upsert=True))
+        if len(operations) >= BULK_WRITE_SIZE:
+            collection.bulk_write(operations, ordered=False)
+            operations = []
+    if operations:
+        collection.bulk_write(operations, ordered=False)
+
+    collection.delete_many({'book_id': {'$nin': index.book_ids.tolist()}})
+    BookContentNeighbors.clear_stale(started_at)
+    return len(index)
+
+
+def get_content_index():
+    """
+    Get the TF-IDF index, reloading it when another process saved a newer one.
+
+    Returns:
+        ContentIndex: The index
+    """
+    state = _get_state()
+    path = _index_path()
+    mtime = os.path.getmtime(path) if os.path.exists(path) else None
+    if state.get('index') is None or mtime is None or state.get('mtime') != mtime:
+        with file_lock(path + '.lock'):
+            return _saved_index()
+    return state['index']
+
+
+def _rerank_book(index, book_id, top_k):
+    """Store a book's own list, then insert the book where it now ranks in the lists of similar books."""
+    scores = index.scores(*index.row(book_id))
+    BookContentNeighbors.replace_neighbors(book_id, index.neighbors(book_id, top_k, scores=scores))
+
+    # Take the book out of every list, then insert it where it now ranks
+    BookContentNeighbors.remove_neighbor(book_id)
+    scores[index.position[book_id]] = 0
+    fanout = min(REFRESH_FANOUT_FACTOR * top_k, int((scores > 0).sum()))
+    if fanout:
+        candidates = np.argpartition(-scores, fanout - 1)[:fanout]
+        BookContentNeighbors.insert_neighbor(
+            book_id,
+            {int(index.book_ids[pos]): float(scores[pos]) for pos in candidates},
+            top_k
+        )
+
+
+def refresh_stale_book_content(top_k=None):
+    """
+    Apply the text changes of the books flagged since the last refresh.
+
+    The changed rows are replaced in the index in one pass and saved once, under
+    a file lock shared by every process. Each changed book then gets a new list
+    and is re-ranked into the REFRESH_FANOUT_FACTOR * top_k lists of the books
+    most similar to it. The vocabulary and IDF stay those of the last full
+    build. Meant to run as a batch job (rebuild-content-similarity --stale-only).
+
+    Args:
+        top_k (int, optional): Neighbours kept per book (defaults to SIMILAR_BOOKS_TOP_K)
+
+    Returns:
+        int: Number of books refreshed
+    """
+    top_k = top_k or current_app.config.get('SIMILAR_BOOKS_TOP_K', 20)
+    started_at = datetime.utcnow()
+    stale_ids = BookContentNeighbors.get_stale_book_ids()
+    if not stale_ids:
+        return 0
+
+    book_ids, texts = load_book_texts(stale_ids)
+    deleted_ids = set(stale_ids) - set(book_ids)
+    with file_lock(_index_path() + '.lock'):
+        index = _saved_index().with_documents(dict(zip(book_ids, texts)), deleted_ids)
+        _store_index(index)
+
+    for book_id in deleted_ids:
+        BookContentNeighbors.delete_one({'book_id': book_id})
+        BookContentNeighbors.remove_neighbor(book_id)
+    for book_id in book_ids:
+        _rerank_book(index, book_id, top_k)
+    BookContentNeighbors.clear_stale(started_at, book_ids)
+    return len(stale_ids)
+
+
+def mark_book_content_stale(book_id):
+    """
+    Flag a created or edited book for the next content refresh.
+
+    Args:
+        book_id (int): The ID of the book
+
+    Returns:
+        bool: Whether the book was flagged
+    """
+    try:
+        BookContentNeighbors.mark_stale(book_id)
+        return True
+    except Exception as e:
+        current_app.logger.error(f"Error flagging content similarity of book {book_id}: {str(e)}")
+        return False
+
+
+def remove_book_content(book_id):
+    """
+    Remove a deleted book from every neighbour list; its index row goes at the next refresh.
+
+    Args:
+        book_id (int): The ID of the book
+
+    Returns:
+        bool: Whether the removal was successful
+    """
+    try:
+        BookContentNeighbors.remove_neighbor(book_id)
+        BookContentNeighbors.mark_stale(book_id)
+        return True
+    except Exception as e:
+        current_app.logger.error(f"Error removing content similarity of book {book_id}: {str(e)}")
+        return False
+
+
+def get_content_neighbors(book_id):
+    """
+    Get the stored content neighbour list of a book.
+
+    Args:
+        book_id (int): The ID of the book
+
+    Returns:
+        list: Dicts with 'book_id' and 'similarity', best first
+    """
+    document = BookContentNeighbors.get_by_book(book_id)
+    return document.get('neighbors', []) if document else []
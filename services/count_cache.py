@@ -0,0 +1,161 @@
+"""
+Count cache service for LibriMongo application.
+Caches the totals of paginated listings by normalized filters, so a page
+only pays for fetching its own rows, and estimates the totals of broad
+queries from table statistics or a bounded sample instead of counting.
+"""
+
+import threading
+import time
+from flask import current_app
+from sqlalchemy import text
+from models.mariadb_models import db
+from utils.helpers import get_app_cache
+
+# Totals cached per scope; writes to a table invalidate the scopes it feeds
+SCOPES = ('books', 'loans')
+
+
+def _get_state():
+    state = get_app_cache('count_cache')
+    state.setdefault('lock', threading.RLock())
+    state.setdefault('counts', {})
+    return state
+
+
+def normalize_filters(filters):
+    """
+    Build a cache key part from filters, ignoring empty values and their order.
+
+    Args:
+        filters (dict): Filters of a listing
+
+    Returns:
+        tuple: Sorted (name, value) pairs
+    """
+    return tuple(sorted(
+        (name, value.strip().lower() if isinstance(value, str) else value)
+        for name, value in (filters or {}).items()
+        if value is not None and value != '' and value is not False
+    ))
+
+
+def cached_count(scope, filters, count):
+    """
+    Get the total of a listing from the cache, counting it on a miss.
+
+    Args:
+        scope (str): What is counted ('books' or 'loans')
+        filters (dict): Filters of the listing (the cache key)
+        count (callable): Computes the exact total
+
+    Returns:
+        int: The total
+    """
+    state = _get_state()
+    key = (scope, normalize_filters(filters))
+    ttl = current_app.config.get('COUNT_CACHE_TTL', 60)
+    entry = state['counts'].get(key)
+    if entry is not None and time.time() - entry[1] < ttl:
+        return entry[0]
+
+    total = count()
+    with state['lock']:
+        counts = state['counts']
+        if len(counts) >= current_app.config.get('COUNT_CACHE_SIZE', 1000):
+            counts.clear()
+        counts[key] = (total, time.time())
+    return total
+
+
+def invalidate_counts(*scopes):
+    """
+    Drop the cached totals of some scopes after a write.
+
+    Args:
+        *scopes (str): Scopes whose totals may have changed (all if none given)
+    """
+    scopes = set(scopes or SCOPES)
+    state = _get_state()
+    with state['lock']:
+        state['counts'] = {key: entry for key, entry in state['counts'].items() if key[0] not in scopes}
+
+
+def table_row_estimate(model):
+    """
+    Estimate the rows of a table from the database statistics.
+
+    MariaDB keeps an estimate in information_schema; SQLite has none, so the
+    highest rowid is used instead.
+
+    Args:
+        model: The SQLAlchemy model of the table
+
+    Returns:
+        int: Estimated number of rows, or None if not available
+    """
+    table = model.__tablename__
+    try:
+        if db.engine.dialect.name in ('mysql', 'mariadb'):
+            rows = db.session.execute(text(
+                "SELECT TABLE_ROWS FROM information_schema.TABLES "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table"
+            ), {'table': table}).scalar()
+        elif db.engine.dialect.name == 'sqlite':
+            rows = db.session.execute(text(f"SELECT MAX(rowid) FROM {table}")).scalar()
+        else:
+            return None
+    except Exception as e:
+        current_app.logger.error(f"Error reading table statistics of {table}: {str(e)}")
+        return None
+    return int(rows) if rows is not None else None
+
+
+def estimate_count(model, query):
+    """
+    Estimate the total of a query while reading a bounded number of rows.
+
+    A query with fewer matches than COUNT_SAMPLE_SIZE is counted exactly.
+    Otherwise its selectivity is measured on the first COUNT_SAMPLE_SIZE rows
+    of the table (by primary key) and applied to the table row estimate.
+
+    Args:
+        model: The SQLAlchemy model the query lists
+        query: The filtered query (its ordering is ignored)
+
+    Returns:
+        int: The estimated total
+    """
+    sample_size = current_app.config.get('COUNT_SAMPLE_SIZE', 1000)
+    query = query.order_by(None)
+    bounded = query.with_entities(model.id).limit(sample_size).count()
+    if bounded < sample_size:
+        return bounded
+
+    table_rows = table_row_estimate(model)
+    if table_rows is None:
+        return query.count()
+    boundary = db.session.query(model.id).order_by(model.id).offset(sample_size - 1).limit(1).scalar()
+    if boundary is None:
+        return query.count()
+    matched = query.filter(model.id <= boundary).count()
+    return max(bounded, round(table_rows * matched / sample_size))
+
+
+def listing_count(scope, model, query, filters, approximate=False):
+    """
+    Get the total of a listing, cached, and estimated in approximate mode.
+
+    Args:
+        scope (str): What is counted ('books' or 'loans')
+        model: The SQLAlchemy model the query lists
+        query: The filtered query
+        filters (dict): Filters of the listing (the cache key)
+        approximate (bool): Whether an estimate is good enough
+
+    Returns:
+        int: The total
+    """
+    if approximate:
+        return cached_count(scope, dict(filters or {}, approximate=True), lambda: estimate_count(model, query))
+    return cached_count(scope, filters, lambda: query.order_by(None).count())
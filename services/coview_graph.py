@@ -0,0 +1,225 @@
+"""
+Co-view graph service for LibriMongo application.
+Aggregates book views into a bounded co-view graph: books viewed by the same
+visitor within a session window become neighbours with exponentially decayed
+counts, and each book keeps only its strongest neighbours, so book pages read
+"people who viewed this also viewed" with a single lookup.
+"""
+
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from flask import current_app
+from pymongo import ReplaceOne
+from pymongo.errors import DuplicateKeyError
+from models.mariadb_models import Book
+from models.mongodb_models import BookCoViews, ViewSession
+from utils.helpers import get_app_cache
+
+# Neighbours tracked per book, as a multiple of COVIEW_TOP_N (room for newcomers to grow)
+CAPACITY_FACTOR = 3
+
+# Recent views remembered per visitor
+MAX_SESSION_VIEWS = 10
+
+# Attempts to write a book's list when another process updated it at the same time
+MAX_WRITE_ATTEMPTS = 3
+
+
+def session_pairs(sessions, events, window):
+    """
+    Find the co-viewed book pairs of a batch of views.
+
+    A view pairs the book with every other book the visitor viewed within the
+    window before it; viewing a book again only refreshes its time.
+
+    Args:
+        sessions (dict): Visitor -> list of (book_id, viewed_at), oldest first (updated in place)
+        events (list): (visitor, book_id, viewed_at) tuples in chronological order
+        window (timedelta): Maximum time between two views of a session
+
+    Returns:
+        dict: Book ID -> {co-viewed book ID: co-views}
+    """
+    increments = defaultdict(lambda: defaultdict(float))
+    for viewer, book_id, viewed_at in events:
+        recent = [(other_id, at) for other_id, at in sessions.get(viewer, []) if viewed_at - at <= window]
+        if not any(other_id == book_id for other_id, _ in recent):
+            for other_id, _ in recent:
+                increments[book_id][other_id] += 1
+                increments[other_id][book_id] += 1
+        recent = [(other_id, at) for other_id, at in recent if other_id != book_id]
+        recent.append((book_id, viewed_at))
+        sessions[viewer] = recent[-MAX_SESSION_VIEWS:]
+    return increments
+
+
+def merge_neighbors(neighbors, increments, decay, capacity):
+    """
+    Decay a book's co-view counts, add new co-views and keep the strongest.
+
+    Args:
+        neighbors (list): Dicts with 'book_id' and 'count'
+        increments (dict): Co-viewed book ID -> new co-views
+        decay (float): Factor applied to the stored counts (0-1)
+        capacity (int): Maximum number of neighbours kept
+
+    Returns:
+        list: Dicts with 'book_id' and 'count', best first
+    """
+    counts = defaultdict(float)
+    for neighbor in neighbors:
+        counts[neighbor['book_id']] = neighbor['count'] * decay
+    for book_id, count in increments.items():
+        counts[book_id] += count
+    best = sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:capacity]
+    return [{'book_id': book_id, 'count': count} for book_id, count in best]
+
+
+def _get_state():
+    state = get_app_cache('coview_graph')
+    state.setdefault('lock', threading.RLock())
+    state.setdefault('pending', [])
+    state.setdefault('flushed_at', time.time())
+    return state
+
+
+def record_book_view(viewer, book_id, when=None):
+    """
+    Queue a book view; the queue is applied in batches of COVIEW_FLUSH_BATCH views
+    or every COVIEW_FLUSH_INTERVAL seconds.
+
+    Args:
+        viewer (str): Visitor key ('user:<id>' or 'session:<id>')
+        book_id (int): The ID of the viewed book
+        when (datetime, optional): Time of the view (defaults to now)
+
+    Returns:
+        bool: Whether the view was recorded
+    """
+    try:
+        state = _get_state()
+        events = None
+        with state['lock']:
+            state['pending'].append((viewer, book_id, when or datetime.utcnow()))
+            if (len(state['pending']) >= current_app.config.get('COVIEW_FLUSH_BATCH', 50)
+                    or time.time() - state['flushed_at'] >= current_app.config.get('COVIEW_FLUSH_INTERVAL', 60)):
+                events = state['pending']
+                state['pending'] = []
+                state['flushed_at'] = time.time()
+        if events:
+            flush_views(events)
+        return True
+    except Exception as e:
+        current_app.logger.error(f"Error recording book view: {str(e)}")
+        return False
+
+
+def flush_views(events):
+    """
+    Apply a batch of views to the sessions and to the co-view lists.
+
+    Args:
+        events (list): (visitor, book_id, viewed_at) tuples
+
+    Returns:
+        int: Number of books whose co-view list changed
+    """
+    events = sorted(events, key=lambda event: event[2])
+    viewers = list({viewer for viewer, _, _ in events})
+    sessions = {
+        session['viewer']: [(view['book_id'], view['at']) for view in session.get('views', [])]
+        for session in ViewSession.get_collection().find({'viewer': {'$in': viewers}})
+    }
+
+    window = timedelta(minutes=current_app.config.get('COVIEW_SESSION_MINUTES', 30))
+    increments = session_pairs(sessions, events, window)
+
+    now = datetime.utcnow()
+    ViewSession.get_collection().bulk_write([
+        ReplaceOne(
+            {'viewer': viewer},
+            {'viewer': viewer, 'views': [{'book_id': b, 'at': at} for b, at in sessions[viewer]], 'updated_at': now},
+            upsert=True
+        )
+        for viewer in viewers
+    ], ordered=False)
+
+    _apply_increments(increments, now)
+    return len(increments)
+
+
+def _apply_increments(increments, now):
+    """Read-modify-write each changed list, retrying when another process wrote it first."""
+    if not increments:
+        return
+
+    half_life = current_app.config.get('COVIEW_HALF_LIFE_DAYS', 14) * 86400
+    capacity = CAPACITY_FACTOR * current_app.config.get('COVIEW_TOP_N', 10)
+    documents = {
+        document['book_id']: document
+        for document in BookCoViews.get_collection().find({'book_id': {'$in': list(increments)}})
+    }
+
+    for book_id, added in increments.items():
+        document = documents.get(book_id)
+        for _ in range(MAX_WRITE_ATTEMPTS):
+            if document is None:
+                neighbors = merge_neighbors([], added, 1.0, capacity)
+                try:
+                    # Stamped with the batch time (MongoBase.insert_one would use the write time),
+                    # which the next merge decays from
+                    BookCoViews.get_collection().insert_one({
+                        'book_id': book_id, 'neighbors': neighbors, 'version': 1,
+                        'created_at': now, 'updated_at': now
+                    })
+                    break
+                except DuplicateKeyError:
+                    pass
+            else:
+                elapsed = max((now - document.get('updated_at', now)).total_seconds(), 0)
+                neighbors = merge_neighbors(document.get('neighbors', []), added, 0.5 ** (elapsed / half_life), capacity)
+                result = BookCoViews.update_one(
+                    {'book_id': book_id, 'version': document.get('version', 0)},
+                    {'$set': {'neighbors': neighbors, 'updated_at': now, 'version': document.get('version', 0) + 1}}
+                )
+                if result.matched_count:
+                    break
+            document = BookCoViews.get_by_book(book_id)
+
+
+def get_coviewed_book_ids(book_id, limit=None):
+    """
+    Get the books most often viewed in the same sessions as a book.
+
+    Args:
+        book_id (int): The ID of the book
+        limit (int, optional): Maximum number of book IDs (defaults to COVIEW_TOP_N)
+
+    Returns:
+        list: Book IDs, best first
+    """
+    limit = limit or current_app.config.get('COVIEW_TOP_N', 10)
+    document = BookCoViews.get_by_book(book_id)
+    if not document:
+        return []
+    return [neighbor['book_id'] for neighbor in document.get('neighbors', [])[:limit]]
+
+
+def get_coviewed_books(book_id, limit=5):
+    """
+    Get the books most often viewed together with a book (one query).
+
+    Args:
+        book_id (int): The ID of the book
+        limit (int): Maximum number of books to return
+
+    Returns:
+        list: Books, best first
+    """
+    book_ids = get_coviewed_book_ids(book_id, limit)
+    if not book_ids:
+        return []
+    books = {book.id: book for book in Book.query.filter(Book.id.in_(book_ids)).all()}
+    return [books[i] for i in book_ids if i in books]
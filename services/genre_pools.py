@@ -0,0 +1,142 @@
+"""
+Genre candidate pool service for LibriMongo application.
+Keeps, per genre, the book IDs ranked by rating quality with cumulative sampling
+weights, so recommendation candidates of a genre are drawn in Python in O(k)
+instead of sorting the whole genre with ORDER BY RANDOM() on every request.
+"""
+
+import random
+import threading
+import time
+from bisect import bisect_right
+from itertools import accumulate
+from flask import current_app
+from models.mariadb_models import Book, db
+from models.mongodb_models import RatingLeaderboard
+from utils.helpers import get_app_cache
+
+# Sampling rounds before falling back to a scan of the pool (readers of most of a genre)
+MAX_SAMPLE_ROUNDS = 4
+
+
+class GenrePool:
+    """Book IDs of a genre ranked by quality, with cumulative weights for weighted draws."""
+
+    def __init__(self, book_ids, weights):
+        self.book_ids = list(book_ids)
+        self.cumulative = list(accumulate(weights))
+
+    def __len__(self):
+        return len(self.book_ids)
+
+    def sample(self, k, exclude=frozenset(), weighted=True, rng=random):
+        """
+        Draw up to k distinct book IDs that are not excluded.
+
+        Args:
+            k (int): Number of book IDs to draw
+            exclude (set): Book IDs to skip (e.g. already read)
+            weighted (bool): Whether better rated books are more likely to be drawn
+            rng (random.Random): Random number generator
+
+        Returns:
+            list: Sampled book IDs
+        """
+        if k <= 0 or not self.book_ids:
+            return []
+
+        chosen = []
+        seen = set()
+        total = self.cumulative[-1]
+        for _ in range(MAX_SAMPLE_ROUNDS):
+            for _ in range(2 * k):
+                if weighted:
+                    pos = min(bisect_right(self.cumulative, rng.random() * total), len(self.book_ids) - 1)
+                else:
+                    pos = rng.randrange(len(self.book_ids))
+                book_id = self.book_ids[pos]
+                if book_id in seen or book_id in exclude:
+                    continue
+                seen.add(book_id)
+                chosen.append(book_id)
+                if len(chosen) == k:
+                    return chosen
+
+        # Most of the pool is excluded or already drawn: take the best remaining books
+        for book_id in self.book_ids:
+            if book_id not in seen and book_id not in exclude:
+                chosen.append(book_id)
+                if len(chosen) == k:
+                    break
+        return chosen
+
+
+def build_genre_pools():
+    """
+    Build the pool of every genre with one SQL query and one leaderboard scan.
+
+    Books are ranked by their smoothed rating score; unrated books get the mean
+    score of the rated ones. The sampling weight of a book is its score.
+
+    Returns:
+        dict: Genre -> GenrePool
+    """
+    scores = {
+        entry['book_id']: entry['score']
+        for entry in RatingLeaderboard.get_collection().find({}, {'book_id': 1, 'score': 1, '_id': 0})
+        if 'book_id' in entry and entry.get('score')
+    }
+    default_score = sum(scores.values()) / len(scores) if scores else 1.0
+
+    books_by_genre = {}
+    for book_id, genre in db.session.query(Book.id, Book.genre).filter(Book.genre.isnot(None)).all():
+        if genre:
+            books_by_genre.setdefault(genre, []).append((scores.get(book_id, default_score), book_id))
+
+    pools = {}
+    for genre, books in books_by_genre.items():
+        books.sort(key=lambda item: (-item[0], item[1]))
+        pools[genre] = GenrePool([book_id for _, book_id in books], [score for score, _ in books])
+    return pools
+
+
+def _get_state():
+    state = get_app_cache('genre_pools')
+    state.setdefault('lock', threading.RLock())
+    return state
+
+
+def get_genre_pools():
+    """
+    Get the genre pools, rebuilding them when older than GENRE_POOL_TTL seconds.
+
+    Returns:
+        dict: Genre -> GenrePool
+    """
+    state = _get_state()
+    ttl = current_app.config.get('GENRE_POOL_TTL', 300)
+    if state.get('pools') is None or time.time() - state.get('built_at', 0) >= ttl:
+        with state['lock']:
+            if state.get('pools') is None or time.time() - state.get('built_at', 0) >= ttl:
+                state['pools'] = build_genre_pools()
+                state['built_at'] = time.time()
+    return state['pools']
+
+
+def sample_genre_books(genre, k, exclude=frozenset(), weighted=True):
+    """
+    Draw candidate book IDs of a genre.
+
+    Args:
+        genre (str): The genre
+        k (int): Number of book IDs to draw
+        exclude (set): Book IDs to skip (e.g. already read)
+        weighted (bool): Whether better rated books are more likely to be drawn
+
+    Returns:
+        list: Sampled book IDs
+    """
+    pool = get_genre_pools().get(genre)
+    if pool is None:
+        return []
+    return pool.sample(k, exclude=exclude, weighted=weighted)
@@ -0,0 +1,418 @@
+"""
+Preference matrix service for LibriMongo application.
+Keeps a users x genres score matrix in memory (persisted to disk) so that similar
+readers can be found with one vectorized pass instead of per-user database queries,
+and a user_genre_profile document per user so that a user's genre preferences are
+a single indexed read. Both are updated incrementally by loans and reviews.
+"""
+
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+import numpy as np
+from flask import current_app
+from pymongo import ReplaceOne
+from pymongo.errors import DuplicateKeyError
+from models.mariadb_models import Book, db
+from models.mongodb_models import Review, LoanHistory, UserGenreProfile
+from services.book_meta import aggregate_user_genre_counts
+from utils.helpers import get_app_cache, file_lock
+
+# Genre score weights (same as get_user_genre_preferences)
+LOAN_WEIGHT = 1
+POSITIVE_REVIEW_WEIGHT = 2
+POSITIVE_RATING = 4
+
+MATRIX_FILENAME = 'user_genre_matrix.npz'
+
+BULK_WRITE_SIZE = 1000
+
+
+class UserGenreMatrix:
+    """Dense users x genres score matrix with dictionary-encoded genres."""
+
+    def __init__(self, user_ids=None, genres=None, scores=None):
+        self.user_ids = [int(user_id) for user_id in (user_ids or [])]
+        self.genres = [str(genre) for genre in (genres or [])]
+        self.user_index = {user_id: row for row, user_id in enumerate(self.user_ids)}
+        self.genre_index = {genre: col for col, genre in enumerate(self.genres)}
+
+        if scores is None:
+            scores = np.zeros((len(self.user_ids), len(self.genres)), dtype=np.float32)
+        self._scores = np.asarray(scores, dtype=np.float32)
+
+    @property
+    def scores(self):
+        """Score rows for the known users (without spare capacity)."""
+        return self._scores[:len(self.user_ids), :len(self.genres)]
+
+    def _ensure_row(self, user_id):
+        """Get the row of a user, appending a new row if needed."""
+        row = self.user_index.get(user_id)
+        if row is not None:
+            return row
+
+        row = len(self.user_ids)
+        if row >= self._scores.shape[0]:
+            # Grow geometrically so appending users stays amortized O(1)
+            capacity = max(16, self._scores.shape[0] * 2)
+            grown = np.zeros((capacity, self._scores.shape[1]), dtype=np.float32)
+            grown[:row] = self._scores[:row]
+            self._scores = grown
+
+        self.user_ids.append(user_id)
+        self.user_index[user_id] = row
+        return row
+
+    def _ensure_column(self, genre):
+        """Get the column of a genre, appending a new column if needed."""
+        col = self.genre_index.get(genre)
+        if col is not None:
+            return col
+
+        col = len(self.genres)
+        if col >= self._scores.shape[1]:
+            grown = np.zeros((self._scores.shape[0], col + 1), dtype=np.float32)
+            grown[:, :col] = self._scores[:, :col]
+            self._scores = grown
+
+        self.genres.append(genre)
+        self.genre_index[genre] = col
+        return col
+
+    def add(self, user_id, genre, weight):
+        """
+        Add a weight to a user's score for a genre.
+
+        Args:
+            user_id (int): The ID of the user
+            genre (str): The genre
+            weight (float): The weight to add (may be negative)
+        """
+        row = self._ensure_row(int(user_id))
+        col = self._ensure_column(str(genre))
+        self._scores[row, col] = max(0.0, self._scores[row, col] + weight)
+
+    def preferences(self, user_id):
+        """
+        Get a user's genre scores as a dictionary.
+
+        Args:
+            user_id (int): The ID of the user
+
+        Returns:
+            dict: Genre preferences with scores
+        """
+        row = self.user_index.get(user_id)
+        if row is None:
+            return {}
+        values = self.scores[row]
+        return {self.genres[col]: float(values[col]) for col in np.flatnonzero(values)}
+
+    def save(self, path):
+        """Save the matrix to a .npz file (written atomically)."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(
+            tmp_path,
+            user_ids=np.array(self.user_ids, dtype=np.int64),
+            genres=np.array(self.genres, dtype=str),
+            scores=self.scores
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Load a matrix saved with save()."""
+        with np.load(path) as data:
+            return cls(data['user_ids'].tolist(), data['genres'].tolist(), data['scores'])
+
+
+def build_user_genre_matrix():
+    """
+    Build the users x genres matrix from the loan history and reviews.
+
+    Each distinct borrowed book adds LOAN_WEIGHT to its genre and each distinct
+    positively reviewed book adds POSITIVE_REVIEW_WEIGHT, as in get_user_genre_preferences.
+
+    Returns:
+        UserGenreMatrix: The new matrix
+    """
+    matrix = UserGenreMatrix()
+    for user_id, genre, books in aggregate_user_genre_counts(LoanHistory.get_collection()):
+        matrix.add(user_id, genre, LOAN_WEIGHT * books)
+    for user_id, genre, books in aggregate_user_genre_counts(
+        Review.get_collection(), {'rating': {'$gte': POSITIVE_RATING}}
+    ):
+        matrix.add(user_id, genre, POSITIVE_REVIEW_WEIGHT * books)
+    return matrix
+
+
+def _matrix_path():
+    return os.path.join(current_app.config['RECOMMENDER_DATA_DIR'], MATRIX_FILENAME)
+
+
+def _file_mtime(path):
+    return os.stat(path).st_mtime_ns if os.path.exists(path) else None
+
+
+def _get_state():
+    state = get_app_cache('preference_matrix')
+    state.setdefault('lock', threading.RLock())
+    return state
+
+
+def _load_with_pending(state, path):
+    """Load the saved matrix and re-apply the updates this process has not saved yet."""
+    matrix = UserGenreMatrix.load(path)
+    for user_id, genre, delta in state.get('pending', []):
+        matrix.add(user_id, genre, delta)
+    state['matrix'] = matrix
+    state['mtime'] = _file_mtime(path)
+
+
+def get_user_genre_matrix():
+    """
+    Get the users x genres matrix, loading it from disk or building it on first use.
+
+    The matrix is reloaded when another process has saved it, so updates made
+    by every worker are seen.
+
+    Returns:
+        UserGenreMatrix: The matrix
+    """
+    state = _get_state()
+    path = _matrix_path()
+    if state.get('matrix') is None or state.get('mtime') != _file_mtime(path):
+        with state['lock']:
+            if state.get('matrix') is None and not os.path.exists(path):
+                with file_lock(path + '.lock'):
+                    if not os.path.exists(path):
+                        build_user_genre_matrix().save(path)
+                state['saved_at'] = time.time()
+            if state.get('matrix') is None or state.get('mtime') != _file_mtime(path):
+                _load_with_pending(state, path)
+    return state['matrix']
+
+
+def rebuild_user_genre_matrix():
+    """
+    Rebuild the users x genres matrix from scratch and persist it.
+
+    Returns:
+        UserGenreMatrix: The new matrix
+    """
+    matrix = build_user_genre_matrix()
+    state = _get_state()
+    path = _matrix_path()
+    with state['lock'], file_lock(path + '.lock'):
+        matrix.save(path)
+        state['matrix'] = matrix
+        state['mtime'] = _file_mtime(path)
+        state['saved_at'] = time.time()
+        state['pending'] = []
+    return matrix
+
+
+def save_user_genre_matrix(force=False):
+    """
+    Persist pending incremental updates of the matrix.
+
+    Updates are written at most every PREFERENCE_MATRIX_SAVE_INTERVAL seconds unless
+    force is set; changes made after the last save are recovered with a rebuild.
+    The file is reloaded under a lock and only this process's pending updates
+    are added to it, so updates saved by other workers are kept.
+
+    Args:
+        force (bool): Whether to save even if the interval has not elapsed
+
+    Returns:
+        bool: Whether the matrix was written
+    """
+    state = _get_state()
+    path = _matrix_path()
+    with state['lock']:
+        if not state.get('pending') or state.get('matrix') is None:
+            return False
+        interval = current_app.config.get('PREFERENCE_MATRIX_SAVE_INTERVAL', 300)
+        if not force and time.time() - state.get('saved_at', 0) < interval:
+            return False
+        with file_lock(path + '.lock'):
+            if os.path.exists(path):
+                _load_with_pending(state, path)
+            state['matrix'].save(path)
+            state['mtime'] = _file_mtime(path)
+        state['saved_at'] = time.time()
+        state['pending'] = []
+        return True
+
+
+def _apply_signal(user_id, book_id, count, count_before, weight):
+    """Apply a genre weight change when a user's distinct-book count crosses zero."""
+    delta = weight * (int(count > 0) - int(count_before > 0))
+    if delta == 0:
+        return
+
+    genre = db.session.query(Book.genre).filter(Book.id == book_id).scalar()
+    if not genre:
+        return
+
+    # Profiles not created yet are computed in full from the history on first read
+    UserGenreProfile.increment(user_id, genre, delta)
+
+    add_to_user_genre_matrix(user_id, genre, delta)
+    save_user_genre_matrix()
+
+
+def add_to_user_genre_matrix(user_id, genre, delta):
+    """
+    Add a weight to a user's genre score, pending until the next save.
+
+    Args:
+        user_id (int): The ID of the user
+        genre (str): The genre
+        delta (float): The weight to add (may be negative)
+    """
+    state = _get_state()
+    get_user_genre_matrix()
+    with state['lock']:
+        state['matrix'].add(user_id, genre, delta)
+        state.setdefault('pending', []).append((user_id, genre, delta))
+
+
+def record_loan_signal(user_id, book_id):
+    """
+    Update the matrix after a loan history entry was added for a user and book.
+
+    Args:
+        user_id (int): The ID of the user
+        book_id (int): The ID of the book
+
+    Returns:
+        bool: Whether the update was successful
+    """
+    try:
+        count = LoanHistory.get_collection().count_documents({'user_id': user_id, 'book_id': book_id})
+        _apply_signal(user_id, book_id, count, count - 1, LOAN_WEIGHT)
+        return True
+    except Exception as e:
+        current_app.logger.error(f"Error updating preference matrix: {str(e)}")
+        return False
+
+
+def record_review_signal(user_id, book_id, change):
+    """
+    Update the matrix after a user's positive reviews of a book changed.
+
+    Args:
+        user_id (int): The ID of the user
+        book_id (int): The ID of the book
+        change (int): +1 if a positive review was added, -1 if one was removed
+
+    Returns:
+        bool: Whether the update was successful
+    """
+    if change == 0:
+        return True
+    try:
+        count = Review.get_collection().count_documents({
+            'user_id': user_id,
+            'book_id': book_id,
+            'rating': {'$gte': POSITIVE_RATING}
+        })
+        _apply_signal(user_id, book_id, count, count - change, POSITIVE_REVIEW_WEIGHT)
+        return True
+    except Exception as e:
+        current_app.logger.error(f"Error updating preference matrix: {str(e)}")
+        return False
+
+
+def compute_user_genre_preferences(user_id):
+    """
+    Compute a user's genre preferences from their full reading history and reviews.
+
+    Args:
+        user_id (int): The ID of the user
+
+    Returns:
+        dict: Genre preferences with scores
+    """
+    genre_scores = Counter()
+
+    # Books the user has borrowed, joined to their genre inside MongoDB
+    for _, genre, books in aggregate_user_genre_counts(LoanHistory.get_collection(), {'user_id': user_id}):
+        genre_scores[genre] += LOAN_WEIGHT * books
+
+    # Books the user has reviewed positively
+    for _, genre, books in aggregate_user_genre_counts(
+        Review.get_collection(), {'user_id': user_id, 'rating': {'$gte': POSITIVE_RATING}}
+    ):
+        genre_scores[genre] += POSITIVE_REVIEW_WEIGHT * books
+
+    return dict(genre_scores)
+
+
+def get_user_genre_profile(user_id):
+    """
+    Get a user's genre preferences from their profile document.
+
+    Users without a profile get it computed from their history and stored, so
+    later reads (and incremental updates) use the document.
+
+    Args:
+        user_id (int): The ID of the user
+
+    Returns:
+        dict: Genre preferences with scores
+    """
+    preferences = UserGenreProfile.get_preferences(user_id)
+    if preferences is not None:
+        return preferences
+
+    preferences = compute_user_genre_preferences(user_id)
+    try:
+        UserGenreProfile.create(user_id, preferences)
+    except DuplicateKeyError:
+        # Created concurrently; that profile is as current as this one
+        pass
+    return preferences
+
+
+def rebuild_user_genre_profiles():
+    """
+    Recompute every user's genre profile from the loan history and reviews.
+
+    Returns:
+        int: Number of profiles written
+    """
+    matrix = build_user_genre_matrix()
+    collection = UserGenreProfile.get_collection()
+    now = datetime.utcnow()
+
+    operations = []
+    for user_id in matrix.user_ids:
+        operations.append(ReplaceOne(
+            {'user_id': user_id},
+            {
+                'user_id': user_id,
+                'genres': {
+                    UserGenreProfile.encode_genre(genre): int(score)
+                    for genre, score in matrix.preferences(user_id).items()
+                },
+                'created_at': now,
+                'updated_at': now
+            },
+            upsert=True
+        ))
+        if len(operations) >= BULK_WRITE_SIZE:
+            collection.bulk_write(operations, ordered=False)
+            operations = []
+
+    if operations:
+        collection.bulk_write(operations, ordered=False)
+
+    # Users without activity get their (empty) profile recomputed on first read
+    collection.delete_many({'user_id': {'$nin': matrix.user_ids}})
+    return len(matrix.user_ids)
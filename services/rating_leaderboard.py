@@ -0,0 +1,89 @@
+"""
+Rating leaderboard service for LibriMongo application.
+Materializes average rating, review count and a Bayesian-smoothed score per book
+with a single aggregation over reviews, so the best rated books are read directly.
+"""
+
+from datetime import datetime
+from bson import ObjectId
+from flask import current_app
+from pymongo import ASCENDING, DESCENDING
+from models.mongodb_models import Review, RatingLeaderboard
+
+
+def build_rating_leaderboard(prior_weight=None):
+    """
+    Recompute the leaderboard from all reviews and replace the stored collection.
+
+    The smoothed score is (C * m + sum of ratings) / (C + number of ratings), where m
+    is the mean rating over all reviews and C is LEADERBOARD_PRIOR_WEIGHT, so books
+    with few reviews are pulled towards the global mean.
+
+    Args:
+        prior_weight (float, optional): Number of pseudo-reviews at the global mean
+
+    Returns:
+        int: Number of books in the leaderboard
+    """
+    if prior_weight is None:
+        prior_weight = current_app.config.get('LEADERBOARD_PRIOR_WEIGHT', 5)
+
+    pipeline = [
+        {'$match': {'rating': {'$type': 'number'}}},
+        {'$group': {
+            '_id': '$book_id',
+            'avg_rating': {'$avg': '$rating'},
+            'review_count': {'$sum': 1},
+            'rating_sum': {'$sum': '$rating'}
+        }}
+    ]
+    groups = list(Review.get_collection().aggregate(pipeline))
+
+    total_reviews = sum(group['review_count'] for group in groups)
+    global_mean = sum(group['rating_sum'] for group in groups) / total_reviews if total_reviews else 0
+
+    now = datetime.utcnow()
+    entries = [
+        {
+            'book_id': group['_id'],
+            'avg_rating': group['avg_rating'],
+            'review_count': group['review_count'],
+            'score': (prior_weight * global_mean + group['rating_sum']) / (prior_weight + group['review_count']),
+            'updated_at': now
+        }
+        for group in groups
+    ]
+
+    # Build the new version aside and swap it in, so readers never see a partial board
+    collection = RatingLeaderboard.get_collection()
+    if not entries:
+        collection.delete_many({})
+        return 0
+
+    staging = collection.database[f'{RatingLeaderboard.collection_name}_{ObjectId()}']
+    try:
+        staging.insert_many(entries)
+        staging.create_index([('score', DESCENDING), ('book_id', ASCENDING)])
+        # Serves the book_meta $lookup on book_id
+        staging.create_index([('book_id', ASCENDING)], unique=True)
+        staging.rename(RatingLeaderboard.collection_name, dropTarget=True)
+    except Exception:
+        staging.drop()
+        raise
+    return len(entries)
+
+
+def get_top_rated_book_ids(limit=10):
+    """
+    Get the IDs of the best rated books from the stored leaderboard.
+
+    The board is never rebuilt during a request; the rebuild-rating-leaderboard
+    command refreshes it on a schedule.
+
+    Args:
+        limit (int): Maximum number of book IDs to return
+
+    Returns:
+        list: Book IDs ordered by smoothed score (descending)
+    """
+    return [entry['book_id'] for entry in RatingLeaderboard.get_top(limit)]
@@ -0,0 +1,244 @@
+"""
+Reader LSH service for LibriMongo application.
+Keeps MinHash signatures of each user's borrowed-book set in a banded LSH index,
+so candidate similar readers are found without scanning every user.
+"""
+
+import threading
+import time
+import numpy as np
+from flask import current_app
+from services.coborrow_matrix import get_coborrow_changes, get_coborrow_matrix
+from utils.helpers import get_app_cache
+
+# Mersenne prime used by the universal hash family h(x) = (a * x + b) mod P
+HASH_PRIME = (1 << 31) - 1
+
+# Loans hashed at once when building signatures (bounds memory to num_perm x chunk)
+SIGNATURE_CHUNK_SIZE = 50000
+
+
+class MinHashLSH:
+    """MinHash signatures of user book sets indexed by band for candidate lookup."""
+
+    def __init__(self, num_perm=64, bands=16, seed=1):
+        if num_perm % bands != 0:
+            raise ValueError("The number of permutations must be a multiple of the number of bands")
+
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self._a = rng.integers(1, HASH_PRIME, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, HASH_PRIME, size=num_perm, dtype=np.uint64)
+        self.signatures = {}
+        self.buckets = [{} for _ in range(bands)]
+
+    def hash_books(self, book_ids):
+        """Hash book IDs with every permutation (num_perm x len(book_ids))."""
+        values = np.asarray(book_ids, dtype=np.uint64) % np.uint64(HASH_PRIME)
+        return (self._a[:, None] * values[None, :] + self._b[:, None]) % np.uint64(HASH_PRIME)
+
+    def signature(self, book_ids):
+        """Get the MinHash signature of a set of book IDs."""
+        return self.hash_books(book_ids).min(axis=1)
+
+    def _band_keys(self, signature):
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    def insert(self, user_id, signature):
+        """Add or replace the signature of a user."""
+        self.remove(user_id)
+        self.signatures[user_id] = signature
+        for band, key in enumerate(self._band_keys(signature)):
+            self.buckets[band].setdefault(key, set()).add(user_id)
+
+    def remove(self, user_id):
+        """Remove a user from the index."""
+        signature = self.signatures.pop(user_id, None)
+        if signature is None:
+            return
+        for band, key in enumerate(self._band_keys(signature)):
+            bucket = self.buckets[band].get(key)
+            if bucket is not None:
+                bucket.discard(user_id)
+                if not bucket:
+                    del self.buckets[band][key]
+
+    def add_book(self, user_id, book_id):
+        """Update a user's signature after borrowing a book."""
+        signature = self.signature([book_id])
+        current = self.signatures.get(user_id)
+        if current is not None:
+            signature = np.minimum(current, signature)
+            if np.array_equal(signature, current):
+                return
+        self.insert(user_id, signature)
+
+    def candidates(self, user_id):
+        """
+        Get the users sharing at least one band with a user.
+
+        Args:
+            user_id (int): The ID of the user
+
+        Returns:
+            set: Candidate user IDs (without the user), or None if the user is not indexed
+        """
+        signature = self.signatures.get(user_id)
+        if signature is None:
+            return None
+        found = set()
+        for band, key in enumerate(self._band_keys(signature)):
+            found.update(self.buckets[band].get(key, ()))
+        found.discard(user_id)
+        return found
+
+    @classmethod
+    def from_coborrow_matrix(cls, matrix, num_perm=64, bands=16):
+        """
+        Build the index from the user -> books side of a co-borrow matrix.
+
+        Args:
+            matrix (CoBorrowMatrix): The co-borrow matrix
+            num_perm (int): Number of hash permutations
+            bands (int): Number of LSH bands
+
+        Returns:
+            MinHashLSH: The index
+        """
+        index = cls(num_perm=num_perm, bands=bands)
+        if len(matrix.user_ids) == 0:
+            return index
+
+        # Hash every book once, then take per-user minima over contiguous column runs
+        book_hashes = index.hash_books(matrix.book_ids)
+        user_ids = matrix.user_ids.tolist()
+        first = 0
+        while first < len(user_ids):
+            start = matrix.t_indptr[first]
+            last = np.searchsorted(matrix.t_indptr, start + SIGNATURE_CHUNK_SIZE, side='right') - 1
+            last = min(max(last, first + 1), len(user_ids))
+
+            hashed = book_hashes[:, matrix.t_indices[start:matrix.t_indptr[last]]]
+            signatures = np.minimum.reduceat(hashed, matrix.t_indptr[first:last] - start, axis=1)
+            for col, user_id in enumerate(user_ids[first:last]):
+                index.insert(user_id, np.ascontiguousarray(signatures[:, col]))
+            first = last
+        return index
+
+
+def _get_state():
+    state = get_app_cache('reader_lsh')
+    state.setdefault('lock', threading.RLock())
+    return state
+
+
+def _build_index(matrix):
+    return MinHashLSH.from_coborrow_matrix(
+        matrix,
+        num_perm=current_app.config.get('MINHASH_PERMUTATIONS', 64),
+        bands=current_app.config.get('LSH_BANDS', 16)
+    )
+
+
+def get_reader_lsh():
+    """
+    Get the reader LSH index, building it from the co-borrow matrix on first use.
+
+    The index follows the generations of the co-borrow matrix: loans appended
+    to it (including those recorded by other processes) update the signatures,
+    and a rebuilt matrix rebuilds the index.
+
+    Returns:
+        MinHashLSH: The index
+    """
+    state = _get_state()
+    if state.get('index') is None:
+        with state['lock']:
+            if state.get('index') is None:
+                matrix = get_coborrow_matrix(merge_pending=True)
+                state['index'] = _build_index(matrix)
+                state['generation'] = matrix.generation
+        return state['index']
+
+    matrix = get_coborrow_matrix()
+    if matrix.generation > state['generation']:
+        with state['lock']:
+            if matrix.generation > state['generation']:
+                changes = get_coborrow_changes(state['generation'], matrix.generation)
+                if changes is None:
+                    state['index'] = _build_index(matrix)
+                else:
+                    for book_id, user_id in zip(*changes):
+                        state['index'].add_book(user_id, book_id)
+                state['generation'] = matrix.generation
+    return state['index']
+
+
+def record_reader_loan(user_id, book_id):
+    """
+    Update a user's signature after a loan, if the index is loaded.
+
+    Args:
+        user_id (int): The ID of the user
+        book_id (int): The ID of the book
+
+    Returns:
+        bool: Whether the update was successful
+    """
+    try:
+        state = _get_state()
+        with state['lock']:
+            if state.get('index') is not None:
+                state['index'].add_book(user_id, book_id)
+        return True
+    except Exception as e:
+        current_app.logger.error(f"Error updating reader LSH index: {str(e)}")
+        return False
+
+
+def measure_similar_users_recall(sample_size=100, max_users=10, min_similarity=0.1):
+    """
+    Compare approximate similar-user results against the exact search.
+
+    Args:
+        sample_size (int): Number of indexed users to evaluate
+        max_users (int): Number of similar users requested per user
+        min_similarity (float): Minimum similarity score (0-1)
+
+    Returns:
+        dict: Mean recall, candidate counts and average timings (ms) of both modes
+    """
+    from services.recommendation_service import get_similar_users
+
+    index = get_reader_lsh()
+    user_ids = sorted(index.signatures)[:sample_size]
+
+    recalls = []
+    candidate_counts = []
+    exact_time = approx_time = 0.0
+    for user_id in user_ids:
+        started = time.perf_counter()
+        exact = get_similar_users(user_id, min_similarity, max_users, mode='exact')
+        exact_time += time.perf_counter() - started
+
+        started = time.perf_counter()
+        approximate = get_similar_users(user_id, min_similarity, max_users, mode='approximate')
+        approx_time += time.perf_counter() - started
+
+        candidate_counts.append(len(index.candidates(user_id)))
+        expected = {item['user_id'] for item in exact}
+        if expected:
+            found = {item['user_id'] for item in approximate}
+            recalls.append(len(expected & found) / len(expected))
+
+    evaluated = max(len(user_ids), 1)
+    return {
+        'users': len(user_ids),
+        'recall': float(np.mean(recalls)) if recalls else 1.0,
+        'mean_candidates': float(np.mean(candidate_counts)) if candidate_counts else 0.0,
+        'indexed_users': len(index.signatures),
+        'exact_ms': 1000 * exact_time / evaluated,
+        'approximate_ms': 1000 * approx_time / evaluated
+    }
@@ -0,0 +1,147 @@
+"""
+Recommendation batch service for LibriMongo application.
+Materializes every active user's recommendations offline, in parallel worker
+processes chunked by user ID range, into numbered generations of the
+user_recommendations collection that the web routes read directly.
+"""
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from flask import current_app
+from models.mariadb_models import User, db
+from models.mongodb_models import (
+    LoanHistory, Review, RecommendationCache, RecommendationGeneration, UserRecommendations
+)
+from services.recommendation_cache import compute_user_recommendations, hydrate_books
+
+INSERT_BATCH_SIZE = 500
+
+# Application of each worker process, created once by the pool initializer
+_worker_app = None
+
+
+def _active_user_ids(first_id, last_id):
+    """Get the IDs in [first_id, last_id) of users with loans or reviews."""
+    id_range = {'user_id': {'$gte': first_id, '$lt': last_id}}
+    active = set(LoanHistory.get_collection().distinct('user_id', id_range))
+    active.update(Review.get_collection().distinct('user_id', id_range))
+    return sorted(active)
+
+
+def materialize_user_range(first_id, last_id, generation, size):
+    """
+    Compute and store the recommendations of the active users in an ID range.
+    
+    Args:
+        first_id (int): First user ID of the range (inclusive)
+        last_id (int): Last user ID of the range (exclusive)
+        generation (int): The generation being built
+        size (int): Number of recommendations stored per user
+        
+    Returns:
+        int: Number of users materialized
+    """
+    documents = []
+    total = 0
+    for user_id in _active_user_ids(first_id, last_id):
+        # Stamp the activity version so later activity makes the list stale
+        entry = RecommendationCache.get_by_user(user_id)
+        recommendations = compute_user_recommendations(user_id, limit=size)
+        documents.append({
+            'user_id': user_id,
+            'generation': generation,
+            'version': entry.get('version', 0) if entry else 0,
+            'book_ids': [book.id for book in recommendations],
+            'size': size
+        })
+        if len(documents) >= INSERT_BATCH_SIZE:
+            UserRecommendations.store_many(documents)
+            total += len(documents)
+            documents = []
+    
+    UserRecommendations.store_many(documents)
+    return total + len(documents)
+
+
+def _init_worker():
+    global _worker_app
+    from app import create_app
+    _worker_app = create_app()
+
+
+def _materialize_in_worker(task):
+    with _worker_app.app_context():
+        return materialize_user_range(*task)
+
+
+def materialize_recommendations(workers=None, chunk_size=None):
+    """
+    Build a new generation of recommendations for all active users.
+    
+    Args:
+        workers (int, optional): Worker processes (defaults to RECOMMENDATION_BATCH_WORKERS;
+            1 computes in the current process)
+        chunk_size (int, optional): User IDs per task (defaults to RECOMMENDATION_BATCH_CHUNK)
+        
+    Returns:
+        tuple: (generation number, number of users materialized)
+    """
+    workers = workers or current_app.config.get('RECOMMENDATION_BATCH_WORKERS', 1)
+    chunk_size = chunk_size or current_app.config.get('RECOMMENDATION_BATCH_CHUNK', 500)
+    size = current_app.config.get('RECOMMENDATION_CACHE_SIZE', 20)
+    
+    min_id, max_id = db.session.query(db.func.min(User.id), db.func.max(User.id)).one()
+    generation = RecommendationGeneration.start()
+    tasks = [
+        (first_id, first_id + chunk_size, generation, size)
+        for first_id in range(min_id or 0, (max_id or 0) + 1, chunk_size)
+    ] if max_id is not None else []
+    
+    try:
+        if workers > 1 and len(tasks) > 1:
+            # Spawned workers open their own database connections
+            context = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=min(workers, len(tasks)), mp_context=context,
+                                     initializer=_init_worker) as executor:
+                total = sum(executor.map(_materialize_in_worker, tasks))
+        else:
+            total = sum(materialize_user_range(*task) for task in tasks)
+    except Exception:
+        RecommendationGeneration.finish(generation, 'failed')
+        UserRecommendations.get_collection().delete_many({'generation': generation})
+        raise
+    
+    RecommendationGeneration.finish(generation, 'complete', users=total)
+    UserRecommendations.delete_generations_before(generation)
+    return generation, total
+
+
+def get_materialized_recommendations(user_id, limit=10):
+    """
+    Get a user's recommendations from the latest complete generation.
+    
+    Args:
+        user_id (int): The ID of the user
+        limit (int): Maximum number of recommendations to return
+        
+    Returns:
+        list: Recommended books, or None if the user is missing from the generation
+            or has had new activity since it was built
+    """
+    try:
+        generation = RecommendationGeneration.get_latest_complete()
+        if generation is None:
+            return None
+        
+        document = UserRecommendations.get_by_user(user_id, generation['generation'])
+        if document is None or document.get('size', 0) < limit:
+            return None
+        
+        entry = RecommendationCache.get_by_user(user_id)
+        if document.get('version', 0) != (entry.get('version', 0) if entry else 0):
+            return None
+        
+        return hydrate_books(document.get('book_ids', [])[:limit])
+    except Exception as e:
+        current_app.logger.error(f"Error reading materialized recommendations for user {user_id}: {str(e)}")
+        return None
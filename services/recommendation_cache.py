@@ -0,0 +1,109 @@
+"""
+Recommendation cache service for LibriMongo application.
+Caches each user's recommendation list together with a per-user activity version;
+lending, returning, reviewing or marking a book as read bumps the version, so
+repeat views are served from the cache and only real activity triggers recomputation.
+"""
+
+from datetime import datetime, timedelta
+from flask import current_app
+from pymongo.errors import DuplicateKeyError
+from models.mariadb_models import Book
+from models.mongodb_models import RecommendationCache
+from services.recommendation_service import get_recommendations_for_user
+from services.als_recommender import get_als_recommendations
+
+
+def bump_recommendation_version(user_id):
+    """
+    Invalidate a user's cached recommendations after new activity.
+
+    Args:
+        user_id (int): The ID of the user
+
+    Returns:
+        bool: Whether the version was bumped
+    """
+    try:
+        RecommendationCache.bump_version(user_id)
+        return True
+    except Exception as e:
+        current_app.logger.error(f"Error bumping recommendation version for user {user_id}: {str(e)}")
+        return False
+
+
+def hydrate_books(book_ids):
+    """
+    Load books by ID with one query, keeping the given order.
+    
+    Args:
+        book_ids (list): Book IDs, best first
+        
+    Returns:
+        list: Books that still exist, in the given order
+    """
+    if not book_ids:
+        return []
+    books = {book.id: book for book in Book.query.filter(Book.id.in_(book_ids)).all()}
+    return [books[book_id] for book_id in book_ids if book_id in books]
+
+
+def compute_user_recommendations(user_id, limit=10):
+    """
+    Compute a user's recommendations with the configured engine.
+    
+    With RECOMMENDATION_ENGINE = 'als' the trained factor model is used; users
+    unknown to the model (or no model yet) get the heuristic strategies.
+    
+    Args:
+        user_id (int): The ID of the user
+        limit (int): Maximum number of recommendations to return
+        
+    Returns:
+        list: Recommended books
+    """
+    if current_app.config.get('RECOMMENDATION_ENGINE', 'heuristic') == 'als':
+        book_ids = get_als_recommendations(user_id, limit=limit)
+        if book_ids:
+            return hydrate_books(book_ids)
+    return get_recommendations_for_user(user_id, limit=limit)
+
+
+def _is_fresh(entry, limit):
+    """Check whether a cache entry is current and long enough for the request."""
+    if not entry or entry.get('cached_version') != entry.get('version', 0):
+        return False
+    if entry.get('size', 0) < limit:
+        return False
+    ttl = timedelta(seconds=current_app.config.get('RECOMMENDATION_CACHE_TTL', 3600))
+    return datetime.utcnow() - entry.get('updated_at', datetime.min) <= ttl
+
+
+def get_cached_recommendations(user_id, limit=10):
+    """
+    Get a user's recommendations, recomputing them only if the user's activity changed.
+
+    Args:
+        user_id (int): The ID of the user
+        limit (int): Maximum number of recommendations to return
+
+    Returns:
+        list: Recommended books
+    """
+    entry = RecommendationCache.get_by_user(user_id)
+
+    if _is_fresh(entry, limit):
+        return hydrate_books(entry.get('book_ids', [])[:limit])
+
+    # Compute a longer list than requested so smaller widgets reuse it
+    version = entry.get('version', 0) if entry else 0
+    size = max(limit, current_app.config.get('RECOMMENDATION_CACHE_SIZE', 20))
+    recommendations = compute_user_recommendations(user_id, limit=size)
+
+    try:
+        RecommendationCache.store(user_id, version, [book.id for book in recommendations], size)
+    except DuplicateKeyError:
+        # The user's version changed while computing; the next view recomputes
+        pass
+
+    return recommendations[:limit]
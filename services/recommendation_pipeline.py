@@ -0,0 +1,111 @@
+"""
+Recommendation pipeline service for LibriMongo application.
+Runs recommendation strategies as stages: candidate generators that yield book
+IDs with scores, a set-based merge, batched filters and a final hydration of
+only the winning books, timing every stage for profiling.
+"""
+
+import time
+from models.mariadb_models import Book
+
+
+class PipelineResult:
+    """Books selected by a pipeline run, with their scores, sources and stage timings."""
+
+    def __init__(self, books, scores, sources, timings):
+        self.books = books
+        self.scores = scores
+        self.sources = sources
+        self.timings = timings
+
+
+class RecommendationPipeline:
+    """
+    Candidate generation and re-ranking pipeline.
+
+    A generator is called as generate(context, limit) and yields (book_id, score)
+    pairs with scores in [0, 1]; a book's final score is the sum of its scores
+    multiplied by each generator's weight. A filter is called as keep(context, book_ids)
+    and returns the set of IDs to keep. Fallback generators only run when the
+    filtered candidates do not fill the requested limit.
+    """
+
+    def __init__(self):
+        self.generators = []
+        self.filters = []
+
+    def add_generator(self, name, generate, weight=1.0, fallback=False):
+        """Register a candidate generator (returns the pipeline for chaining)."""
+        self.generators.append((name, generate, weight, fallback))
+        return self
+
+    def add_filter(self, name, keep):
+        """Register a candidate filter (returns the pipeline for chaining)."""
+        self.filters.append((name, keep))
+        return self
+
+    def _generate(self, generators, context, limit, scores, sources, timings):
+        """Run generators and merge their candidates into scores; return the new IDs."""
+        new_ids = set()
+        for name, generate, weight, _ in generators:
+            started = time.perf_counter()
+            for book_id, score in generate(context, limit):
+                if book_id not in scores:
+                    scores[book_id] = 0.0
+                    sources[book_id] = set()
+                    new_ids.add(book_id)
+                scores[book_id] += weight * score
+                sources[book_id].add(name)
+            timings[f'generate.{name}'] = 1000 * (time.perf_counter() - started)
+        return new_ids
+
+    def _filter(self, book_ids, context, timings):
+        """Apply every filter to a set of candidate IDs."""
+        for name, keep in self.filters:
+            if not book_ids:
+                break
+            started = time.perf_counter()
+            book_ids = set(keep(context, book_ids))
+            timings[f'filter.{name}'] = timings.get(f'filter.{name}', 0.0) + 1000 * (time.perf_counter() - started)
+        return book_ids
+
+    def run(self, context, limit=10):
+        """
+        Run the pipeline.
+
+        Args:
+            context (dict): Request data shared by the stages (e.g. user_id, read_book_ids)
+            limit (int): Maximum number of books to return
+
+        Returns:
+            PipelineResult: The selected books, best first
+        """
+        started = time.perf_counter()
+        scores = {}
+        sources = {}
+        timings = {}
+
+        primary = [generator for generator in self.generators if not generator[3]]
+        fallback = [generator for generator in self.generators if generator[3]]
+
+        candidates = self._filter(self._generate(primary, context, limit, scores, sources, timings), context, timings)
+        if len(candidates) < limit and fallback:
+            new_ids = self._generate(fallback, context, limit, scores, sources, timings)
+            candidates |= self._filter(new_ids, context, timings)
+
+        # Rank by merged score; ties keep the order in which candidates were generated
+        order = {book_id: pos for pos, book_id in enumerate(scores)}
+        winners = sorted(candidates, key=lambda book_id: (-scores[book_id], order[book_id]))[:limit]
+
+        hydrate_started = time.perf_counter()
+        books_by_id = {book.id: book for book in Book.query.filter(Book.id.in_(winners)).all()} if winners else {}
+        books = [books_by_id[book_id] for book_id in winners if book_id in books_by_id]
+        timings['hydrate'] = 1000 * (time.perf_counter() - hydrate_started)
+        timings['total'] = 1000 * (time.perf_counter() - started)
+
+        return PipelineResult(
+            books,
+            {book.id: scores[book.id] for book in books},
+            {book.id: sorted(sources[book.id]) for book in books},
+            timings
+        )
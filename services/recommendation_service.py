@@ -4,16 +4,29 @@ Provides personalized book recommendations based on user preferences and reading
 """
 
 from flask import current_app
-from models.mariadb_models import Book, Loan, User, db
+from models.mariadb_models import Book, db
 from models.mongodb_models import Review, LoanHistory
-from sqlalchemy import func, desc
 import numpy as np
 from collections import Counter
+from services.preference_matrix import get_user_genre_matrix, get_user_genre_profile
+from services.similarity_index import get_book_neighbors
+from services.content_similarity import get_content_neighbors
+from services.rating_leaderboard import get_top_rated_book_ids
+from services.trending import get_trending_book_ids
+from services.coborrow_matrix import get_coborrow_matrix
+from services.reader_lsh import get_reader_lsh
+from services.genre_pools import sample_genre_books
+from services.recommendation_pipeline import RecommendationPipeline
+from services.cold_start_feeds import GLOBAL_FEED, get_feed_book_ids
+from services.also_borrowed import get_also_borrowed_ids
 from utils.helpers import log_activity
 
 def get_user_genre_preferences(user_id):
     """
-    Calculate a user's genre preferences based on their reading history and reviews.
+    Get a user's genre preferences based on their reading history and reviews.
+    
+    Reads the user's genre profile, which loans and reviews keep up to date
+    (see services.preference_matrix), instead of re-reading the whole history.
     
     Args:
         user_id (int): The ID of the user
@@ -21,73 +34,61 @@ def get_user_genre_preferences(user_id):
     Returns:
         dict: Genre preferences with scores
     """
-    genre_scores = Counter()
-    
-    # Get books the user has borrowed
-    loan_history = list(LoanHistory.get_by_user(user_id))
-    book_ids = [loan['book_id'] for loan in loan_history]
-    
-    if book_ids:
-        # Get genres of borrowed books
-        borrowed_books = Book.query.filter(Book.id.in_(book_ids)).all()
-        for book in borrowed_books:
-            if book.genre:
-                genre_scores[book.genre] += 1
-    
-    # Get books the user has reviewed positively (rating >= 4)
-    user_reviews = list(Review.find({'user_id': user_id}))
-    positive_review_book_ids = [review['book_id'] for review in user_reviews if review.get('rating', 0) >= 4]
-    
-    if positive_review_book_ids:
-        # Get genres of positively reviewed books
-        reviewed_books = Book.query.filter(Book.id.in_(positive_review_book_ids)).all()
-        for book in reviewed_books:
-            if book.genre:
-                genre_scores[book.genre] += 2  # Higher weight for positive reviews
-    
-    return dict(genre_scores)
+    return get_user_genre_profile(user_id)
 
-def get_similar_users(user_id, min_similarity=0.1, max_users=10):
+def get_similar_users(user_id, min_similarity=0.1, max_users=10, mode=None):
     """
     Find users with similar reading preferences.
     
+    Reads the precomputed users x genres matrix, so all users are scored with a
+    single vectorized cosine pass instead of querying each user's history. In
+    approximate mode only the readers sharing an LSH band with the user (similar
+    borrowed-book sets) are scored, unless there are fewer of them than max_users.
+    
     Args:
         user_id (int): The ID of the user
         min_similarity (float): Minimum similarity score (0-1)
         max_users (int): Maximum number of similar users to return
+        mode (str, optional): 'exact' or 'approximate' (defaults to SIMILAR_USERS_MODE)
         
     Returns:
         list: Similar users with similarity scores
     """
-    # Get target user's genre preferences
-    target_preferences = get_user_genre_preferences(user_id)
+    matrix = get_user_genre_matrix()
+    mode = mode or current_app.config.get('SIMILAR_USERS_MODE', 'exact')
     
-    if not target_preferences:
+    row = matrix.user_index.get(user_id)
+    if row is None or max_users <= 0:
         return []
     
-    # Get all users
-    users = User.query.filter(User.id != user_id).all()
-    similar_users = []
-    
-    for user in users:
-        # Get user's genre preferences
-        user_preferences = get_user_genre_preferences(user.id)
-        
-        if not user_preferences:
-            continue
-        
-        # Calculate similarity score using cosine similarity
-        similarity = calculate_similarity(target_preferences, user_preferences)
-        
-        if similarity >= min_similarity:
-            similar_users.append({
-                'user_id': user.id,
-                'similarity': similarity
-            })
-    
-    # Sort by similarity (descending) and limit
-    similar_users.sort(key=lambda x: x['similarity'], reverse=True)
-    return similar_users[:max_users]
+    scores = matrix.scores
+    candidate_rows = None
+    if mode == 'approximate':
+        candidates = get_reader_lsh().candidates(user_id)
+        # Users without loans are not in the LSH index, and too few candidates cannot fill
+        # the list; both fall back to the exact search
+        if candidates is not None:
+            candidate_rows = np.array(
+                sorted(matrix.user_index[c] for c in candidates if c in matrix.user_index), dtype=np.int64
+            )
+            if len(candidate_rows) < max_users:
+                candidate_rows = None
+    
+    if candidate_rows is None:
+        similarities, top = calculate_similarities(
+            scores[row], scores, top_k=max_users, min_similarity=min_similarity, exclude=[row]
+        )
+        top_rows = top
+    else:
+        similarities, top = calculate_similarities(
+            scores[row], scores[candidate_rows], top_k=max_users, min_similarity=min_similarity
+        )
+        top_rows = candidate_rows[top]
+    
+    return [
+        {'user_id': matrix.user_ids[top_row], 'similarity': float(similarities[i])}
+        for i, top_row in zip(top.tolist(), top_rows.tolist())
+    ]
 
 def calculate_similarity(prefs1, prefs2):
     """
@@ -117,6 +118,44 @@ def calculate_similarity(prefs1, prefs2):
     
     return dot_product / (norm1 * norm2)
 
+def calculate_similarities(target, candidates, top_k=None, min_similarity=None, exclude=None):
+    """
+    Calculate the cosine similarity of one vector against many in a single pass.
+    
+    Batched counterpart of calculate_similarity for vectors already aligned on
+    the same keys (e.g. rows of the users x genres matrix).
+    
+    Args:
+        target (array-like): Target vector
+        candidates (array-like): 2-D array with one candidate vector per row
+        top_k (int, optional): Maximum number of best rows to return (all if None)
+        min_similarity (float, optional): Minimum similarity of the returned rows
+        exclude (iterable, optional): Row indices never returned (e.g. the target itself)
+        
+    Returns:
+        tuple: (similarities aligned with the rows, indices of the best rows, best first)
+    """
+    target = np.asarray(target, dtype=np.float64)
+    candidates = np.asarray(candidates, dtype=np.float64).reshape(-1, len(target))
+    
+    # Zero vectors score 0, as in calculate_similarity, and are never returned
+    norms = np.linalg.norm(candidates, axis=1) * np.linalg.norm(target)
+    similarities = np.zeros(len(candidates), dtype=np.float64)
+    np.divide(candidates @ target, norms, out=similarities, where=norms > 0)
+    
+    eligible = norms > 0
+    if min_similarity is not None:
+        eligible &= similarities >= min_similarity
+    if exclude is not None:
+        eligible[np.asarray(list(exclude), dtype=np.int64)] = False
+    top = np.flatnonzero(eligible)
+    
+    if top_k is not None and len(top) > top_k:
+        top = np.sort(top[np.argpartition(-similarities[top], top_k - 1)[:top_k]]) if top_k > 0 else top[:0]
+    top = top[np.argsort(-similarities[top], kind='stable')]
+    
+    return similarities, top
+
 def get_book_similarity(book_id1, book_id2):
     """
     Calculate similarity between two books based on genre, author, and user interactions.
@@ -145,16 +184,8 @@ def get_book_similarity(book_id1, book_id2):
         similarity += 0.3
     
     # User interaction similarity (0.3 weight)
-    # Find users who have interacted with both books
-    users_book1 = set(loan['user_id'] for loan in LoanHistory.get_by_book(book_id1))
-    users_book2 = set(loan['user_id'] for loan in LoanHistory.get_by_book(book_id2))
-    
-    common_users = users_book1.intersection(users_book2)
-    
-    # Calculate interaction similarity based on common users
-    if users_book1 and users_book2:
-        interaction_similarity = len(common_users) / (len(users_book1) + len(users_book2) - len(common_users))
-        similarity += 0.3 * interaction_similarity
+    # Jaccard index of the users who borrowed each book
+    similarity += 0.3 * get_coborrow_matrix().jaccard_pair(book_id1, book_id2)
     
     return similarity
 
@@ -162,6 +193,9 @@ def get_similar_books(book_id, min_similarity=0.3, max_books=10):
     """
     Find books similar to a given book.
     
+    Reads the precomputed top-K neighbour list of the book (see
+    services.similarity_index) and loads the selected books in one query.
+    
     Args:
         book_id (int): The ID of the book
         min_similarity (float): Minimum similarity score (0-1)
@@ -170,26 +204,65 @@ def get_similar_books(book_id, min_similarity=0.3, max_books=10):
     Returns:
         list: Similar books with similarity scores
     """
-    book = Book.query.get(book_id)
-    if not book:
+    neighbors = [
+        neighbor for neighbor in get_book_neighbors(book_id)
+        if neighbor['similarity'] >= min_similarity
+    ][:max_books]
+    
+    if not neighbors:
         return []
     
-    # Get all other books
-    other_books = Book.query.filter(Book.id != book_id).all()
-    similar_books = []
+    books = {book.id: book for book in Book.query.filter(Book.id.in_([n['book_id'] for n in neighbors])).all()}
     
-    for other_book in other_books:
-        similarity = get_book_similarity(book_id, other_book.id)
+    return [
+        {'book': books[neighbor['book_id']], 'similarity': neighbor['similarity']}
+        for neighbor in neighbors
+        if neighbor['book_id'] in books
+    ]
+
+def get_also_borrowed_books(book_id, limit=5):
+    """
+    Get the books most often borrowed by the readers of a book.
+    
+    Reads the precomputed association rules of the book (see
+    services.also_borrowed) and loads the books in one query.
+    
+    Args:
+        book_id (int): The ID of the book
+        limit (int): Maximum number of books to return
+        
+    Returns:
+        list: Books, best rule first
+    """
+    book_ids = get_also_borrowed_ids(book_id, limit=limit)
+    if not book_ids:
+        return []
+    
+    books = {book.id: book for book in Book.query.filter(Book.id.in_(book_ids)).all()}
+    return [books[i] for i in book_ids if i in books]
+
+def get_popular_book_ids(limit=10, days=30):
+    """
+    Get the IDs of popular books based on recent activity and ratings.
+    
+    Args:
+        limit (int): Maximum number of book IDs to return
+        days (int): Number of days to consider for recent popularity
         
-        if similarity >= min_similarity:
-            similar_books.append({
-                'book': other_book,
-                'similarity': similarity
-            })
-    
-    # Sort by similarity (descending) and limit
-    similar_books.sort(key=lambda x: x['similarity'], reverse=True)
-    return similar_books[:max_books]
+    Returns:
+        list: Popular book IDs
+    """
+    # Books with the most (time-decayed) loans and views, active in the period (stored scores)
+    popular_ids = get_trending_book_ids(limit, days=days)
+    seen_ids = set(popular_ids)
+    
+    # Combine with the highest rated books of the materialized leaderboard
+    for book_id in get_top_rated_book_ids(limit):
+        if book_id not in seen_ids and len(popular_ids) < limit:
+            popular_ids.append(book_id)
+            seen_ids.add(book_id)
+    
+    return popular_ids[:limit]
 
 def get_popular_books(limit=10, days=30):
     """
@@ -202,38 +275,9 @@ def get_popular_books(limit=10, days=30):
     Returns:
         list: Popular books
     """
-    # Get books with most loans
-    popular_by_loans = db.session.query(
-        Book, func.count(Loan.id).label('loan_count')
-    ).join(Loan).group_by(Book.id).order_by(desc('loan_count')).limit(limit).all()
-    
-    # Get books with highest ratings
-    books_with_ratings = []
-    for book in Book.query.all():
-        avg_rating = Review.get_average_rating(book.id)
-        if avg_rating:
-            books_with_ratings.append((book, avg_rating))
-    
-    # Sort by rating (descending) and limit
-    popular_by_ratings = sorted(books_with_ratings, key=lambda x: x[1], reverse=True)[:limit]
-    
-    # Combine and deduplicate
-    popular_books = []
-    seen_ids = set()
-    
-    # Add books popular by loans
-    for book, _ in popular_by_loans:
-        if book.id not in seen_ids:
-            popular_books.append(book)
-            seen_ids.add(book.id)
-    
-    # Add books popular by ratings
-    for book, _ in popular_by_ratings:
-        if book.id not in seen_ids and len(popular_books) < limit:
-            popular_books.append(book)
-            seen_ids.add(book.id)
-    
-    return popular_books[:limit]
+    popular_ids = get_popular_book_ids(limit=limit, days=days)
+    books_by_id = {book.id: book for book in Book.query.filter(Book.id.in_(popular_ids)).all()} if popular_ids else {}
+    return [books_by_id[book_id] for book_id in popular_ids if book_id in books_by_id]
 
 def track_user_interaction(user_id, book_id, interaction_type, details=None):
     """
@@ -255,9 +299,86 @@ def track_user_interaction(user_id, book_id, interaction_type, details=None):
         current_app.logger.error(f"Error tracking user interaction: {str(e)}")
         return False
 
-def get_recommendations_for_user(user_id, limit=10, exclude_read=True):
+# Weights of each candidate generator when merging scores
+GENRE_CANDIDATE_WEIGHT = 3.0
+NEIGHBOR_CANDIDATE_WEIGHT = 2.0
+POPULAR_CANDIDATE_WEIGHT = 1.0
+
+# Neighbour candidates kept per requested recommendation
+NEIGHBOR_CANDIDATES_PER_SLOT = 3
+
+def _genre_candidates(context, limit):
+    """Unread books sampled from the user's top genres, scored by genre preference."""
+    top_genres = Counter(get_user_genre_preferences(context['user_id'])).most_common(3)
+    if not top_genres:
+        return
+    
+    top_score = top_genres[0][1]
+    for genre, genre_score in top_genres:
+        for book_id in sample_genre_books(genre, 5, exclude=context['read_book_ids']):
+            yield book_id, genre_score / top_score
+
+def _neighbor_candidates(context, limit):
     """
-    Get personalized book recommendations for a user.
+    Books rated highly by similar users, scored by the summed similarity of those users.
+    
+    The positive reviews of all neighbours are read with a single $in query, and
+    only the best NEIGHBOR_CANDIDATES_PER_SLOT * limit unread books are kept.
+    """
+    similarities = {user['user_id']: user['similarity'] for user in get_similar_users(context['user_id'])}
+    if not similarities:
+        return
+    
+    book_scores = Counter()
+    for review in Review.get_collection().find(
+        {'user_id': {'$in': list(similarities)}, 'rating': {'$gte': 4}}, {'user_id': 1, 'book_id': 1, '_id': 0}
+    ):
+        if review.get('book_id') not in context['read_book_ids']:
+            book_scores[review.get('book_id')] += similarities.get(review.get('user_id'), 0)
+    book_scores.pop(None, None)
+    
+    # Normalize by the score of a book liked by every neighbour
+    total_similarity = sum(similarities.values()) or 1
+    for book_id, score in book_scores.most_common(NEIGHBOR_CANDIDATES_PER_SLOT * limit):
+        yield book_id, score / total_similarity
+
+def _popular_candidates(context, limit):
+    """Books of the precomputed global feed, scored by rank."""
+    popular_ids = get_feed_book_ids(GLOBAL_FEED, limit=limit + len(context['read_book_ids']))
+    if not popular_ids:
+        return
+    for rank, book_id in enumerate(popular_ids):
+        yield book_id, 1 - rank / len(popular_ids)
+
+def _unread_filter(context, book_ids):
+    """Drop the books the user has already read."""
+    return book_ids - context['read_book_ids']
+
+def _available_filter(context, book_ids):
+    """Keep only existing books with copies available (one query)."""
+    rows = db.session.query(Book.id).filter(Book.id.in_(book_ids), Book.available_copies > 0).all()
+    return {row[0] for row in rows}
+
+def build_recommendation_pipeline():
+    """
+    Build the pipeline used for personalized recommendations.
+    
+    Returns:
+        RecommendationPipeline: Genre and similar-user candidates, with popular
+            books as fallback, filtered to unread and available books
+    """
+    return (
+        RecommendationPipeline()
+        .add_generator('genre', _genre_candidates, weight=GENRE_CANDIDATE_WEIGHT)
+        .add_generator('neighbors', _neighbor_candidates, weight=NEIGHBOR_CANDIDATE_WEIGHT)
+        .add_generator('popular', _popular_candidates, weight=POPULAR_CANDIDATE_WEIGHT, fallback=True)
+        .add_filter('unread', _unread_filter)
+        .add_filter('available', _available_filter)
+    )
+
+def profile_recommendations_for_user(user_id, limit=10, exclude_read=True):
+    """
+    Run the recommendation pipeline for a user and keep its details.
     
     Args:
         user_id (int): The ID of the user
@@ -265,60 +386,37 @@ def get_recommendations_for_user(user_id, limit=10, exclude_read=True):
         exclude_read (bool): Whether to exclude books the user has already read
         
     Returns:
-        list: Recommended books
+        PipelineResult: Recommended books with scores, sources and per-stage timings (ms)
     """
-    recommendations = []
-    
-    # Get user's genre preferences
-    user_preferences = get_user_genre_preferences(user_id)
-    
-    # Get books the user has already read
     read_book_ids = set()
     if exclude_read:
-        loan_history = list(LoanHistory.get_by_user(user_id))
-        read_book_ids = {loan['book_id'] for loan in loan_history}
+        read_book_ids = set(LoanHistory.get_collection().distinct('book_id', {'user_id': user_id}))
+    
+    context = {'user_id': user_id, 'read_book_ids': read_book_ids}
+    result = build_recommendation_pipeline().run(context, limit=limit)
+    current_app.logger.debug(
+        f"Recommendation pipeline for user {user_id}: "
+        + ", ".join(f"{stage}={ms:.1f}ms" for stage, ms in result.timings.items())
+    )
+    return result
+
+def get_recommendations_for_user(user_id, limit=10, exclude_read=True):
+    """
+    Get personalized book recommendations for a user.
     
-    # Strategy 1: Recommend based on genre preferences
-    if user_preferences:
-        # Get top genres
-        top_genres = [genre for genre, _ in Counter(user_preferences).most_common(3)]
-        
-        for genre in top_genres:
-            # Get books in this genre that the user hasn't read
-            genre_books = Book.query.filter(
-                Book.genre == genre,
-                ~Book.id.in_(read_book_ids) if read_book_ids else True
-            ).order_by(func.random()).limit(5).all()
-            
-            for book in genre_books:
-                if book not in recommendations:
-                    recommendations.append(book)
-    
-    # Strategy 2: Recommend based on similar users
-    similar_users = get_similar_users(user_id)
-    
-    for similar_user in similar_users:
-        # Get books that similar users have rated highly
-        similar_user_reviews = list(Review.find({
-            'user_id': similar_user['user_id'],
-            'rating': {'$gte': 4}
-        }))
-        
-        for review in similar_user_reviews:
-            book = Book.query.get(review['book_id'])
-            if book and book.id not in read_book_ids and book not in recommendations:
-                recommendations.append(book)
-    
-    # Strategy 3: Add some popular books if we don't have enough recommendations
-    if len(recommendations) < limit:
-        popular_books = get_popular_books(limit=limit)
-        
-        for book in popular_books:
-            if book.id not in read_book_ids and book not in recommendations:
-                recommendations.append(book)
+    Candidates from the user's favourite genres and from similar users are merged
+    by score, filtered to unread and available books and completed with popular
+    books when needed (see build_recommendation_pipeline).
     
-    # Limit the number of recommendations
-    return recommendations[:limit]
+    Args:
+        user_id (int): The ID of the user
+        limit (int): Maximum number of recommendations to return
+        exclude_read (bool): Whether to exclude books the user has already read
+        
+    Returns:
+        list: Recommended books
+    """
+    return profile_recommendations_for_user(user_id, limit=limit, exclude_read=exclude_read).books
 
 def get_recommendations_by_book(book_id, limit=5):
     """
@@ -331,5 +429,17 @@ def get_recommendations_by_book(book_id, limit=5):
     Returns:
         list: Recommended books
     """
-    similar_books = get_similar_books(book_id)
-    return [item['book'] for item in similar_books[:limit]]
\ No newline at end of file
+    books = [item['book'] for item in get_similar_books(book_id, max_books=limit)]
+    
+    # New books have no co-borrowers yet: complete with books of similar content
+    if len(books) < limit:
+        seen = {book.id for book in books}
+        neighbor_ids = [
+            neighbor['book_id'] for neighbor in get_content_neighbors(book_id)
+            if neighbor['book_id'] not in seen
+        ][:limit - len(books)]
+        if neighbor_ids:
+            content_books = {book.id: book for book in Book.query.filter(Book.id.in_(neighbor_ids)).all()}
+            books.extend(content_books[i] for i in neighbor_ids if i in content_books)
+    
+    return books
\ No newline at end of file
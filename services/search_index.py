@@ -0,0 +1,564 @@
+"""
+Search index service for LibriMongo application.
+Full-text search over book titles, authors and descriptions: an accent-folded
+inverted index ranked with BM25, stored as immutable on-disk segments whose
+postings (delta + varint compressed) are memory-mapped. Book writes add small
+segments and tombstones; segments are merged in a background thread.
+"""
+
+import json
+import math
+import mmap
+import os
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+import numpy as np
+from flask import current_app
+from models.mariadb_models import Book
+from utils.helpers import get_app_cache, file_lock
+from utils.text import tokenize
+
+MANIFEST_FILENAME = 'manifest.json'
+
+# Term frequency weight of each field (BM25F-style: a title match counts 3 times)
+FIELD_WEIGHTS = (('title', 3), ('author', 2), ('description', 1))
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Indexed terms a partially typed last word may expand to
+MAX_PREFIX_EXPANSIONS = 50
+
+_write_lock = threading.Lock()
+
+
+def encode_varints(values):
+    """Encode non-negative integers as LEB128 varints."""
+    out = bytearray()
+    for value in values:
+        value = int(value)
+        while value >= 0x80:
+            out.append((value & 0x7F) | 0x80)
+            value >>= 7
+        out.append(value)
+    return bytes(out)
+
+
+def decode_varints(buffer):
+    """
+    Decode LEB128 varints without a Python loop.
+
+    Args:
+        buffer (bytes-like): Encoded values
+
+    Returns:
+        numpy.ndarray: Decoded values (uint64)
+    """
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    if len(data) == 0:
+        return np.zeros(0, dtype=np.uint64)
+    ends = np.flatnonzero(data < 0x80)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    group = np.repeat(np.arange(len(ends)), ends - starts + 1)
+    shifts = ((np.arange(len(data)) - starts[group]) * 7).astype(np.uint64)
+    return np.add.reduceat((data & 0x7F).astype(np.uint64) << shifts, starts)
+
+
+def analyze_book(title, author, description):
+    """
+    Get the weighted term frequencies and length of a book.
+
+    Returns:
+        tuple: (Counter of term -> weighted frequency, weighted length)
+    """
+    frequencies = Counter()
+    for (_, weight), text in zip(FIELD_WEIGHTS, (title, author, description)):
+        for term in tokenize(text):
+            frequencies[term] += weight
+    return frequencies, sum(frequencies.values())
+
+
+def write_segment(directory, name, documents):
+    """
+    Write an immutable segment.
+
+    Args:
+        directory (str): Index directory
+        name (str): Segment name
+        documents (list): (book_id, title, author, description) tuples
+    """
+    postings = defaultdict(list)
+    doc_lengths = {}
+    for book_id, title, author, description in documents:
+        frequencies, length = analyze_book(title, author, description)
+        doc_lengths[book_id] = length
+        for term, frequency in frequencies.items():
+            postings[term].append((book_id, frequency))
+    _write_postings(directory, name, postings, doc_lengths)
+
+
+def _write_postings(directory, name, postings, doc_lengths):
+    """Write the files of a segment from term -> [(book_id, frequency)] postings."""
+    terms = sorted(term for term, entries in postings.items() if entries)
+    offsets = [0]
+    doc_freq = []
+    with open(os.path.join(directory, f'{name}.post.tmp'), 'wb') as f:
+        for term in terms:
+            # Book IDs are delta-encoded so most gaps fit in one byte
+            values = []
+            previous = 0
+            for book_id, frequency in sorted(postings[term]):
+                values.extend((book_id - previous, frequency))
+                previous = book_id
+            encoded = encode_varints(values)
+            f.write(encoded)
+            offsets.append(offsets[-1] + len(encoded))
+            doc_freq.append(len(postings[term]))
+
+    book_ids = np.array(sorted(doc_lengths), dtype=np.int64)
+    np.savez(
+        os.path.join(directory, f'{name}.meta.tmp.npz'),
+        terms=np.array(terms, dtype=str),
+        offsets=np.array(offsets, dtype=np.int64),
+        doc_freq=np.array(doc_freq, dtype=np.int64),
+        book_ids=book_ids,
+        doc_lengths=np.array([doc_lengths[book_id] for book_id in book_ids.tolist()], dtype=np.int64)
+    )
+    os.replace(os.path.join(directory, f'{name}.post.tmp'), os.path.join(directory, f'{name}.post'))
+    os.replace(os.path.join(directory, f'{name}.meta.tmp.npz'), os.path.join(directory, f'{name}.meta.npz'))
+
+
+class Segment:
+    """A read-only segment: term dictionary in memory, postings memory-mapped."""
+
+    def __init__(self, directory, name):
+        self.name = name
+        with np.load(os.path.join(directory, f'{name}.meta.npz')) as data:
+            self.terms = data['terms']
+            self.offsets = data['offsets']
+            self.doc_freq = data['doc_freq']
+            self.book_ids = data['book_ids']
+            self.doc_lengths = data['doc_lengths']
+
+        path = os.path.join(directory, f'{name}.post')
+        if os.path.getsize(path) > 0:
+            with open(path, 'rb') as f:
+                self._postings = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._postings = b''
+
+    def __len__(self):
+        return len(self.book_ids)
+
+    def _term_position(self, term):
+        pos = int(np.searchsorted(self.terms, term))
+        return pos if pos < len(self.terms) and self.terms[pos] == term else None
+
+    def document_frequency(self, term):
+        """Number of documents of the segment containing a term (deleted ones included)."""
+        pos = self._term_position(term)
+        return int(self.doc_freq[pos]) if pos is not None else 0
+
+    def postings(self, term):
+        """
+        Get the postings of a term.
+
+        Returns:
+            tuple: (book IDs, weighted term frequencies), as arrays
+        """
+        pos = self._term_position(term)
+        if pos is None:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        values = decode_varints(self._postings[self.offsets[pos]:self.offsets[pos + 1]]).astype(np.int64)
+        return np.cumsum(values[0::2]), values[1::2]
+
+    def lengths(self, book_ids):
+        """Weighted lengths of documents of the segment."""
+        return self.doc_lengths[np.searchsorted(self.book_ids, book_ids)]
+
+    def terms_with_prefix(self, prefix):
+        """Indexed terms starting with a prefix."""
+        start = np.searchsorted(self.terms, prefix)
+        end = np.searchsorted(self.terms, prefix + '\x7f')
+        return self.terms[start:end].tolist()
+
+    def close(self):
+        if isinstance(self._postings, mmap.mmap):
+            self._postings.close()
+
+
+class SearchIndex:
+    """The live segments of an index directory, as listed by its manifest."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.snapshot = IndexSnapshot([], {})
+        self.manifest_mtime = None
+        self.load()
+
+    @property
+    def segments(self):
+        return self.snapshot.segments
+
+    # Manifest handling
+
+    def _manifest_path(self):
+        return os.path.join(self.directory, MANIFEST_FILENAME)
+
+    def _read_manifest(self):
+        path = self._manifest_path()
+        if not os.path.exists(path):
+            return {'next_segment': 1, 'segments': []}
+        with open(path) as f:
+            return json.load(f)
+
+    def _write_manifest(self, manifest):
+        tmp_path = self._manifest_path() + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self._manifest_path())
+
+    @contextmanager
+    def _locked(self):
+        """Serialize manifest changes between threads and (where supported) processes."""
+        with _write_lock, file_lock(os.path.join(self.directory, 'lock')):
+            yield
+
+    def exists(self):
+        """Whether the index has been built."""
+        return os.path.exists(self._manifest_path())
+
+    def _manifest_mtime(self):
+        path = self._manifest_path()
+        return os.stat(path).st_mtime_ns if os.path.exists(path) else None
+
+    def load(self):
+        """
+        (Re)open the segments listed in the manifest, reusing the ones already open.
+
+        The new snapshot replaces the old one in a single assignment, so searches
+        running meanwhile keep a consistent view (replaced segments are unmapped
+        once no search uses them).
+        """
+        self.manifest_mtime = self._manifest_mtime()
+        manifest = self._read_manifest()
+
+        opened = {segment.name: segment for segment in self.snapshot.segments}
+        segments = [
+            opened.get(entry['name']) or Segment(self.directory, entry['name'])
+            for entry in manifest['segments']
+        ]
+        deleted = {entry['name']: np.array(sorted(entry['deleted']), dtype=np.int64)
+                   for entry in manifest['segments']}
+        self.snapshot = IndexSnapshot(segments, deleted)
+
+    def reload_if_changed(self):
+        """Reload when another thread or process changed the manifest."""
+        if self._manifest_mtime() != self.manifest_mtime:
+            self.load()
+
+    # Writes
+
+    def replace_all(self, documents):
+        """Replace the whole index with a single segment of documents."""
+        with self._locked():
+            manifest = self._read_manifest()
+            name = f"seg_{manifest['next_segment']:06d}"
+            write_segment(self.directory, name, documents)
+            old_names = [entry['name'] for entry in manifest['segments']]
+            self._write_manifest({'next_segment': manifest['next_segment'] + 1,
+                                  'segments': [{'name': name, 'deleted': []}]})
+            self._remove_files(old_names)
+        self.load()
+
+    def update(self, documents=(), deleted_ids=()):
+        """
+        Index new versions of documents and delete others, as one new segment.
+
+        Args:
+            documents (list): (book_id, title, author, description) tuples to (re)index
+            deleted_ids (iterable): Book IDs to remove
+        """
+        removed = {document[0] for document in documents} | set(deleted_ids)
+        with self._locked():
+            manifest = self._read_manifest()
+            for entry in manifest['segments']:
+                segment = Segment(self.directory, entry['name'])
+                stale = set(segment.book_ids[np.isin(segment.book_ids, list(removed))].tolist())
+                segment.close()
+                entry['deleted'] = sorted(set(entry['deleted']) | stale)
+            if documents:
+                name = f"seg_{manifest['next_segment']:06d}"
+                write_segment(self.directory, name, list(documents))
+                manifest['segments'].append({'name': name, 'deleted': []})
+                manifest['next_segment'] += 1
+            self._write_manifest(manifest)
+        self.load()
+
+    def merge(self):
+        """
+        Merge every segment into one, dropping deleted documents.
+
+        Deletions recorded while the merge runs are carried over to the merged segment.
+
+        Returns:
+            bool: Whether a merge was done
+        """
+        with self._locked():
+            manifest = self._read_manifest()
+            if len(manifest['segments']) < 2:
+                return False
+            entries = [dict(entry) for entry in manifest['segments']]
+            name = f"seg_{manifest['next_segment']:06d}"
+            manifest['next_segment'] += 1
+            self._write_manifest(manifest)
+
+        # Rebuild the live documents' postings outside the lock
+        postings = defaultdict(list)
+        doc_lengths = {}
+        for entry in entries:
+            segment = Segment(self.directory, entry['name'])
+            deleted = set(entry['deleted'])
+            for pos, book_id in enumerate(segment.book_ids.tolist()):
+                if book_id not in deleted:
+                    doc_lengths[book_id] = int(segment.doc_lengths[pos])
+            for term in segment.terms.tolist():
+                book_ids, frequencies = segment.postings(term)
+                postings[term].extend(
+                    (book_id, frequency) for book_id, frequency in zip(book_ids.tolist(), frequencies.tolist())
+                    if book_id not in deleted
+                )
+            segment.close()
+        _write_postings(self.directory, name, postings, doc_lengths)
+
+        with self._locked():
+            manifest = self._read_manifest()
+            merged_names = {entry['name'] for entry in entries}
+            current = {entry['name']: entry for entry in manifest['segments']}
+            if not merged_names <= set(current):
+                # Another process replaced these segments meanwhile
+                self._remove_files([name])
+                return False
+            carried = set()
+            for entry in entries:
+                carried |= set(current[entry['name']]['deleted']) - set(entry['deleted'])
+            manifest['segments'] = [{'name': name, 'deleted': sorted(carried)}] + [
+                entry for entry in manifest['segments'] if entry['name'] not in merged_names
+            ]
+            self._write_manifest(manifest)
+            self._remove_files(merged_names)
+        self.load()
+        return True
+
+    def _remove_files(self, names):
+        for name in names:
+            for suffix in ('.post', '.meta.npz'):
+                try:
+                    os.remove(os.path.join(self.directory, name + suffix))
+                except OSError:
+                    # Still mapped by a reader on platforms that forbid it; removed on the next merge
+                    pass
+
+    # Search
+
+    def search(self, query, prefix=True):
+        """
+        Rank the documents matching every word of a query with BM25.
+
+        Args:
+            query (str): The search query
+            prefix (bool): Whether the last word may be incomplete (live search)
+
+        Returns:
+            list: (book_id, score) tuples, best first
+        """
+        return self.snapshot.search(query, prefix=prefix)
+
+
+class IndexSnapshot:
+    """An immutable view of the live segments, their deletions and collection statistics."""
+
+    def __init__(self, segments, deleted):
+        self.segments = segments
+        self.deleted = deleted
+        live = [(segment, ~np.isin(segment.book_ids, deleted[segment.name])) for segment in segments]
+        self.document_count = sum(int(mask.sum()) for _, mask in live)
+        total_length = sum(int(segment.doc_lengths[mask].sum()) for segment, mask in live)
+        self.average_length = total_length / self.document_count if self.document_count else 1.0
+
+    def _expand(self, prefix):
+        terms = set()
+        for segment in self.segments:
+            terms.update(segment.terms_with_prefix(prefix))
+            if len(terms) >= MAX_PREFIX_EXPANSIONS:
+                break
+        return sorted(terms)[:MAX_PREFIX_EXPANSIONS] or [prefix]
+
+    def search(self, query, prefix=True):
+        """Rank the documents matching every word of a query (see SearchIndex.search)."""
+        words = list(dict.fromkeys(tokenize(query)))
+        if not words or not self.document_count:
+            return []
+        groups = [[word] for word in words[:-1]]
+        groups.append(self._expand(words[-1]) if prefix else [words[-1]])
+
+        scores = defaultdict(float)
+        matches = Counter()
+        for group in groups:
+            group_matches = set()
+            for term in group:
+                postings = []
+                for segment in self.segments:
+                    if not segment.document_frequency(term):
+                        continue
+                    book_ids, frequencies = segment.postings(term)
+                    live = ~np.isin(book_ids, self.deleted[segment.name])
+                    postings.append((segment, book_ids[live], frequencies[live]))
+                # Only live documents count, so scores do not depend on how the segments were merged
+                df = sum(len(book_ids) for _, book_ids, _ in postings)
+                if df == 0:
+                    continue
+                idf = math.log(1 + (self.document_count - df + 0.5) / (df + 0.5))
+                for segment, book_ids, frequencies in postings:
+                    norms = BM25_K1 * (1 - BM25_B + BM25_B * segment.lengths(book_ids) / self.average_length)
+                    term_scores = idf * frequencies * (BM25_K1 + 1) / (frequencies + norms)
+                    for book_id, score in zip(book_ids.tolist(), term_scores.tolist()):
+                        scores[book_id] += score
+                        group_matches.add(book_id)
+            matches.update(group_matches)
+
+        ranked = [(book_id, score) for book_id, score in scores.items() if matches[book_id] == len(groups)]
+        ranked.sort(key=lambda item: (-item[1], item[0]))
+        return ranked
+
+
+def _index_directory():
+    return os.path.join(current_app.config['RECOMMENDER_DATA_DIR'], 'search_index')
+
+
+def _get_state():
+    state = get_app_cache('search_index')
+    state.setdefault('lock', threading.RLock())
+    return state
+
+
+def _load_documents(book_ids=None):
+    query = Book.query.with_entities(Book.id, Book.title, Book.author, Book.description)
+    if book_ids is not None:
+        query = query.filter(Book.id.in_(book_ids))
+    return [tuple(row) for row in query.all()]
+
+
+def rebuild_search_index():
+    """
+    Rebuild the search index from the catalog as a single segment.
+
+    Returns:
+        int: Number of books indexed
+    """
+    documents = _load_documents()
+    get_search_index(build=False).replace_all(documents)
+    return len(documents)
+
+
+def get_search_index(build=True):
+    """
+    Get the search index, building it on first use and reloading it when changed.
+
+    Args:
+        build (bool): Whether to build a missing index
+
+    Returns:
+        SearchIndex: The index
+    """
+    state = _get_state()
+    if state.get('index') is None:
+        with state['lock']:
+            if state.get('index') is None:
+                state['index'] = SearchIndex(_index_directory())
+    index = state['index']
+    if build and not index.exists():
+        with state['lock']:
+            if not index.exists():
+                index.replace_all(_load_documents())
+    index.reload_if_changed()
+    return index
+
+
+def _merge_in_background(index):
+    """Start merging the segments in a thread if there are too many and no merge is running."""
+    state = _get_state()
+    with state['lock']:
+        if len(index.segments) <= current_app.config.get('SEARCH_MAX_SEGMENTS', 8) or state.get('merging'):
+            return
+        state['merging'] = True
+    logger = current_app.logger
+
+    def merge():
+        try:
+            index.merge()
+        except Exception as e:
+            logger.error(f"Error merging search index segments: {str(e)}")
+        finally:
+            state['merging'] = False
+
+    threading.Thread(target=merge, name='search-index-merge', daemon=True).start()
+
+
+def index_books(book_ids):
+    """
+    Index the current version of books (created or updated) as a new segment.
+
+    Args:
+        book_ids (list): IDs of the books
+
+    Returns:
+        bool: Whether the update was successful
+    """
+    try:
+        index = get_search_index()
+        documents = _load_documents(book_ids)
+        missing = set(book_ids) - {document[0] for document in documents}
+        index.update(documents=documents, deleted_ids=missing)
+        _merge_in_background(index)
+        return True
+    except Exception as e:
+        current_app.logger.error(f"Error updating search index: {str(e)}")
+        return False
+
+
+def remove_books_from_index(book_ids):
+    """
+    Remove deleted books from the search index.
+
+    Args:
+        book_ids (list): IDs of the books
+
+    Returns:
+        bool: Whether the update was successful
+    """
+    try:
+        index = get_search_index()
+        index.update(deleted_ids=book_ids)
+        _merge_in_background(index)
+        return True
+    except Exception as e:
+        current_app.logger.error(f"Error updating search index: {str(e)}")
+        return False
+
+
+def search_book_ids(query, limit=None):
+    """
+    Search the catalog.
+
+    Args:
+        query (str): The search query (the last word may be incomplete)
+        limit (int, optional): Maximum number of book IDs (defaults to SEARCH_MAX_RESULTS)
+
+    Returns:
+        tuple: (book IDs most relevant first, at most limit; number of matching books)
+    """
+    limit = limit or current_app.config.get('SEARCH_MAX_RESULTS', 1000)
+    results = get_search_index().search(query)
+    return [book_id for book_id, _ in results[:limit]], len(results)
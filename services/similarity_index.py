@@ -0,0 +1,231 @@
+"""
+Book similarity index service for LibriMongo application.
+Precomputes the top-K most similar books of every book (genre, author and
+co-borrower Jaccard, weighted as in get_book_similarity) and stores them in MongoDB
+so a book page reads its neighbours with a single lookup. Lists made stale by
+new loans keep being served until a batch refresh recomputes them.
+"""
+
+import numpy as np
+from flask import current_app
+from pymongo import UpdateOne
+from models.mariadb_models import Book, db
+from models.mongodb_models import BookNeighbors, LoanHistory
+from services.coborrow_matrix import get_coborrow_matrix, rebuild_coborrow_matrix
+
+# Similarity weights (same as get_book_similarity)
+GENRE_WEIGHT = 0.4
+AUTHOR_WEIGHT = 0.3
+INTERACTION_WEIGHT = 0.3
+
+BULK_WRITE_SIZE = 1000
+
+
+class BookCatalog:
+    """Book IDs with dictionary-encoded genres and authors, aligned by position."""
+
+    def __init__(self, rows):
+        self.book_ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self.position = {book_id: pos for pos, book_id in enumerate(self.book_ids.tolist())}
+        self.genre_codes = _encode([row[1] for row in rows])
+        self.author_codes = _encode([row[2] for row in rows])
+
+    def __len__(self):
+        return len(self.book_ids)
+
+    @classmethod
+    def load(cls):
+        """Load the catalog with one query."""
+        return cls(db.session.query(Book.id, Book.genre, Book.author).order_by(Book.id).all())
+
+
+def _encode(values):
+    """Dictionary-encode values as integer codes (-1 for empty values)."""
+    codes = {}
+    return np.array([codes.setdefault(value, len(codes)) if value else -1 for value in values], dtype=np.int64)
+
+
+def interaction_scores(catalog, matrix, book_id, matrix_positions=None):
+    """
+    Co-borrower Jaccard similarity of a book against the catalog.
+
+    Args:
+        catalog (BookCatalog): The catalog
+        matrix (CoBorrowMatrix): The co-borrow matrix
+        book_id (int): The ID of the book
+        matrix_positions (numpy.ndarray, optional): Catalog position of each matrix row
+
+    Returns:
+        numpy.ndarray: Similarities aligned with the catalog
+    """
+    if matrix_positions is None:
+        matrix_positions = catalog_positions(catalog, matrix)
+
+    scores = np.zeros(len(catalog), dtype=np.float64)
+    in_catalog = matrix_positions >= 0
+    scores[matrix_positions[in_catalog]] = matrix.jaccard(book_id)[in_catalog]
+    return scores
+
+
+def catalog_positions(catalog, matrix):
+    """Map each co-borrow matrix row to its catalog position (-1 if missing)."""
+    return np.array([catalog.position.get(book_id, -1) for book_id in matrix.book_ids.tolist()], dtype=np.int64)
+
+
+def rank_neighbors(catalog, book_id, interaction, top_k):
+    """
+    Score a book against the whole catalog and keep its top-K neighbours.
+
+    Args:
+        catalog (BookCatalog): The catalog
+        book_id (int): The ID of the book
+        interaction (numpy.ndarray): Co-borrower similarity aligned with the catalog
+        top_k (int): Maximum number of neighbours to keep
+
+    Returns:
+        list: Dicts with 'book_id' and 'similarity', best first
+    """
+    pos = catalog.position[book_id]
+    scores = np.zeros(len(catalog), dtype=np.float64)
+
+    genre = catalog.genre_codes[pos]
+    if genre >= 0:
+        scores += GENRE_WEIGHT * (catalog.genre_codes == genre)
+    author = catalog.author_codes[pos]
+    if author >= 0:
+        scores += AUTHOR_WEIGHT * (catalog.author_codes == author)
+
+    scores += INTERACTION_WEIGHT * interaction
+
+    scores[pos] = 0
+    candidates = np.flatnonzero(scores > 0)
+    if len(candidates) > top_k:
+        candidates = np.sort(candidates[np.argpartition(-scores[candidates], top_k - 1)[:top_k]])
+    candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+
+    return [
+        {'book_id': int(catalog.book_ids[other_pos]), 'similarity': float(scores[other_pos])}
+        for other_pos in candidates
+    ]
+
+
+def build_book_neighbors(top_k=None):
+    """
+    Rebuild the neighbour lists of every book.
+
+    Args:
+        top_k (int, optional): Neighbours kept per book (defaults to SIMILAR_BOOKS_TOP_K)
+
+    Returns:
+        int: Number of books indexed
+    """
+    top_k = top_k or current_app.config.get('SIMILAR_BOOKS_TOP_K', 20)
+    catalog = BookCatalog.load()
+    matrix = rebuild_coborrow_matrix()
+    matrix_positions = catalog_positions(catalog, matrix)
+
+    collection = BookNeighbors.get_collection()
+    operations = []
+    for book_id in catalog.book_ids.tolist():
+        interaction = interaction_scores(catalog, matrix, book_id, matrix_positions)
+        neighbors = rank_neighbors(catalog, book_id, interaction, top_k)
+        operations.append(UpdateOne(
+            {'book_id': book_id},
+            {'$set': {'neighbors': neighbors, 'stale': False}},
+            upsert=True
+        ))
+        if len(operations) >= BULK_WRITE_SIZE:
+            collection.bulk_write(operations, ordered=False)
+            operations = []
+
+    if operations:
+        collection.bulk_write(operations, ordered=False)
+
+    # Drop the lists of books that no longer exist
+    collection.delete_many({'book_id': {'$nin': catalog.book_ids.tolist()}})
+    return len(catalog)
+
+
+def refresh_stale_book_neighbors(top_k=None):
+    """
+    Recompute the neighbour lists flagged as stale and those of books without one.
+
+    Loads the catalog and the co-borrow matrix once for all of them, so it is
+    meant to run as a batch job (rebuild-book-neighbors --stale-only).
+
+    Args:
+        top_k (int, optional): Neighbours kept per book (defaults to SIMILAR_BOOKS_TOP_K)
+
+    Returns:
+        int: Number of lists recomputed
+    """
+    top_k = top_k or current_app.config.get('SIMILAR_BOOKS_TOP_K', 20)
+    catalog = BookCatalog.load()
+    collection = BookNeighbors.get_collection()
+    indexed = set(collection.distinct('book_id'))
+    book_ids = set(BookNeighbors.get_stale_book_ids()) | (set(catalog.position) - indexed)
+    book_ids = sorted(book_id for book_id in book_ids if book_id in catalog.position)
+    if not book_ids:
+        return 0
+
+    # Lists are marked stale by new loans, so include loans not merged yet
+    matrix = get_coborrow_matrix(merge_pending=True)
+    matrix_positions = catalog_positions(catalog, matrix)
+    operations = []
+    for book_id in book_ids:
+        interaction = interaction_scores(catalog, matrix, book_id, matrix_positions)
+        operations.append(UpdateOne(
+            {'book_id': book_id},
+            {'$set': {'neighbors': rank_neighbors(catalog, book_id, interaction, top_k), 'stale': False}},
+            upsert=True
+        ))
+        if len(operations) >= BULK_WRITE_SIZE:
+            collection.bulk_write(operations, ordered=False)
+            operations = []
+    if operations:
+        collection.bulk_write(operations, ordered=False)
+    return len(book_ids)
+
+
+def get_book_neighbors(book_id):
+    """
+    Get the stored neighbour list of a book.
+
+    Stale lists are served as they are (they differ by a few recent loans) and
+    books without a list get none until the next batch refresh, so the read
+    never scans the catalog.
+
+    Args:
+        book_id (int): The ID of the book
+
+    Returns:
+        list: Dicts with 'book_id' and 'similarity', best first
+    """
+    document = BookNeighbors.get_by_book(book_id)
+    if document is None:
+        return []
+    return document.get('neighbors', [])
+
+
+def mark_book_neighbors_stale(user_id, book_id):
+    """
+    Flag the neighbour lists affected by a new loan for lazy recomputation.
+
+    The borrowed book and the user's other books gain a common borrower; the
+    small Jaccard dilution of other pairs is corrected by the next full rebuild.
+
+    Args:
+        user_id (int): The ID of the user
+        book_id (int): The ID of the borrowed book
+
+    Returns:
+        bool: Whether the update was successful
+    """
+    try:
+        book_ids = set(LoanHistory.get_collection().distinct('book_id', {'user_id': user_id}))
+        book_ids.add(book_id)
+        BookNeighbors.mark_stale(book_ids)
+        return True
+    except Exception as e:
+        current_app.logger.error(f"Error marking book neighbours as stale: {str(e)}")
+        return False
@@ -0,0 +1,173 @@
+"""
+Search suggestion service for LibriMongo application.
+Completes what is typed in the live search box from a sorted array of
+normalized titles and authors weighted by popularity, searched by bisection
+in memory, so suggestions only read the catalog version stamp.
+"""
+
+import threading
+from bisect import bisect_left
+import numpy as np
+from sqlalchemy import func
+from models.mariadb_models import Book, Loan, db
+from models.mongodb_models import CatalogVersion
+from services.trigram_index import normalize
+from utils.helpers import get_app_cache
+
+# Character after every normalized one, to close a prefix range
+PREFIX_END = '\uffff'
+
+
+class SuggestIndex:
+    """
+    Sorted completion keys with their suggestion and weight.
+
+    Every title and author is indexed from each of its words, so "vien" also
+    completes "El nombre del viento".
+    """
+
+    def __init__(self, keys, positions, weights, suggestions):
+        self.keys = keys
+        self.positions = positions
+        self.weights = weights
+        self.suggestions = suggestions
+
+    def __len__(self):
+        return len(self.keys)
+
+    @classmethod
+    def from_books(cls, books):
+        """
+        Build the index.
+
+        Args:
+            books (iterable): (book_id, title, author, loans) tuples
+
+        Returns:
+            SuggestIndex: The index
+        """
+        suggestions = []
+        weights = []
+        authors = {}
+        for book_id, title, author, loans in books:
+            popularity = np.log1p(loans or 0) + 1
+            if title:
+                suggestions.append({'text': title, 'type': 'title', 'book_id': book_id})
+                weights.append(popularity)
+            if author:
+                # An author is as popular as all their books
+                if author not in authors:
+                    authors[author] = len(suggestions)
+                    suggestions.append({'text': author, 'type': 'author', 'book_id': None})
+                    weights.append(0.0)
+                weights[authors[author]] += popularity
+
+        entries = []
+        for position, suggestion in enumerate(suggestions):
+            words = normalize(suggestion['text'])
+            entries.extend((' '.join(words[start:]), position) for start in range(len(words)))
+        entries.sort()
+        return cls(
+            [key for key, _ in entries],
+            [position for _, position in entries],
+            np.array([weights[position] for _, position in entries], dtype=np.float64),
+            suggestions,
+        )
+
+    def suggest(self, prefix, limit=5):
+        """
+        Get the most popular completions of a prefix.
+
+        Args:
+            prefix (str): What has been typed so far
+            limit (int): Maximum number of suggestions
+
+        Returns:
+            list: Suggestion dicts (text, type and book_id for titles), most popular first
+        """
+        prefix = ' '.join(normalize(prefix))
+        if not prefix or not len(self) or limit <= 0:
+            return []
+        start = bisect_left(self.keys, prefix)
+        end = bisect_left(self.keys, prefix + PREFIX_END, lo=start)
+        if start == end:
+            return []
+
+        # The same suggestion can match from several of its words: take spare candidates,
+        # and rank the whole range only if they hold too few distinct suggestions
+        weights = self.weights[start:end]
+        take = min(len(weights), limit * 4)
+        while True:
+            if take < len(weights):
+                best = np.argpartition(-weights, take - 1)[:take]
+            else:
+                best = np.arange(len(weights))
+            best = best[np.lexsort((best, -weights[best]))]
+
+            results = []
+            seen = set()
+            for offset in best.tolist():
+                position = self.positions[start + offset]
+                if position not in seen:
+                    seen.add(position)
+                    results.append(self.suggestions[position])
+                    if len(results) == limit:
+                        return results
+            if take == len(weights):
+                return results
+            take = len(weights)
+
+
+def _get_state():
+    state = get_app_cache('suggest_index')
+    state.setdefault('lock', threading.RLock())
+    return state
+
+
+def build_suggest_index():
+    """
+    Build the suggestion index of every title and author, weighted by loans.
+
+    Returns:
+        SuggestIndex: The index
+    """
+    loans = dict(db.session.query(Loan.book_id, func.count(Loan.id)).group_by(Loan.book_id).all())
+    books = Book.query.with_entities(Book.id, Book.title, Book.author).all()
+    return SuggestIndex.from_books(
+        (book_id, title, author, loans.get(book_id, 0)) for book_id, title, author in books
+    )
+
+
+def get_suggest_index():
+    """
+    Get the suggestion index, rebuilding it after catalog changes.
+
+    As for the trigram index, the catalog version tells when books were
+    created, edited or deleted. Loans do not bump it, so the popularity
+    weights are those of the last rebuild and refresh only with the catalog.
+
+    Returns:
+        SuggestIndex: The index
+    """
+    state = _get_state()
+    version = CatalogVersion.get()
+    if state.get('index') is None or state.get('version') != version:
+        with state['lock']:
+            if state.get('index') is None or state.get('version') != version:
+                state['index'] = build_suggest_index()
+                state['version'] = version
+    return state['index']
+
+
+def suggest(prefix, limit=5):
+    """
+    Complete what has been typed in the search box.
+
+    Args:
+        prefix (str): What has been typed so far
+        limit (int): Maximum number of suggestions
+
+    Returns:
+        list: Suggestion dicts (text, type and book_id for titles), most popular first
+    """
+    return get_suggest_index().suggest(prefix, limit=limit)
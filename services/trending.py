@@ -0,0 +1,154 @@
+"""
+Trending service for LibriMongo application.
+Counts book loans and views in daily buckets and keeps a forward-decayed score
+per book (each event weighs 2^((t - landmark) / half-life)), so the books
+trending this week are read from an index instead of grouping all loans.
+"""
+
+import math
+from datetime import datetime, timedelta
+from flask import current_app
+from pymongo import UpdateOne
+from models.mariadb_models import Book
+from models.mongodb_models import BookActivity, BookTrending
+
+# Weight of each kind of event in the trending score
+EVENT_WEIGHTS = {'loans': 3.0, 'views': 1.0}
+
+# Scores are rebuilt on a new landmark before 2^exponent gets close to overflowing
+MAX_EXPONENT = 900
+
+BULK_WRITE_SIZE = 1000
+
+
+def _half_life_seconds():
+    return current_app.config.get('TRENDING_HALF_LIFE_HOURS', 84) * 3600
+
+
+def _get_landmark():
+    """
+    Get the landmark time of the scores, setting it on first use (write path).
+
+    It is read on every use rather than cached, so no process keeps decaying
+    against a landmark a rebuild has replaced.
+    """
+    return BookTrending.get_landmark(default=datetime.utcnow())
+
+
+def _decay_exponent(when, landmark):
+    return (when - landmark).total_seconds() / _half_life_seconds()
+
+
+def _bucket_scores(since, landmark):
+    """Get the decayed score and last activity of every book in the daily buckets since a day."""
+    scores = {}
+    last_events = {}
+    for bucket in BookActivity.get_since(since):
+        # Events of a day are taken at the middle of the day
+        at = bucket['day'] + timedelta(hours=12)
+        weight = sum(EVENT_WEIGHTS[kind] * bucket.get(kind, 0) for kind in EVENT_WEIGHTS)
+        book_id = bucket['book_id']
+        scores[book_id] = scores.get(book_id, 0.0) + weight * math.pow(2.0, _decay_exponent(at, landmark))
+        last_events[book_id] = max(last_events.get(book_id, at), at)
+    return scores, last_events
+
+
+def record_book_event(book_id, kind, when=None):
+    """
+    Count a loan or a view of a book.
+
+    The weight is added to the score entry of the landmark it was computed
+    against, so an event racing a rebuild never lands on the wrong scale.
+
+    Args:
+        book_id (int): The ID of the book
+        kind (str): 'loans' or 'views'
+        when (datetime, optional): Time of the event (defaults to now)
+
+    Returns:
+        bool: Whether the event was recorded
+    """
+    try:
+        when = when or datetime.utcnow()
+        day = datetime(when.year, when.month, when.day)
+        BookActivity.increment(book_id, day, kind)
+
+        landmark = _get_landmark()
+        exponent = _decay_exponent(when, landmark)
+        if exponent > MAX_EXPONENT:
+            rebuild_trending_scores()
+            landmark = _get_landmark()
+            exponent = _decay_exponent(when, landmark)
+        BookTrending.add(book_id, landmark, EVENT_WEIGHTS[kind] * math.pow(2.0, exponent), when)
+        return True
+    except Exception as e:
+        current_app.logger.error(f"Error recording trending event for book {book_id}: {str(e)}")
+        return False
+
+
+def rebuild_trending_scores():
+    """
+    Recompute every score from the daily buckets, relative to a new landmark (now).
+
+    The new scores are written beside the current ones, then the landmark is
+    switched and the old scores dropped, so readers never see a partial board.
+
+    Returns:
+        int: Number of books with a score
+    """
+    landmark = datetime.utcnow()
+    retention = timedelta(days=current_app.config.get('TRENDING_RETENTION_DAYS', 90))
+    scores, last_events = _bucket_scores(landmark - retention, landmark)
+
+    collection = BookTrending.get_collection()
+    operations = []
+    for book_id, score in scores.items():
+        operations.append(UpdateOne(
+            {'book_id': book_id, 'landmark': landmark},
+            {'$set': {'score': score, 'last_event_at': last_events[book_id]}},
+            upsert=True
+        ))
+        if len(operations) >= BULK_WRITE_SIZE:
+            collection.bulk_write(operations, ordered=False)
+            operations = []
+    if operations:
+        collection.bulk_write(operations, ordered=False)
+
+    BookTrending.set_landmark(landmark)
+    collection.delete_many({'landmark': {'$ne': landmark}})
+    return len(scores)
+
+
+def get_trending_book_ids(limit=10, days=None):
+    """
+    Get the IDs of the books with the most recent activity, from the stored scores.
+
+    Args:
+        limit (int): Maximum number of book IDs to return
+        days (int, optional): Only books with activity in the last days
+
+    Returns:
+        list: Book IDs, most trending first
+    """
+    landmark = BookTrending.get_landmark()
+    if landmark is None:
+        return []
+    since = datetime.utcnow() - timedelta(days=days) if days else None
+    return [entry['book_id'] for entry in BookTrending.get_top(landmark, limit, since=since)]
+
+
+def get_trending_books(limit=10):
+    """
+    Get the books with the most recent activity.
+
+    Args:
+        limit (int): Maximum number of books to return
+
+    Returns:
+        list: Books, most trending first
+    """
+    book_ids = get_trending_book_ids(limit)
+    if not book_ids:
+        return []
+    books = {book.id: book for book in Book.query.filter(Book.id.in_(book_ids)).all()}
+    return [books[book_id] for book_id in book_ids if book_id in books]
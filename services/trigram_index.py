@@ -0,0 +1,179 @@
+"""
+Trigram index service for LibriMongo application.
+Finds books whose title or author resembles a misspelled query (pg_trgm-style
+trigram matching), from posting arrays kept in memory and rebuilt when the
+catalog version changes.
+"""
+
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+import numpy as np
+from flask import current_app
+from models.mariadb_models import Book
+from models.mongodb_models import CatalogVersion
+from utils.helpers import get_app_cache
+
+# Indexed fields and their weight in the final score (a title match ranks first)
+FIELDS = (('title', 1.0), ('author', 0.9))
+
+
+def normalize(text):
+    """Lowercase, fold accents and keep only letters and digits as words."""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char)).lower()
+    return re.findall(r'[a-z0-9]+', text)
+
+
+def trigrams(text):
+    """
+    Get the set of trigrams of a text.
+
+    Each word is padded with two spaces in front and one behind, so short words
+    and word starts produce trigrams too ("sol" -> "  s", " so", "sol", "ol ").
+
+    Args:
+        text (str): The text
+
+    Returns:
+        set: Trigrams
+    """
+    grams = set()
+    for word in normalize(text):
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class TrigramIndex:
+    """Posting arrays of entry positions by trigram, one entry per book field."""
+
+    def __init__(self, entry_book_ids, entry_weights, entry_sizes, postings):
+        self.entry_book_ids = entry_book_ids
+        self.entry_weights = entry_weights
+        self.entry_sizes = entry_sizes
+        self.postings = postings
+
+    def __len__(self):
+        return len(self.entry_book_ids)
+
+    @classmethod
+    def from_books(cls, books):
+        """
+        Build the index.
+
+        Args:
+            books (iterable): (book_id, title, author) tuples
+
+        Returns:
+            TrigramIndex: The index
+        """
+        book_ids, weights, sizes = [], [], []
+        postings = defaultdict(list)
+        for book_id, *values in books:
+            for (_, weight), value in zip(FIELDS, values):
+                grams = trigrams(value)
+                if not grams:
+                    continue
+                position = len(book_ids)
+                book_ids.append(book_id)
+                weights.append(weight)
+                sizes.append(len(grams))
+                for gram in grams:
+                    postings[gram].append(position)
+        return cls(
+            np.array(book_ids, dtype=np.int64),
+            np.array(weights, dtype=np.float64),
+            np.array(sizes, dtype=np.int64),
+            {gram: np.array(positions, dtype=np.int32) for gram, positions in postings.items()},
+        )
+
+    def search(self, query, limit=10, threshold=0.5):
+        """
+        Rank the books whose title or author resembles a query.
+
+        An entry scores the share of the query trigrams it contains, so a
+        misspelled surname still matches a full author name; ties are broken
+        by trigram similarity (shared / all trigrams of both).
+
+        Args:
+            query (str): The (possibly misspelled) query
+            limit (int): Maximum number of results
+            threshold (float): Minimum share of query trigrams an entry must contain
+
+        Returns:
+            list: (book_id, score) tuples, best first
+        """
+        query_grams = trigrams(query)
+        query_size = len(query_grams)
+        grams = [gram for gram in query_grams if gram in self.postings]
+        if not grams or not len(self):
+            return []
+
+        shared = np.bincount(np.concatenate([self.postings[gram] for gram in grams]), minlength=len(self))
+        candidates = np.flatnonzero(shared >= threshold * query_size)
+        if len(candidates) == 0:
+            return []
+        common = shared[candidates]
+        containment = common / query_size
+        similarity = common / (query_size + self.entry_sizes[candidates] - common)
+        scores = self.entry_weights[candidates] * (containment + 0.1 * similarity)
+
+        best = {}
+        for book_id, score in zip(self.entry_book_ids[candidates].tolist(), scores.tolist()):
+            if score > best.get(book_id, 0.0):
+                best[book_id] = score
+        return sorted(best.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+
+def _get_state():
+    state = get_app_cache('trigram_index')
+    state.setdefault('lock', threading.RLock())
+    return state
+
+
+def build_trigram_index():
+    """
+    Build the trigram index of every book title and author.
+
+    Returns:
+        TrigramIndex: The index
+    """
+    return TrigramIndex.from_books(Book.query.with_entities(Book.id, Book.title, Book.author).all())
+
+
+def get_trigram_index():
+    """
+    Get the trigram index, rebuilding it after catalog changes.
+
+    Book creations, edits and deletions (in any process) bump the catalog
+    version, so segment merges and other index writes do not cause a rebuild.
+
+    Returns:
+        TrigramIndex: The index
+    """
+    state = _get_state()
+    version = CatalogVersion.get()
+    if state.get('index') is None or state.get('version') != version:
+        with state['lock']:
+            if state.get('index') is None or state.get('version') != version:
+                state['index'] = build_trigram_index()
+                state['version'] = version
+    return state['index']
+
+
+def fuzzy_search_book_ids(query, limit=None):
+    """
+    Find the books whose title or author resembles a query.
+
+    Args:
+        query (str): The (possibly misspelled) query
+        limit (int, optional): Maximum number of book IDs (defaults to SEARCH_MAX_RESULTS)
+
+    Returns:
+        list: Book IDs, best match first
+    """
+    limit = limit or current_app.config.get('SEARCH_MAX_RESULTS', 1000)
+    threshold = current_app.config.get('FUZZY_SEARCH_THRESHOLD', 0.5)
+    return [book_id for book_id, _ in get_trigram_index().search(query, limit=limit, threshold=threshold)]
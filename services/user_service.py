@@ -6,7 +6,10 @@ Gestiona el perfil d'usuari, l'historial de lectura i les preferències.
 from flask import current_app
 from models.mariadb_models import User, Loan, Book, db
 from models.mongodb_models import Review, LoanHistory, UserPreferences
-from services.recommendation_service import get_recommendations_for_user, track_user_interaction
+from services.recommendation_service import track_user_interaction
+from services.recommendation_cache import get_cached_recommendations
+from services.recommendation_batch import get_materialized_recommendations
+from services.coview_graph import record_book_view
 from utils.helpers import log_activity
 from datetime import datetime, timezone
 from dateutil.parser import parse
@@ -147,6 +150,10 @@ def get_user_recommendations(user_id, limit=10):
     """
     Obté recomanacions de llibres personalitzades per a un usuari.
     
+    Es llegeixen de l'última generació del procés per lots; si l'usuari no hi és
+    o ha tingut activitat nova, es serveixen des de la memòria cau i només es
+    recalculen quan l'activitat de l'usuari ha canviat.
+    
     Args:
         user_id (int): L'ID de l'usuari
         limit (int): Nombre màxim de recomanacions a retornar
@@ -154,12 +161,17 @@ def get_user_recommendations(user_id, limit=10):
     Returns:
         list: Llibres recomanats
     """
-    return get_recommendations_for_user(user_id, limit=limit)
+    recommendations = get_materialized_recommendations(user_id, limit=limit)
+    if recommendations is None:
+        recommendations = get_cached_recommendations(user_id, limit=limit)
+    return recommendations
 
 def track_book_view(user_id, book_id):
     """
     Registra quan un usuari visualitza un llibre.
     
+    La visualització també alimenta el graf de llibres vistos junts.
+    
     Args:
         user_id (int): L'ID de l'usuari
         book_id (int): L'ID del llibre
@@ -167,6 +179,7 @@ def track_book_view(user_id, book_id):
     Returns:
         bool: Si el registre ha estat exitós
     """
+    record_book_view(f'user:{user_id}', book_id)
     return track_user_interaction(user_id, book_id, 'view')
 
 def get_user_active_loans(user_id):
@@ -183,22 +183,59 @@ function initSearchAutocomplete() {
     const searchInput = document.querySelector('input[name="query"]');
     
     if (searchInput) {
+        // Desplegable de suggeriments sota el camp de cerca
+        const container = searchInput.form || searchInput.parentElement;
+        container.classList.add('position-relative');
+        const menu = document.createElement('ul');
+        menu.className = 'dropdown-menu w-100';
+        menu.style.top = '100%';
+        container.appendChild(menu);
+        
         searchInput.addEventListener('input', debounce(function() {
             const query = searchInput.value.trim();
             
-            if (query.length < 2) return;
+            if (query.length < 2) {
+                menu.classList.remove('show');
+                return;
+            }
             
-            fetch(`/books/api/search?query=${encodeURIComponent(query)}&per_page=5`)
+            fetch(`/books/api/suggest?query=${encodeURIComponent(query)}&limit=5`)
                 .then(response => response.json())
-                .then(data => {
-                    // Això s'implementaria si tinguéssim un desplegable per a l'autocompletat
-                    console.log('Search results:', data);
-                })
-                .catch(error => console.error('Error fetching search results:', error));
-        }, 300));
+                .then(data => renderSuggestions(menu, data.suggestions))
+                .catch(error => console.error('Error fetching search suggestions:', error));
+        }, 150));
+        
+        // Amaga els suggeriments en sortir del camp (després del clic en un d'ells)
+        searchInput.addEventListener('blur', function() {
+            setTimeout(() => menu.classList.remove('show'), 200);
+        });
     }
 }
 
+/**
+ * Mostra els suggeriments: els títols porten al llibre i els autors a la cerca
+ */
+function renderSuggestions(menu, suggestions) {
+    menu.innerHTML = '';
+    suggestions.forEach(suggestion => {
+        const link = document.createElement('a');
+        link.className = 'dropdown-item text-truncate';
+        link.href = suggestion.type === 'title'
+            ? `/books/${suggestion.book_id}`
+            : `/books/search?query=${encodeURIComponent(suggestion.text)}`;
+        
+        const icon = document.createElement('i');
+        icon.className = suggestion.type === 'title' ? 'bi bi-book me-2' : 'bi bi-person me-2';
+        link.appendChild(icon);
+        link.appendChild(document.createTextNode(suggestion.text));
+        
+        const item = document.createElement('li');
+        item.appendChild(link);
+        menu.appendChild(item);
+    });
+    menu.classList.toggle('show', suggestions.length > 0);
+}
+
 /**
  * Funció de debounce per limitar les crides a l'API
  */
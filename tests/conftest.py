@@ -0,0 +1,41 @@
+"""
+Shared fixtures for the tests that need a Flask app with a database.
+"""
+
+import pytest
+from flask import Flask
+from models.mariadb_models import db
+
+@pytest.fixture
+def app_config():
+    """Extra configuration of the test app; override it in a module to change settings."""
+    return {}
+
+@pytest.fixture
+def books():
+    """Books stored in the test database; override it in a module to seed the catalog."""
+    return []
+
+@pytest.fixture
+def app(app_config, books):
+    """Flask app with an in-memory SQLite database holding the seeded books."""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config.update(app_config)
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        db.session.add_all(books)
+        db.session.commit()
+        yield app
+
+@pytest.fixture
+def mongo(app):
+    """In-memory MongoDB (mongomock) attached to the test app, with the application's indexes."""
+    mongomock = pytest.importorskip('mongomock')
+    from utils.db_init import init_mongodb
+    app.config['MONGO_DB_NAME'] = 'librimongo_test'
+    app.mongo_client = mongomock.MongoClient()
+    assert init_mongodb()
+    return app.mongo_client[app.config['MONGO_DB_NAME']]
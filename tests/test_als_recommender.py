@@ -0,0 +1,42 @@
+"""
+Tests for the implicit-feedback ALS recommender.
+"""
+
+from services.als_recommender import ALSModel
+
+# Two reading communities: users 1-4 read books 10-13, users 5-8 read books 20-23
+INTERACTIONS = [
+    (user_id, book_id, 1)
+    for user_id, books in (
+        (1, (10, 11, 12)), (2, (10, 11, 13)), (3, (11, 12, 13)), (4, (10, 12)),
+        (5, (20, 21, 22)), (6, (20, 21, 23)), (7, (21, 22, 23)), (8, (20, 22)),
+    )
+    for book_id in books
+]
+
+def train(interactions=INTERACTIONS):
+    return ALSModel.train(*zip(*interactions), factors=4, regularization=0.1, alpha=10, iterations=15)
+
+def test_recommends_unread_books_of_the_same_community():
+    """A reader gets the unread book of their community first and never a read one."""
+    model = train()
+
+    assert model.recommend(1, limit=1) == [13]
+    assert model.recommend(8, limit=2)[0] in (21, 23)
+    assert not {10, 11, 12} & set(model.recommend(1, limit=5))
+
+def test_extra_exclusions_and_unknown_users():
+    """Books read after training are excluded and unknown users get None."""
+    model = train()
+
+    assert 13 not in model.recommend(1, limit=3, exclude_book_ids=[13, 99])
+    assert model.recommend(42) is None
+    assert len(model.recommend(1, limit=100)) == len(model.item_ids) - 3
+
+def test_save_and_load(tmp_path):
+    """A saved model gives the same recommendations after loading."""
+    model = train()
+    path = str(tmp_path / 'als_model.npz')
+    model.save(path)
+
+    assert ALSModel.load(path).recommend(5, limit=3) == model.recommend(5, limit=3)
@@ -0,0 +1,40 @@
+"""
+Tests for the "readers also borrowed" association rules.
+"""
+
+from services.also_borrowed import mine_also_borrowed
+
+# (user_id, book_id) loans sorted by user
+LOANS = [
+    (1, 10), (1, 20), (1, 30),
+    (2, 10), (2, 20),
+    (3, 10), (3, 20), (3, 10),  # repeated loan of the same book
+    (4, 30), (4, 40),
+]
+
+def test_rules_support_confidence_and_lift():
+    """Rules count each reader once and are scored against the book's readers."""
+    rules, readers = mine_also_borrowed(LOANS, min_support=2, min_confidence=0.1)
+
+    assert readers == 4
+    assert rules[10] == [{'book_id': 20, 'support': 3, 'confidence': 1.0, 'lift': 4 / 3}]
+    assert rules[20][0]['book_id'] == 10
+    assert 30 not in rules  # 30 -> 10 has a single common reader
+
+def test_thresholds_and_top_n():
+    """Low support or confidence rules are dropped and lists are capped."""
+    rules, _ = mine_also_borrowed(LOANS, min_support=1, min_confidence=0.5, top_n=1)
+
+    assert [rule['book_id'] for rule in rules[30]] == [40]
+    assert all(len(book_rules) == 1 for book_rules in rules.values())
+    assert all(rule['confidence'] >= 0.5 for book_rules in rules.values() for rule in book_rules)
+
+def test_heavy_readers_keep_their_latest_books(monkeypatch):
+    """Baskets over MAX_BASKET_SIZE drop the oldest loans, not the highest book IDs."""
+    import services.also_borrowed as also_borrowed
+    monkeypatch.setattr(also_borrowed, 'MAX_BASKET_SIZE', 2)
+    loans = [(1, 10), (1, 90), (1, 80), (2, 90), (2, 80)]
+
+    rules, _ = mine_also_borrowed(loans, min_support=2, min_confidence=0.1)
+    assert [rule['book_id'] for rule in rules[90]] == [80]
+    assert 10 not in rules
@@ -0,0 +1,26 @@
+"""
+Tests for the recommender benchmark harness.
+"""
+
+from benchmark import generate_library, run_benchmark, split_holdout
+
+def test_holdout_keeps_recent_loans_out_of_training():
+    """The most recent loans of active readers are held out, not trained on."""
+    library = generate_library(users=10, books=30, loans=120, reviews=20, seed=3)
+    training, held_out = split_holdout(library['loans'], holdout=2)
+
+    assert len(training) <= len(library['loans'])
+    for user, books in held_out.items():
+        trained = {book for u, book, _ in training if u == user}
+        assert books and not books & trained
+
+def test_run_benchmark_reports_every_recommender():
+    """A small run reports bounded quality metrics, latencies and query counts."""
+    report = run_benchmark(users=15, books=30, loans=150, reviews=40, k=5, sample=5)
+
+    assert len(report['results']) == 4
+    for result in report['results']:
+        assert 0 <= result['recall@5'] <= 1
+        assert 0 <= result['coverage'] <= 1
+        assert result['p95_ms'] >= result['p50_ms'] >= 0
+        assert result['sql_queries'] >= 0 and result['mongo_queries'] >= 0
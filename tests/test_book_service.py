@@ -0,0 +1,73 @@
+"""
+Tests for the keyset pagination of the book catalog.
+"""
+
+from datetime import datetime, timedelta
+import pytest
+from models.mariadb_models import Book
+from services.book_service import get_books_page
+
+@pytest.fixture
+def app_config():
+    return {'MAX_PER_PAGE': 5}
+
+@pytest.fixture
+def books():
+    start = datetime(2024, 1, 1)
+    # Repeated titles, years and dates so ties are broken by ID; some years and dates missing
+    return [
+        Book(
+            id=book_id, title=f'Book {book_id % 7}', author=f'Author {book_id % 3}',
+            year=None if book_id % 5 == 0 else 1990 + book_id % 4,
+            created_at=None if book_id % 6 == 0 else start + timedelta(days=book_id % 8),
+            genre='Fantasy' if book_id % 2 else 'History',
+            total_copies=1, available_copies=1
+        )
+        for book_id in range(1, 24)
+    ]
+
+def expected_order(sort_by, descending, genre=None):
+    books = [book for book in Book.query.all() if genre is None or book.genre == genre]
+    # NULL keys sort before any value
+    books.sort(key=lambda book: (getattr(book, sort_by) is not None, getattr(book, sort_by) or 0, book.id))
+    if descending:
+        books.reverse()
+    return [book.id for book in books]
+
+@pytest.mark.parametrize('sort_by', ['title', 'author', 'year', 'created_at'])
+@pytest.mark.parametrize('sort_order', ['asc', 'desc'])
+def test_cursors_walk_the_whole_catalog(app, sort_by, sort_order):
+    """Following next cursors visits every book once in order; prev cursors walk back."""
+    expected = expected_order(sort_by, sort_order == 'desc')
+    pages = []
+    cursor = None
+    while True:
+        books, next_cursor, prev_cursor, total = get_books_page(cursor, per_page=4, sort_by=sort_by, sort_order=sort_order)
+        assert total == len(expected)
+        assert (prev_cursor is None) == (cursor is None)
+        pages.append(([book.id for book in books], prev_cursor))
+        if next_cursor is None:
+            break
+        cursor = next_cursor
+    assert [book_id for ids, _ in pages for book_id in ids] == expected
+
+    for (previous_ids, _), (_, prev_cursor) in zip(pages, pages[1:]):
+        books, next_cursor, _, _ = get_books_page(prev_cursor, per_page=4, sort_by=sort_by, sort_order=sort_order)
+        assert [book.id for book in books] == previous_ids
+        assert next_cursor is not None
+
+def test_filters_and_page_size_cap(app):
+    """Filters apply to every page and per_page is capped at MAX_PER_PAGE."""
+    books, next_cursor, _, total = get_books_page(per_page=1000, sort_by='year', filters={'genre': 'History'})
+    assert len(books) == 5
+    assert total == len(expected_order('year', False, genre='History'))
+    second, _, _, _ = get_books_page(next_cursor, per_page=1000, sort_by='year', filters={'genre': 'History'})
+    assert [book.id for book in books + second] == expected_order('year', False, genre='History')[:10]
+
+def test_foreign_or_malformed_cursor_restarts(app):
+    """A cursor made for another sort, or garbage, gives the first page."""
+    first, next_cursor, _, _ = get_books_page(per_page=4, sort_by='title')
+    for cursor in (next_cursor, 'not-a-cursor'):
+        books, _, prev_cursor, _ = get_books_page(cursor, per_page=4, sort_by='author')
+        assert [book.id for book in books] == expected_order('author', False)[:4]
+        assert prev_cursor is None
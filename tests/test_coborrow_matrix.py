@@ -0,0 +1,63 @@
+"""
+Tests for the sparse book x user co-borrow matrix.
+"""
+
+from services.coborrow_matrix import CoBorrowMatrix
+
+LOANS = [
+    (10, 1), (10, 2), (10, 3),
+    (20, 2), (20, 3),
+    (30, 4),
+    (10, 1),  # repeated loan of the same book
+]
+
+def build_matrix(loans=LOANS):
+    book_ids, user_ids = zip(*loans)
+    return CoBorrowMatrix.from_pairs(book_ids, user_ids)
+
+def expected_jaccard(book_id1, book_id2, loans=LOANS):
+    users1 = {user for book, user in loans if book == book_id1}
+    users2 = {user for book, user in loans if book == book_id2}
+    return len(users1 & users2) / len(users1 | users2)
+
+def test_co_counts_and_jaccard_against_sets():
+    """One-vs-all products match pairwise set intersections."""
+    matrix = build_matrix()
+
+    assert matrix.book_ids.tolist() == [10, 20, 30]
+    assert matrix.co_counts(10).tolist() == [3, 2, 0]
+    for book_id in (10, 20, 30):
+        scores = matrix.jaccard(book_id)
+        for pos, other_id in enumerate(matrix.book_ids.tolist()):
+            assert abs(scores[pos] - expected_jaccard(book_id, other_id)) < 1e-12
+            assert abs(matrix.jaccard_pair(book_id, other_id) - expected_jaccard(book_id, other_id)) < 1e-12
+
+def test_unknown_book_has_no_similarity():
+    """Books without loans score zero against everything."""
+    matrix = build_matrix()
+
+    assert matrix.jaccard(99).tolist() == [0.0, 0.0, 0.0]
+    assert matrix.jaccard_pair(10, 99) == 0.0
+
+def test_merged_appends_new_loans():
+    """Appending loans gives the same matrix as building from all loans."""
+    extra = [(30, 2), (40, 4), (20, 3)]
+    merged = build_matrix().merged(*zip(*extra))
+    rebuilt = build_matrix(LOANS + extra)
+
+    assert merged.book_ids.tolist() == rebuilt.book_ids.tolist()
+    assert merged.indptr.tolist() == rebuilt.indptr.tolist()
+    assert merged.indices.tolist() == rebuilt.indices.tolist()
+    assert merged.t_indices.tolist() == rebuilt.t_indices.tolist()
+    assert abs(merged.jaccard_pair(30, 40) - expected_jaccard(30, 40, LOANS + extra)) < 1e-12
+
+def test_merged_skips_stored_loans():
+    """Appending only known pairs keeps the matrix; an empty matrix can grow."""
+    matrix = build_matrix()
+    assert matrix.merged([10, 20], [1, 3]) is matrix
+
+    grown = CoBorrowMatrix.from_pairs([], []).merged(*zip(*LOANS))
+    rebuilt = build_matrix()
+    assert grown.indices.tolist() == rebuilt.indices.tolist()
+    assert grown.t_indptr.tolist() == rebuilt.t_indptr.tolist()
+    assert grown.t_indices.tolist() == rebuilt.t_indices.tolist()
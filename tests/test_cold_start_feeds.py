@@ -0,0 +1,61 @@
+"""
+Tests for the cold-start recommendation feeds.
+"""
+
+import services.cold_start_feeds as feeds
+from services.cold_start_feeds import GLOBAL_FEED, genre_feed, language_feed
+
+FEEDS = {
+    GLOBAL_FEED: [1, 2, 3, 4, 5, 6],
+    genre_feed('Fantasy'): [10, 11, 12, 1],
+    genre_feed('Drama'): [20, 21, 2],
+    language_feed('es'): [30, 31],
+}
+
+def use_feeds(monkeypatch):
+    monkeypatch.setattr(feeds, 'get_feed_book_ids', lambda key, limit=None: FEEDS.get(key, [])[:limit])
+
+def test_remember_browsed_genre_keeps_most_viewed():
+    """Views are counted per genre and only the most viewed genres are kept."""
+    browsed = {}
+    for genre in ['Fantasy', 'Drama', 'Fantasy', None] + [f'G{i}' for i in range(10)]:
+        browsed = feeds.remember_browsed_genre(browsed, genre)
+
+    assert browsed['Fantasy'] == 2
+    assert len(browsed) == feeds.MAX_BROWSED_GENRES
+
+def test_anonymous_visitor_gets_global_feed(monkeypatch):
+    """Without browsed genres the global feed is served, minus excluded books."""
+    use_feeds(monkeypatch)
+
+    assert feeds.get_cold_start_book_ids(limit=3, exclude={1}) == [2, 3, 4]
+
+def test_browsed_genres_share_slots_by_views(monkeypatch):
+    """Slots follow the views of each genre and are completed from wider feeds."""
+    use_feeds(monkeypatch)
+
+    book_ids = feeds.get_cold_start_book_ids(limit=6, genres={'Fantasy': 2, 'Drama': 1}, language='es')
+    assert book_ids == [10, 11, 12, 1, 20, 21]
+
+    book_ids = feeds.get_cold_start_book_ids(limit=8, genres={'Drama': 1}, language='es')
+    assert book_ids == [20, 21, 2, 30, 31, 1, 3, 4]
+
+    book_ids = feeds.get_cold_start_book_ids(limit=8, genres={'Unknown': 1})
+    assert book_ids == [1, 2, 3, 4, 5, 6]
+
+def test_missing_global_feed_falls_back_to_trending_and_top_rated(mongo):
+    """Before the first rebuild-feeds, the global feed is trending then best rated books."""
+    from models.mongodb_models import RatingLeaderboard, RecommendationFeed
+    from services.trending import record_book_event
+
+    record_book_event(7, 'loans')
+    RatingLeaderboard.get_collection().insert_many([
+        {'book_id': 3, 'score': 4.5}, {'book_id': 7, 'score': 4.0}, {'book_id': 9, 'score': 3.0}
+    ])
+
+    assert feeds.get_feed_book_ids(GLOBAL_FEED) == [7, 3, 9]
+    assert feeds.get_feed_book_ids(GLOBAL_FEED, limit=2) == [7, 3]
+    assert feeds.get_feed_book_ids(genre_feed('Fantasy')) == []
+
+    RecommendationFeed.get_collection().insert_one({'key': GLOBAL_FEED, 'book_ids': [1, 2]})
+    assert feeds.get_feed_book_ids(GLOBAL_FEED) == [1, 2]
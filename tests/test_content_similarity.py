@@ -0,0 +1,56 @@
+"""
+Tests for the TF-IDF content similarity index.
+"""
+
+import numpy as np
+from services.content_similarity import ContentIndex, compute_all_neighbors
+from utils.text import tokenize
+
+BOOKS = {
+    1: "Dragones y magia en un reino lejano",
+    2: "Una novela de magia, dragones y caballeros",
+    3: "Historia económica de la Europa moderna",
+    4: "Economía europea: historia y crisis",
+    5: "",
+}
+
+def build_index(books=BOOKS):
+    return ContentIndex.from_texts(list(books), list(books.values()))
+
+def dense_cosine(index, book_id1, book_id2):
+    vectors = np.zeros((len(index), len(index.terms)))
+    for pos, book_id in enumerate(index.book_ids.tolist()):
+        indices, data = index.row(book_id)
+        vectors[pos, indices] = data
+    a, b = vectors[index.position[book_id1]], vectors[index.position[book_id2]]
+    return float(a @ b)
+
+def test_tokenize_folds_accents_and_drops_stopwords():
+    """Accents are folded and stopwords and single letters removed."""
+    assert tokenize("La Economía de Éxito, y 2 más") == ['economia', 'exito']
+
+def test_scores_match_dense_cosine():
+    """Posting-list scores equal dot products of the normalized rows."""
+    index = build_index()
+    for book_id in BOOKS:
+        scores = index.scores(*index.row(book_id))
+        for other_id in BOOKS:
+            assert abs(scores[index.position[other_id]] - dense_cosine(index, book_id, other_id)) < 1e-6
+
+def test_neighbors_rank_related_books_first():
+    """Books sharing rare terms are each other's best neighbour; empty texts have none."""
+    index = build_index()
+
+    assert index.neighbors(1, 2)[0]['book_id'] == 2
+    assert index.neighbors(3, 2)[0]['book_id'] == 4
+    assert index.neighbors(5, 2) == []
+    assert all(n['book_id'] != 1 for n in index.neighbors(1, 10))
+    assert dict(compute_all_neighbors(index, 2))[4] == index.neighbors(4, 2)
+
+def test_with_documents_replaces_rows():
+    """Editing a description moves the book next to its new topic; deleted books go."""
+    index = build_index().with_documents({5: "Dragones, magia y caballeros"})
+
+    assert len(index) == len(BOOKS)
+    assert index.neighbors(5, 1)[0]['book_id'] in (1, 2)
+    assert index.with_documents({}, deleted_ids=[5]).position.get(5) is None
@@ -0,0 +1,54 @@
+"""
+Tests for the cached and approximate listing totals.
+"""
+
+import pytest
+from models.mariadb_models import Book
+from services import count_cache
+from services.count_cache import cached_count, estimate_count, invalidate_counts, normalize_filters
+
+@pytest.fixture
+def app_config():
+    return {'COUNT_SAMPLE_SIZE': 50}
+
+@pytest.fixture
+def books():
+    return [
+        Book(id=book_id, title=f'Book {book_id}', author='Author',
+             genre='Fantasy' if book_id % 4 == 0 else 'History', total_copies=1, available_copies=1)
+        for book_id in range(1, 401)
+    ]
+
+def test_filters_are_normalized():
+    """Empty filters, order and case do not change the key."""
+    assert normalize_filters({'genre': 'Fantasy ', 'title': '', 'available': False}) == \
+        normalize_filters({'available': None, 'genre': 'fantasy'})
+    assert normalize_filters({'year_from': 0}) == (('year_from', 0),)
+
+def test_counts_are_cached_until_invalidated(app, monkeypatch):
+    """A total is counted once per TTL and recounted after a write to its scope."""
+    calls = []
+    def count():
+        calls.append(1)
+        return len(calls)
+
+    assert cached_count('books', {'genre': 'Fantasy'}, count) == 1
+    assert cached_count('books', {'genre': 'fantasy'}, count) == 1
+    invalidate_counts('loans')
+    assert cached_count('books', {'genre': 'Fantasy'}, count) == 1
+    invalidate_counts('books')
+    assert cached_count('books', {'genre': 'Fantasy'}, count) == 2
+
+    app.config['COUNT_CACHE_TTL'] = 10
+    now = count_cache.time.time()
+    monkeypatch.setattr(count_cache.time, 'time', lambda: now + 11)
+    assert cached_count('books', {'genre': 'Fantasy'}, count) == 3
+
+def test_estimates_are_exact_when_narrow_and_close_when_broad(app):
+    """Few matches are counted exactly; broad totals are scaled from a sample."""
+    narrow = Book.query.filter(Book.id <= 30)
+    assert estimate_count(Book, narrow) == 30
+
+    assert estimate_count(Book, Book.query) == 400
+    fantasy = Book.query.filter(Book.genre == 'Fantasy')
+    assert abs(estimate_count(Book, fantasy) - 100) <= 10
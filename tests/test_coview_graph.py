@@ -0,0 +1,40 @@
+"""
+Tests for the session co-view graph.
+"""
+
+from datetime import datetime, timedelta
+from services.coview_graph import MAX_SESSION_VIEWS, merge_neighbors, session_pairs
+
+START = datetime(2024, 1, 1, 12, 0)
+WINDOW = timedelta(minutes=30)
+
+def at(minutes):
+    return START + timedelta(minutes=minutes)
+
+def test_views_in_a_session_pair_both_ways():
+    """Books viewed within the window are co-viewed in both directions."""
+    sessions = {}
+    increments = session_pairs(sessions, [('a', 1, at(0)), ('a', 2, at(5)), ('b', 2, at(6)), ('a', 3, at(50))], WINDOW)
+
+    assert dict(increments[1]) == {2: 1}
+    assert dict(increments[2]) == {1: 1}
+    assert 3 not in increments
+    assert [book_id for book_id, _ in sessions['a']] == [3]
+
+def test_repeated_view_only_refreshes_session():
+    """Viewing a book again does not count its pairs twice, and sessions are capped."""
+    sessions = {'a': [(1, at(0)), (2, at(1))]}
+    increments = session_pairs(sessions, [('a', 1, at(2))], WINDOW)
+
+    assert increments == {}
+    assert [book_id for book_id, _ in sessions['a']] == [2, 1]
+
+    session_pairs(sessions, [('a', book_id, at(3)) for book_id in range(10, 30)], WINDOW)
+    assert len(sessions['a']) == MAX_SESSION_VIEWS
+
+def test_merge_neighbors_decays_and_caps():
+    """Old counts decay, new co-views are added and only the strongest are kept."""
+    neighbors = [{'book_id': 1, 'count': 4.0}, {'book_id': 2, 'count': 2.0}]
+    merged = merge_neighbors(neighbors, {2: 0.5, 3: 2.5}, 0.5, 2)
+
+    assert merged == [{'book_id': 3, 'count': 2.5}, {'book_id': 1, 'count': 2.0}]
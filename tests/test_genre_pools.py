@@ -0,0 +1,25 @@
+"""
+Tests for the per-genre candidate pools.
+"""
+
+import random
+from services.genre_pools import GenrePool
+
+def test_samples_are_distinct_and_skip_excluded_books():
+    """Draws never repeat a book or return an excluded one."""
+    pool = GenrePool(range(1, 101), [5.0 - i / 50 for i in range(100)])
+    rng = random.Random(7)
+
+    for weighted in (True, False):
+        sample = pool.sample(10, exclude={1, 2, 3}, weighted=weighted, rng=rng)
+        assert len(sample) == 10
+        assert len(set(sample)) == 10
+        assert not {1, 2, 3} & set(sample)
+
+def test_nearly_exhausted_pool_falls_back_to_ranking():
+    """When almost every book is excluded the remaining ones are still found."""
+    pool = GenrePool([10, 20, 30, 40], [4.0, 3.0, 2.0, 1.0])
+
+    assert sorted(pool.sample(5, exclude={10, 30}, rng=random.Random(1))) == [20, 40]
+    assert pool.sample(3, exclude={10, 20, 30, 40}) == []
+    assert GenrePool([], []).sample(3) == []
@@ -0,0 +1,70 @@
+"""
+Tests for the users x genres preference matrix.
+"""
+
+import os
+import tempfile
+from services.preference_matrix import UserGenreMatrix
+
+def build_matrix():
+    matrix = UserGenreMatrix()
+    preferences = {
+        1: {'Fantasy': 3, 'Drama': 1},
+        2: {'Fantasy': 6, 'Drama': 2},
+        3: {'History': 4},
+        4: {'Fantasy': 1, 'History': 1},
+    }
+    for user_id, genres in preferences.items():
+        for genre, score in genres.items():
+            matrix.add(user_id, genre, score)
+    return matrix, preferences
+
+def test_add_removes_weight_and_grows():
+    """Negative weights subtract scores and new users/genres extend the matrix."""
+    matrix, _ = build_matrix()
+
+    matrix.add(1, 'Drama', -1)
+    matrix.add(50, 'Poetry', 2)
+
+    assert matrix.preferences(1) == {'Fantasy': 3.0}
+    assert matrix.preferences(50) == {'Poetry': 2.0}
+    assert matrix.scores.shape == (5, 4)
+
+def test_save_and_load_round_trip():
+    """A saved matrix loads back with the same users, genres and scores."""
+    matrix, _ = build_matrix()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'matrix.npz')
+        matrix.save(path)
+        loaded = UserGenreMatrix.load(path)
+
+    assert loaded.user_ids == matrix.user_ids
+    assert loaded.genres == matrix.genres
+    assert (loaded.scores == matrix.scores).all()
+    assert loaded.preferences(2) == matrix.preferences(2)
+
+def test_saves_merge_updates_of_other_workers(tmp_path):
+    """A worker saving its updates keeps the ones another worker saved before."""
+    from flask import Flask
+    from services.preference_matrix import add_to_user_genre_matrix, get_user_genre_matrix, save_user_genre_matrix
+
+    UserGenreMatrix().save(os.path.join(tmp_path, 'user_genre_matrix.npz'))
+    workers = []
+    for _ in range(2):
+        app = Flask(__name__)
+        app.config['RECOMMENDER_DATA_DIR'] = str(tmp_path)
+        workers.append(app)
+
+    with workers[0].app_context():
+        add_to_user_genre_matrix(1, 'Fantasy', 2)
+    with workers[1].app_context():
+        add_to_user_genre_matrix(2, 'History', 1)
+    with workers[0].app_context():
+        assert save_user_genre_matrix(force=True)
+    with workers[1].app_context():
+        assert save_user_genre_matrix(force=True)
+        assert get_user_genre_matrix().preferences(1) == {'Fantasy': 2.0}
+    with workers[0].app_context():
+        # Reloaded after the other worker's save
+        assert get_user_genre_matrix().preferences(2) == {'History': 1.0}
@@ -0,0 +1,24 @@
+"""
+Tests for the stored rating leaderboard.
+"""
+
+from models.mongodb_models import Review, RatingLeaderboard
+from services.rating_leaderboard import build_rating_leaderboard, get_top_rated_book_ids
+
+def test_rebuild_ranks_by_smoothed_score(mongo):
+    """A single perfect review ranks below many good ones once pulled to the mean."""
+    Review.create(1, 1, 5)
+    for user_id in range(1, 11):
+        Review.create(2, user_id, 4.5)
+    Review.create(3, 1, 1)
+
+    assert build_rating_leaderboard(prior_weight=5) == 3
+    assert get_top_rated_book_ids() == [2, 1, 3]
+
+def test_rebuilt_board_keeps_the_book_id_index(mongo):
+    """The swapped-in collection keeps a unique book_id index for the book_meta $lookup."""
+    Review.create(1, 1, 4)
+    build_rating_leaderboard()
+
+    indexes = RatingLeaderboard.get_collection().index_information().values()
+    assert any(index['key'] == [('book_id', 1)] and index.get('unique') for index in indexes)
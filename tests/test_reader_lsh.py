@@ -0,0 +1,45 @@
+"""
+Tests for the MinHash/LSH index of similar readers.
+"""
+
+import numpy as np
+from services.coborrow_matrix import CoBorrowMatrix
+from services.reader_lsh import MinHashLSH
+
+def test_incremental_signature_matches_full_set():
+    """Adding books one by one gives the signature of the whole set."""
+    index = MinHashLSH(num_perm=32, bands=8)
+    for book_id in (5, 17, 42):
+        index.add_book(1, book_id)
+
+    assert np.array_equal(index.signatures[1], index.signature([5, 17, 42]))
+
+def test_identical_readers_are_candidates():
+    """Readers with the same books share every band; disjoint readers are not indexed together."""
+    loans = [(1, 10), (2, 10), (3, 10), (1, 20), (2, 20), (3, 20), (100, 30), (200, 30)]
+    book_ids, user_ids = zip(*loans)
+    index = MinHashLSH.from_coborrow_matrix(CoBorrowMatrix.from_pairs(book_ids, user_ids), num_perm=32, bands=8)
+
+    assert index.candidates(10) == {20}
+    assert index.candidates(30) == set()
+    assert index.candidates(99) is None
+    assert np.array_equal(index.signatures[10], index.signature([1, 2, 3]))
+
+def test_index_follows_loans_of_other_processes(app, mongo):
+    """Loans appended to the shared co-borrow matrix reach the index; a rebuilt matrix rebuilds it."""
+    from models.mongodb_models import LoanHistory
+    from services.coborrow_matrix import rebuild_coborrow_matrix
+    from services.reader_lsh import get_reader_lsh
+    app.config['COBORROW_MERGE_INTERVAL'] = 0
+
+    for user_id in (1, 2):
+        LoanHistory.insert_one({'user_id': user_id, 'book_id': 10})
+    assert get_reader_lsh().candidates(1) == {2}
+
+    # Written by another worker: no record_reader_loan in this process
+    LoanHistory.insert_one({'user_id': 3, 'book_id': 10})
+    assert get_reader_lsh().candidates(1) == {2, 3}
+
+    rebuild_coborrow_matrix()
+    LoanHistory.insert_one({'user_id': 4, 'book_id': 10})
+    assert get_reader_lsh().candidates(1) == {2, 3, 4}
@@ -0,0 +1,82 @@
+"""
+Tests for the version-stamped recommendation cache.
+"""
+
+from datetime import datetime, timedelta
+import pytest
+from models.mariadb_models import Book
+from models.mongodb_models import RecommendationCache
+from services import recommendation_cache
+from services.recommendation_cache import bump_recommendation_version, get_cached_recommendations
+
+@pytest.fixture
+def books():
+    return [Book(id=book_id, title=f'Book {book_id}', author='Author', total_copies=1, available_copies=1)
+            for book_id in range(1, 31)]
+
+@pytest.fixture
+def computed(monkeypatch):
+    """Count the computations and return the first books of the catalog."""
+    calls = []
+    def compute(user_id, limit=10):
+        calls.append(limit)
+        return Book.query.order_by(Book.id).limit(limit).all()
+    monkeypatch.setattr(recommendation_cache, 'compute_user_recommendations', compute)
+    return calls
+
+def ids(books):
+    return [book.id for book in books]
+
+def test_bump_without_cache_entry_creates_it(mongo):
+    """Bumping a user who was never cached starts their version at 1."""
+    assert bump_recommendation_version(7)
+    assert RecommendationCache.get_by_user(7)['version'] == 1
+    assert bump_recommendation_version(7)
+    assert RecommendationCache.get_by_user(7)['version'] == 2
+
+def test_cached_until_activity(mongo, computed):
+    """Views reuse the stored list; a bump makes the next view recompute."""
+    assert ids(get_cached_recommendations(1, limit=5)) == [1, 2, 3, 4, 5]
+    assert ids(get_cached_recommendations(1, limit=3)) == [1, 2, 3]
+    assert len(computed) == 1
+
+    bump_recommendation_version(1)
+    get_cached_recommendations(1, limit=5)
+    assert len(computed) == 2
+    get_cached_recommendations(1, limit=5)
+    assert len(computed) == 2
+
+def test_longer_or_expired_requests_recompute(mongo, computed, app):
+    """An entry shorter than the request or older than the TTL is not fresh."""
+    app.config['RECOMMENDATION_CACHE_SIZE'] = 5
+    get_cached_recommendations(1, limit=5)
+    assert ids(get_cached_recommendations(1, limit=8)) == list(range(1, 9))
+    assert len(computed) == 2
+
+    RecommendationCache.get_collection().update_one(
+        {'user_id': 1}, {'$set': {'updated_at': datetime.utcnow() - timedelta(days=2)}}
+    )
+    get_cached_recommendations(1, limit=5)
+    assert len(computed) == 3
+
+def test_store_after_concurrent_bump_is_dropped(mongo, monkeypatch):
+    """A list computed for an old version is not stored over a newer version."""
+    bump_recommendation_version(1)
+
+    def compute(user_id, limit=10):
+        # Activity arrives while the list is being computed
+        bump_recommendation_version(user_id)
+        return Book.query.order_by(Book.id).limit(limit).all()
+    monkeypatch.setattr(recommendation_cache, 'compute_user_recommendations', compute)
+
+    assert ids(get_cached_recommendations(1, limit=3)) == [1, 2, 3]
+    entry = RecommendationCache.get_by_user(1)
+    assert entry['version'] == 2
+    assert entry.get('cached_version') is None
+
+def test_store_for_new_user_races_first_bump(mongo):
+    """Storing version 0 after another process created the entry raises DuplicateKeyError, caught by the cache."""
+    from pymongo.errors import DuplicateKeyError
+    RecommendationCache.bump_version(3)
+    with pytest.raises(DuplicateKeyError):
+        RecommendationCache.store(3, 0, [1, 2], 2)
@@ -0,0 +1,48 @@
+"""
+Tests for the candidate generation / re-ranking recommendation pipeline.
+"""
+
+import pytest
+from models.mariadb_models import Book
+from services.recommendation_pipeline import RecommendationPipeline
+
+@pytest.fixture
+def books():
+    return [Book(id=book_id, title=f'Book {book_id}', author='Author', total_copies=1, available_copies=1)
+            for book_id in range(1, 11)]
+
+def static(candidates):
+    return lambda context, limit: iter(candidates)
+
+def test_merges_scores_filters_and_hydrates_in_order(app):
+    """Scores of repeated candidates add up and filtered books never come back."""
+    calls = []
+    pipeline = (
+        RecommendationPipeline()
+        .add_generator('a', static([(1, 1.0), (2, 0.5), (3, 0.4)]), weight=2.0)
+        .add_generator('b', static([(3, 1.0), (4, 0.1)]))
+        .add_generator('fallback', lambda context, limit: calls.append(limit) or iter([(9, 1.0)]), fallback=True)
+        .add_filter('unread', lambda context, book_ids: book_ids - context['read_book_ids'])
+    )
+
+    result = pipeline.run({'read_book_ids': {1}}, limit=3)
+
+    assert [book.id for book in result.books] == [3, 2, 4]
+    assert result.scores[3] == pytest.approx(1.8)
+    assert result.sources[3] == ['a', 'b']
+    assert calls == []
+    assert {'generate.a', 'generate.b', 'filter.unread', 'hydrate', 'total'} <= set(result.timings)
+
+def test_fallback_fills_missing_candidates(app):
+    """Fallback generators run only when the filtered candidates are not enough."""
+    pipeline = (
+        RecommendationPipeline()
+        .add_generator('a', static([(1, 1.0), (42, 1.0)]))
+        .add_generator('popular', static([(1, 1.0), (5, 0.9), (6, 0.8)]), weight=0.5, fallback=True)
+        .add_filter('exists', lambda context, book_ids: {book_id for book_id in book_ids if book_id <= 10})
+    )
+
+    result = pipeline.run({}, limit=3)
+
+    assert [book.id for book in result.books] == [1, 5, 6]
+    assert 'generate.popular' in result.timings
@@ -0,0 +1,130 @@
+"""
+Tests for the similarity scoring and candidate strategies of the recommendation service.
+"""
+
+import numpy as np
+import pytest
+from sqlalchemy import event
+from models.mariadb_models import Book, db
+from models.mongodb_models import Review
+from services import recommendation_service
+from services.recommendation_pipeline import RecommendationPipeline
+from services.preference_matrix import UserGenreMatrix
+from services.recommendation_service import calculate_similarities, calculate_similarity, get_similar_users
+
+PREFERENCES = {
+    1: {'Fantasy': 3, 'Drama': 1},
+    2: {'Fantasy': 6, 'Drama': 2},
+    3: {'History': 4},
+    4: {'Fantasy': 1, 'History': 1},
+    5: {},
+}
+GENRES = ['Fantasy', 'Drama', 'History']
+
+def build_rows():
+    user_ids = list(PREFERENCES)
+    rows = np.array([[PREFERENCES[user_id].get(genre, 0) for genre in GENRES] for user_id in user_ids])
+    return user_ids, rows
+
+def test_batched_scores_match_pairwise_cosine():
+    """Every batched score equals calculate_similarity for the same pair."""
+    user_ids, rows = build_rows()
+
+    similarities, top = calculate_similarities(rows[0], rows, min_similarity=0.1, exclude=[0])
+
+    assert [user_ids[i] for i in top] == [2, 4]
+    for i, user_id in enumerate(user_ids):
+        expected = calculate_similarity(PREFERENCES[1], PREFERENCES[user_id])
+        assert abs(similarities[i] - expected) < 1e-9
+
+def test_top_k_thresholds_and_exclusions():
+    """Results respect top_k, min_similarity and excluded rows."""
+    _, rows = build_rows()
+
+    assert calculate_similarities(rows[0], rows, top_k=1, exclude=[0])[1].tolist() == [1]
+    assert calculate_similarities(rows[2], rows, min_similarity=0.9, exclude=[2])[1].tolist() == []
+    assert calculate_similarities(rows[0], rows, top_k=0)[1].tolist() == []
+    assert calculate_similarities(rows[4], rows)[0].tolist() == [0.0] * len(rows)
+
+def test_zero_vectors_are_never_similar():
+    """Users without preferences are skipped even when no minimum similarity is set."""
+    _, rows = build_rows()
+
+    assert 4 not in calculate_similarities(rows[0], rows, min_similarity=0, exclude=[0])[1].tolist()
+    assert calculate_similarities(rows[4], rows)[1].tolist() == []
+
+def test_approximate_search_falls_back_without_enough_candidates(monkeypatch):
+    """With fewer LSH candidates than requested users, the exact search answers."""
+    matrix = UserGenreMatrix()
+    for user_id, genres in PREFERENCES.items():
+        for genre, score in genres.items():
+            matrix.add(user_id, genre, score)
+    monkeypatch.setattr(recommendation_service, 'get_user_genre_matrix', lambda: matrix)
+
+    class FewCandidates:
+        def candidates(self, user_id):
+            return {3}
+    monkeypatch.setattr(recommendation_service, 'get_reader_lsh', FewCandidates)
+
+    exact = get_similar_users(1, mode='exact')
+    assert exact
+    assert get_similar_users(1, mode='approximate') == exact
+
+class CountingReviews:
+    """In-memory stand-in for the reviews collection that counts find() calls."""
+
+    def __init__(self, reviews):
+        self.reviews = reviews
+        self.finds = 0
+
+    def find(self, query, projection=None):
+        self.finds += 1
+        user_ids = set(query['user_id']['$in'])
+        return [
+            review for review in self.reviews
+            if review['user_id'] in user_ids and review['rating'] >= query['rating']['$gte']
+        ]
+
+@pytest.fixture
+def books():
+    return [Book(id=book_id, title=f'Book {book_id}', author='Author', total_copies=1, available_copies=1)
+            for book_id in range(1, 41)]
+
+def run_neighbor_stage(monkeypatch, num_neighbors):
+    """Run the neighbour strategy alone and count the Mongo and SQL queries it makes."""
+    neighbors = [{'user_id': 100 + i, 'similarity': 1 - i / 100} for i in range(num_neighbors)]
+    reviews = CountingReviews([
+        {'user_id': neighbor['user_id'], 'book_id': 1 + (neighbor['user_id'] * 7 + j) % 40, 'rating': 5 - j % 3}
+        for neighbor in neighbors
+        for j in range(5)
+    ])
+    monkeypatch.setattr(recommendation_service, 'get_similar_users', lambda user_id: neighbors)
+    monkeypatch.setattr(Review, 'get_collection', classmethod(lambda cls: reviews))
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        pipeline = RecommendationPipeline().add_generator('neighbors', recommendation_service._neighbor_candidates)
+        result = pipeline.run({'user_id': 1, 'read_book_ids': {1, 2}}, limit=5)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    return result, reviews.finds, len(statements)
+
+def test_neighbor_strategy_query_count_is_constant(app, monkeypatch):
+    """One reviews query and one book query whatever the number of neighbours."""
+    few = run_neighbor_stage(monkeypatch, 2)
+    many = run_neighbor_stage(monkeypatch, 30)
+
+    assert few[1] == many[1] == 1
+    assert few[2] == many[2] == 1
+    assert len(many[0].books) == 5
+    assert not {1, 2} & {book.id for book in many[0].books}
+
+def test_neighbor_scores_are_weighted_by_similarity(app, monkeypatch):
+    """Books liked by more (and more similar) neighbours rank first."""
+    result, _, _ = run_neighbor_stage(monkeypatch, 30)
+    scores = [result.scores[book.id] for book in result.books]
+
+    assert scores == sorted(scores, reverse=True)
+    assert 0 < scores[-1] <= scores[0] <= 1
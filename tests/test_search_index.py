@@ -0,0 +1,84 @@
+"""
+Tests for the inverted-index full-text search engine.
+"""
+
+import numpy as np
+import pytest
+from models.mariadb_models import Book
+from services.book_service import search_books
+from services.search_index import SearchIndex, encode_varints, decode_varints
+
+BOOKS = [
+    (1, "El nombre del viento", "Patrick Rothfuss", "Un joven músico y mago narra su vida"),
+    (2, "El temor de un hombre sabio", "Patrick Rothfuss", "Segunda parte de la historia de Kvothe"),
+    (3, "Historia del viento", "Ana López", "Ensayo sobre meteorología"),
+    (4, "Cocina mediterránea", "Marta Ruiz", "Recetas con viento de levante"),
+]
+
+@pytest.fixture
+def app_config(tmp_path):
+    return {'RECOMMENDER_DATA_DIR': str(tmp_path), 'SEARCH_MAX_RESULTS': 2}
+
+@pytest.fixture
+def books():
+    return [Book(id=book_id, title=title, author=author, description=description, total_copies=1, available_copies=1)
+            for book_id, title, author, description in BOOKS]
+
+def build_index(tmp_path, books=BOOKS):
+    index = SearchIndex(str(tmp_path))
+    index.replace_all(books)
+    return index
+
+def ids(results):
+    return [book_id for book_id, _ in results]
+
+def test_varints_round_trip():
+    """Delta gaps of any size survive encoding."""
+    values = np.array([0, 1, 127, 128, 300, 16383, 16384, 2 ** 31], dtype=np.int64)
+    assert decode_varints(encode_varints(values)).tolist() == values.tolist()
+
+def test_title_matches_rank_first(tmp_path):
+    """A title hit outweighs a description hit; every word must match."""
+    index = build_index(tmp_path)
+    assert ids(index.search("viento"))[-1] == 4
+    assert ids(index.search("historia viento")) == [3]
+    assert index.search("dragones") == []
+
+def test_last_word_is_a_prefix(tmp_path):
+    """An incomplete last word expands to the indexed terms it starts."""
+    index = build_index(tmp_path)
+    assert ids(index.search("rothf")) == [1, 2]
+    assert index.search("rothf", prefix=False) == []
+
+def test_updates_tombstone_old_versions(tmp_path):
+    """Updated and deleted books stop matching through older segments."""
+    index = build_index(tmp_path)
+    index.update(documents=[(4, "Cocina vasca", "Marta Ruiz", "Recetas del norte")], deleted_ids=[2])
+    assert sorted(ids(index.search("viento"))) == [1, 3]
+    assert ids(index.search("vasca")) == [4]
+    assert ids(index.search("rothfuss")) == [1]
+
+    reopened = SearchIndex(str(tmp_path))
+    assert ids(reopened.search("rothfuss")) == [1]
+
+def test_merge_keeps_results(tmp_path):
+    """Merging segments drops deleted documents without changing the ranking."""
+    index = build_index(tmp_path, BOOKS[:2])
+    for book in BOOKS[2:]:
+        index.update(documents=[book])
+    index.update(deleted_ids=[1])
+    before = index.search("viento")
+    assert len(index.segments) == 3
+
+    assert index.merge()
+    assert len(index.segments) == 1
+    after = index.search("viento")
+    assert ids(after) == ids(before) == [3, 4]
+    assert np.allclose([score for _, score in after], [score for _, score in before])
+
+def test_search_total_counts_every_match(app):
+    """Results past SEARCH_MAX_RESULTS still count and can be paged to."""
+    books, total_pages, total = search_books("viento", page=1, per_page=1)
+    assert (len(books), total_pages, total) == (1, 3, 3)
+    books, _, _ = search_books("viento", page=3, per_page=1)
+    assert len(books) == 1
@@ -0,0 +1,53 @@
+"""
+Tests for the prefix index behind the live search suggestions.
+"""
+
+from services.suggest_index import SuggestIndex
+
+BOOKS = [
+    (1, "El nombre del viento", "Patrick Rothfuss", 10),
+    (2, "El temor de un hombre sabio", "Patrick Rothfuss", 3),
+    (3, "La sombra del viento", "Carlos Ruiz Zafón", 20),
+    (4, "Viento del este", "Ana Ruiz", 0),
+]
+
+def texts(suggestions):
+    return [suggestion['text'] for suggestion in suggestions]
+
+def test_completes_any_word_by_popularity():
+    """A prefix completes titles from any of their words, most borrowed first."""
+    index = SuggestIndex.from_books(BOOKS)
+    assert texts(index.suggest("vien")) == ["La sombra del viento", "El nombre del viento", "Viento del este"]
+    assert texts(index.suggest("del vi", limit=1)) == ["La sombra del viento"]
+    assert index.suggest("xyz") == []
+    assert index.suggest("") == []
+
+def test_authors_are_suggested_once():
+    """An author is one suggestion weighted by all their books."""
+    index = SuggestIndex.from_books(BOOKS)
+    suggestions = index.suggest("patr")
+    assert suggestions == [{'text': "Patrick Rothfuss", 'type': 'author', 'book_id': None}]
+    assert texts(index.suggest("ruiz")) == ["Carlos Ruiz Zafón", "Ana Ruiz"]
+
+def test_accents_and_case_are_ignored():
+    """Suggestions match regardless of accents and case."""
+    index = SuggestIndex.from_books(BOOKS)
+    assert texts(index.suggest("ZAFON")) == ["Carlos Ruiz Zafón"]
+
+def test_non_positive_limit_gives_nothing():
+    """A zero or negative limit returns no suggestions."""
+    index = SuggestIndex.from_books(BOOKS)
+    assert index.suggest("vien", limit=0) == []
+    assert index.suggest("vien", limit=-2) == []
+
+def test_api_clamps_limit(app, monkeypatch):
+    """The suggest endpoint asks for between 1 and 10 suggestions."""
+    from routes import book_routes
+    limits = []
+    monkeypatch.setattr(book_routes, 'suggest', lambda query, limit: limits.append(limit) or [])
+    app.register_blueprint(book_routes.book_bp, url_prefix='/books')
+
+    client = app.test_client()
+    for limit in (-3, 0, 4, 50):
+        assert client.get(f'/books/api/suggest?query=vien&limit={limit}').get_json() == {'suggestions': []}
+    assert limits == [1, 1, 4, 10]
@@ -0,0 +1,66 @@
+"""
+Tests for the forward-decayed trending scores.
+"""
+
+from datetime import datetime, timedelta
+import pytest
+from models.mongodb_models import BookTrending
+from services.trending import get_trending_book_ids, rebuild_trending_scores, record_book_event
+
+HALF_LIFE_HOURS = 24
+
+@pytest.fixture
+def app_config():
+    return {'TRENDING_HALF_LIFE_HOURS': HALF_LIFE_HOURS}
+
+def stored_scores():
+    landmark = BookTrending.get_landmark()
+    return {entry['book_id']: entry['score'] for entry in BookTrending.find({'landmark': landmark})}
+
+def noon(days_ago):
+    today = datetime.utcnow()
+    return datetime(today.year, today.month, today.day, 12) - timedelta(days=days_ago)
+
+def test_reads_do_not_write(mongo):
+    """Without any event there is no landmark, and reading does not create one."""
+    assert get_trending_book_ids() == []
+    assert BookTrending.get_landmark() is None
+
+def test_weights_halve_every_half_life(mongo):
+    """An event one half-life older weighs half as much; loans weigh three views."""
+    record_book_event(1, 'views', noon(1))
+    record_book_event(2, 'views', noon(2))
+    record_book_event(3, 'loans', noon(2))
+
+    scores = stored_scores()
+    assert scores[1] / scores[2] == pytest.approx(2.0)
+    assert scores[3] / scores[2] == pytest.approx(3.0)
+    assert get_trending_book_ids() == [3, 1, 2]
+
+def test_rebuild_moves_the_landmark_and_keeps_the_ranking(mongo):
+    """Rebuilt scores are the bucket weights decayed to the new landmark."""
+    for days_ago, book_id in ((0, 1), (1, 1), (3, 2), (3, 2), (3, 2), (3, 2)):
+        record_book_event(book_id, 'views', noon(days_ago))
+    before = stored_scores()
+    old_landmark = BookTrending.get_landmark()
+
+    assert rebuild_trending_scores() == 2
+    landmark = BookTrending.get_landmark()
+    assert landmark > old_landmark
+    after = stored_scores()
+    assert after[1] / after[2] == pytest.approx(before[1] / before[2])
+    hours = (noon(0) - landmark).total_seconds() / 3600
+    assert after[1] == pytest.approx(2 ** (hours / HALF_LIFE_HOURS) * (1 + 0.5))
+    # Only the new landmark's entries are kept
+    assert BookTrending.get_collection().count_documents({}) == 2
+
+def test_days_keeps_only_recently_active_books(mongo):
+    """A window only returns books with activity in it, still ranked by score."""
+    for _ in range(20):
+        record_book_event(1, 'loans', noon(4))
+    record_book_event(2, 'views', noon(1))
+
+    assert get_trending_book_ids() == [1, 2]
+    assert get_trending_book_ids(days=3) == [2]
+    rebuild_trending_scores()
+    assert get_trending_book_ids(days=3) == [2]
@@ -0,0 +1,34 @@
+"""
+Tests for the trigram index behind typo-tolerant search.
+"""
+
+from services.trigram_index import TrigramIndex, trigrams
+
+BOOKS = [
+    (1, "El nombre del viento", "Patrick Rothfuss"),
+    (2, "Cien años de soledad", "Gabriel García Márquez"),
+    (3, "El amor en los tiempos del cólera", "Gabriel García Márquez"),
+    (4, "La sombra del viento", "Carlos Ruiz Zafón"),
+]
+
+def ids(results):
+    return [book_id for book_id, _ in results]
+
+def test_trigrams_pad_words_and_fold_accents():
+    """Words are padded so their start counts; accents are folded."""
+    assert trigrams("Sól") == {'  s', ' so', 'sol', 'ol '}
+    assert trigrams("") == set()
+
+def test_misspelled_author_matches():
+    """A misspelled surname finds the books of the author."""
+    index = TrigramIndex.from_books(BOOKS)
+    assert ids(index.search("rotfuss")) == [1]
+    assert sorted(ids(index.search("garcia marques"))) == [2, 3]
+    assert ids(index.search("zafon"))[0] == 4
+
+def test_best_title_match_first():
+    """The closest title ranks first and unrelated queries find nothing."""
+    index = TrigramIndex.from_books(BOOKS)
+    assert ids(index.search("sombra del vento"))[0] == 4
+    assert index.search("xyzzy") == []
+    assert index.search("soledad", limit=1) == index.search("soledad")[:1]
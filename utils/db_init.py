@@ -1,5 +1,5 @@
 from flask import current_app
-from pymongo import MongoClient, ASCENDING, TEXT
+from pymongo import MongoClient, ASCENDING, DESCENDING, TEXT
 from sqlalchemy.exc import SQLAlchemyError
 from models.mariadb_models import db, User, Book, Loan
 
@@ -46,6 +46,34 @@ def init_mongodb():
             db.create_collection('book_texts')
         if 'user_preferences' not in db.list_collection_names():
             db.create_collection('user_preferences')
+        if 'book_meta' not in db.list_collection_names():
+            db.create_collection('book_meta')
+        if 'book_neighbors' not in db.list_collection_names():
+            db.create_collection('book_neighbors')
+        if 'book_content_neighbors' not in db.list_collection_names():
+            db.create_collection('book_content_neighbors')
+        if 'rating_leaderboard' not in db.list_collection_names():
+            db.create_collection('rating_leaderboard')
+        if 'recommendation_cache' not in db.list_collection_names():
+            db.create_collection('recommendation_cache')
+        if 'book_trending' not in db.list_collection_names():
+            db.create_collection('book_trending')
+        if 'book_activity' not in db.list_collection_names():
+            db.create_collection('book_activity')
+        if 'book_also_borrowed' not in db.list_collection_names():
+            db.create_collection('book_also_borrowed')
+        if 'book_coviews' not in db.list_collection_names():
+            db.create_collection('book_coviews')
+        if 'view_sessions' not in db.list_collection_names():
+            db.create_collection('view_sessions')
+        if 'recommendation_feeds' not in db.list_collection_names():
+            db.create_collection('recommendation_feeds')
+        if 'user_genre_profile' not in db.list_collection_names():
+            db.create_collection('user_genre_profile')
+        if 'user_recommendations' not in db.list_collection_names():
+            db.create_collection('user_recommendations')
+        if 'recommendation_generations' not in db.list_collection_names():
+            db.create_collection('recommendation_generations')
 
         # Create indexes for reviews collection
         reviews = db['reviews']
@@ -56,7 +84,7 @@ def init_mongodb():
         # Create indexes for loan_history collection
         loan_history = db['loan_history']
         loan_history.create_index([('loan_id', ASCENDING)])
-        loan_history.create_index([('user_id', ASCENDING)])
+        loan_history.create_index([('user_id', ASCENDING), ('_id', ASCENDING)])
         loan_history.create_index([('book_id', ASCENDING)])
         loan_history.create_index([('loan_date', ASCENDING)])
         
@@ -69,6 +97,69 @@ def init_mongodb():
         user_preferences = db['user_preferences']
         user_preferences.create_index([('user_id', ASCENDING)], unique=True)  # Índice único para user_id
         
+        # Create indexes for book_meta collection
+        book_meta = db['book_meta']
+        book_meta.create_index([('book_id', ASCENDING)], unique=True)
+        book_meta.create_index([('genre', ASCENDING)])
+        
+        # Create indexes for book_neighbors collection
+        book_neighbors = db['book_neighbors']
+        book_neighbors.create_index([('book_id', ASCENDING)], unique=True)
+        
+        # Create indexes for book_content_neighbors collection
+        book_content_neighbors = db['book_content_neighbors']
+        book_content_neighbors.create_index([('book_id', ASCENDING)], unique=True)
+        book_content_neighbors.create_index([('neighbors.book_id', ASCENDING)])
+        
+        # Create indexes for rating_leaderboard collection
+        rating_leaderboard = db['rating_leaderboard']
+        rating_leaderboard.create_index([('score', DESCENDING), ('book_id', ASCENDING)])
+        rating_leaderboard.create_index([('book_id', ASCENDING)], unique=True)
+        
+        # Create indexes for recommendation_cache collection
+        recommendation_cache = db['recommendation_cache']
+        recommendation_cache.create_index([('user_id', ASCENDING)], unique=True)
+        
+        # Create indexes for book_also_borrowed collection
+        book_also_borrowed = db['book_also_borrowed']
+        book_also_borrowed.create_index([('book_id', ASCENDING)], unique=True)
+        
+        # Create indexes for book_coviews and view_sessions collections
+        book_coviews = db['book_coviews']
+        book_coviews.create_index([('book_id', ASCENDING)], unique=True)
+        view_sessions = db['view_sessions']
+        view_sessions.create_index([('viewer', ASCENDING)], unique=True)
+        view_sessions.create_index([('updated_at', ASCENDING)], expireAfterSeconds=86400)
+        
+        # Create indexes for recommendation_feeds collection
+        recommendation_feeds = db['recommendation_feeds']
+        recommendation_feeds.create_index([('key', ASCENDING)], unique=True)
+        
+        # Create indexes for book_trending and book_activity collections
+        book_trending = db['book_trending']
+        if 'book_id_1' in book_trending.index_information():
+            # Scores are now versioned by landmark, so a book can have one entry per landmark
+            book_trending.drop_index('book_id_1')
+        book_trending.create_index([('landmark', ASCENDING), ('book_id', ASCENDING)], unique=True)
+        book_trending.create_index([('landmark', ASCENDING), ('score', DESCENDING), ('book_id', ASCENDING)])
+        book_activity = db['book_activity']
+        book_activity.create_index([('book_id', ASCENDING), ('day', ASCENDING)], unique=True)
+        book_activity.create_index(
+            [('day', ASCENDING)],
+            expireAfterSeconds=current_app.config.get('TRENDING_RETENTION_DAYS', 90) * 86400
+        )
+        
+        # Create indexes for user_genre_profile collection
+        user_genre_profile = db['user_genre_profile']
+        user_genre_profile.create_index([('user_id', ASCENDING)], unique=True)
+        
+        # Create indexes for user_recommendations and recommendation_generations collections
+        user_recommendations = db['user_recommendations']
+        user_recommendations.create_index([('user_id', ASCENDING), ('generation', ASCENDING)], unique=True)
+        user_recommendations.create_index([('generation', ASCENDING)])
+        recommendation_generations = db['recommendation_generations']
+        recommendation_generations.create_index([('generation', DESCENDING)], unique=True)
+        
         current_app.logger.info("MongoDB collections and indexes created successfully")
         return True
     except Exception as e:
@@ -4,10 +4,18 @@ Helper functions for the LibriMongo application.
 
 import re
 import os
+import json
+import base64
 import hashlib
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from flask import current_app
 
+try:
+    import fcntl
+except ImportError:  # Windows: file locks only serialize threads of a process
+    fcntl = None
+
 def sanitize_filename(filename):
     """
     Sanitize a filename by removing invalid characters.
@@ -96,6 +104,49 @@ def paginate(items, page=1, per_page=10):
     
     return items[start_idx:end_idx], total_pages, total_items
 
+def clamp_per_page(per_page):
+    """
+    Limit a requested page size to 1..MAX_PER_PAGE.
+    
+    Args:
+        per_page (int): The requested number of items per page
+        
+    Returns:
+        int: The page size to use
+    """
+    return max(1, min(per_page or 1, current_app.config.get('MAX_PER_PAGE', 100)))
+
+def encode_cursor(data):
+    """
+    Encode a pagination position as an opaque URL-safe token.
+    
+    Args:
+        data (dict): JSON-serializable position
+        
+    Returns:
+        str: The token
+    """
+    payload = json.dumps(data, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+def decode_cursor(token):
+    """
+    Decode a token made by encode_cursor.
+    
+    Args:
+        token (str): The token
+        
+    Returns:
+        dict: The position, or None if the token is missing or malformed
+    """
+    if not token:
+        return None
+    try:
+        data = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except (ValueError, TypeError):
+        return None
+    return data if isinstance(data, dict) else None
+
 def log_activity(activity_type, user_id=None, book_id=None, details=None):
     """
     Log an activity in the application.
@@ -115,4 +166,34 @@ def log_activity(activity_type, user_id=None, book_id=None, details=None):
     }
     
     # In a real application, this would be logged to a database or file
-    current_app.logger.info(f"Activity: {activity}")
\ No newline at end of file
+    current_app.logger.info(f"Activity: {activity}")
+
+@contextmanager
+def file_lock(path):
+    """
+    Hold an exclusive lock on a lock file, shared by all processes using the path.
+    
+    Args:
+        path (str): Path of the lock file (created if missing)
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'a') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def get_app_cache(name):
+    """
+    Get a per-application dictionary for in-process caches and indexes.
+    
+    Args:
+        name (str): The name of the cache
+        
+    Returns:
+        dict: The cache dictionary, created on first access
+    """
+    return current_app.extensions.setdefault(f'librimongo.{name}', {})
\ No newline at end of file
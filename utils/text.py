@@ -0,0 +1,23 @@
+"""
+Text analysis helpers for the LibriMongo application.
+Shared by the content similarity index, the full-text search index and the
+catalog search, so all of them agree on what a term is.
+"""
+
+import re
+import unicodedata
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+
+STOPWORDS = frozenset("""
+a al algo como con de del el ella en entre era es esta este esto ha han hay la las le lo los mas me mi
+muy no o para pero por que se ser si sin sobre su sus tambien tiene un una uno unos y ya
+an and are as at be but by for from has have he her his in into is it its not of on or she so than
+that the their them they this to was were which who will with would you
+""".split())
+
+
+def tokenize(text):
+    """Lowercase, strip accents and split a text into terms, without stopwords."""
+    folded = unicodedata.normalize('NFKD', (text or '').lower()).encode('ascii', 'ignore').decode('ascii')
+    return [term for term in TOKEN_PATTERN.findall(folded) if len(term) > 1 and term not in STOPWORDS]